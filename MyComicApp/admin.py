@@ -1,29 +1,67 @@
 from django.contrib import admin
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html
-from .models import User, Role, Category, Product, Order, OrderItem  # Asegúrate de incluir todos tus modelos aquí.
+from .models import User, Role, Category, Product, Order, OrderItem, DailySales  # Asegúrate de incluir todos tus modelos aquí.
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from .analytics import rebuild_sales_days
+from .images import product_image_urls
+from .pagination import EstimatedCountPaginator
+from .permissions import user_has_role
+from .search import search_products
 
 # Users Admin
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'first_name', 'last_name', 'email', 'address', 'image', 'display_orders', 'role')
+    list_select_related = ('role',)
     filter_horizontal = ('user_permissions',)
+    # Búsqueda por prefijo del email (índice sobre UPPER(email), ver migración 0011)
+    search_fields = ('^email',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Cantidad de órdenes recientes que se muestran por usuario
+    DISPLAYED_ORDERS = 10
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # Sólo el listado muestra las órdenes: el autocompletado y el formulario no las usan
+        match = request.resolver_match
+        if match is None or match.url_name != f'{self.opts.app_label}_{self.opts.model_name}_changelist':
+            return queryset
+
+        # Las órdenes de la página se traen en una sola consulta (las más recientes de cada
+        # usuario) y el total con una subconsulta por fila sobre el índice de usuario
+        order_count = (
+            Order.objects.filter(id_user=OuterRef('pk')).order_by()
+            .values('id_user').annotate(count=Count('*')).values('count')
+        )
+        recent_orders = Order.objects.only('id_order', 'id_user').order_by('-id_order')[:self.DISPLAYED_ORDERS]
+        return (
+            queryset
+            .annotate(order_count=Coalesce(Subquery(order_count), 0))
+            .prefetch_related(Prefetch('orders', queryset=recent_orders, to_attr='recent_orders'))
+        )
 
     def display_orders(self, obj):
-        return ", ".join([str(order.id_order) for order in obj.orders.all()])
+        orders = ", ".join(str(order.id_order) for order in obj.recent_orders)
+        hidden = obj.order_count - len(obj.recent_orders)
+        return f"{orders} (+{hidden})" if hidden > 0 else orders
     
     display_orders.short_description = 'Orders'
     
     def has_add_permission(self, request):
-        return not request.user.groups.filter(name='Vendedor').exists()
+        return not user_has_role(request.user, 'Vendedor')
 
     def has_change_permission(self, request, obj=None):
-        return not request.user.groups.filter(name='Vendedor').exists()
+        return not user_has_role(request.user, 'Vendedor')
 
     def has_delete_permission(self, request, obj=None):
-        return not request.user.groups.filter(name='Vendedor').exists()
+        return not user_has_role(request.user, 'Vendedor')
 
     def has_view_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Vendedor').exists() or super().has_view_permission(request, obj)
+        return user_has_role(request.user, 'Vendedor') or super().has_view_permission(request, obj)
 
 admin.site.register(User, UserAdmin)
 
@@ -43,10 +81,23 @@ admin.site.register(Category, CategoryAdmin)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('id_product', 'name', 'price', 'stock', 'image_tag')
     fields = ('name', 'description', 'price', 'discount', 'stock', 'image', 'pages', 'format', 'weight', 'isbn', 'category', 'calification')
+    # Usado también por el autocompletado de productos en los items de las órdenes
+    search_fields = ('name', 'isbn')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Búsqueda de texto completo / ISBN de la API (índices GIN en PostgreSQL)
+        if not search_term.strip():
+            return queryset, False
+        return search_products(search_term, queryset), False
 
     def image_tag(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="width: 100px; height: auto;" />', obj.image.url)
+            # Usar la miniatura en lugar de la imagen original
+            urls = product_image_urls(obj.image, ['thumbnail'])
+            src = urls['thumbnail']['url'] if urls else obj.image.url
+            return format_html('<img src="{}" style="width: 100px; height: auto;" />', src)
         return "No Image"
 
     image_tag.short_description = 'Image'
@@ -54,22 +105,96 @@ class ProductAdmin(admin.ModelAdmin):
 admin.site.register(Product, ProductAdmin)
 
 # Order Admin
+class CachedValuesListFilter(admin.AllValuesFieldListFilter):
+    # Las opciones salen de un SELECT DISTINCT sobre toda la tabla: se cachean unos minutos
+    timeout = 300
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = f'admin-filter:{model._meta.label_lower}:{field_path}'
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.lookup_choices)
+            cache.set(key, choices, self.timeout)
+        self.lookup_choices = choices
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
+    fields = ('product', 'quantity', 'product_name', 'unit_price', 'line_total')
+    # Un <select> con todo el catálogo no es viable: el producto se busca por autocompletado
+    autocomplete_fields = ('product',)
+    # Copia del producto al momento de la compra (ver OrderItem.save)
+    readonly_fields = ('product_name', 'unit_price', 'line_total')
 
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id_order', 'id_user', 'state', 'order_date', 'payment_method', 'shipping_method', 'payment_status', 'total_amount')
-    list_filter = ('state', 'order_date', 'payment_method', 'shipping_method', 'payment_status')
+    list_filter = (
+        ('state', CachedValuesListFilter),
+        ('payment_method', CachedValuesListFilter),
+        ('shipping_method', CachedValuesListFilter),
+        ('payment_status', CachedValuesListFilter),
+    )
+    list_select_related = ('id_user',)
     search_fields = ('id_order', 'id_user__email')
+    autocomplete_fields = ('id_user',)
+    date_hierarchy = 'order_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [OrderItemInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Número exacto de orden o prefijo del email del usuario, ambos resueltos con índices
+        # (un icontains sobre el email o el id convertido a texto recorre toda la tabla)
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(id_order=int(term)), False
+        return queryset.filter(id_user__email__istartswith=term), False
+
+    # Los cambios hechos acá no pasan por place_order: se recalculan las ventas de los días afectados
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        rebuild_sales_days([form.initial.get('order_date'), form.instance.order_date])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_sales_days([obj.order_date])
+
+    def delete_queryset(self, request, queryset):
+        dates = list(queryset.order_by().values_list('order_date', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        rebuild_sales_days(dates)
+
     def order_items(self, obj):
         return ", ".join([str(item) for item in obj.order_items.all()])
     
     order_items.short_description = 'Order Items'
 
     def has_view_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Vendedor').exists() or super().has_view_permission(request, obj)
+        return user_has_role(request.user, 'Vendedor') or super().has_view_permission(request, obj)
 
 admin.site.register(Order, OrderAdmin)
+
+# Ventas diarias (sólo lectura: se mantienen al crear órdenes)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'category', 'units', 'revenue', 'order_count')
+    list_filter = ('category',)
+    list_select_related = ('product', 'category')
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    # Borrar filas deja los reportes desfasados de las órdenes (se corrige con rebuild_daily_sales)
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_view_permission(self, request, obj=None):
+        return user_has_role(request.user, 'Vendedor') or super().has_view_permission(request, obj)
+
+admin.site.register(DailySales, DailySalesAdmin)
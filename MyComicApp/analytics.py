@@ -0,0 +1,191 @@
+"""
+Reportes de ventas sobre ``DailySales``, una tabla con una fila por día y producto, y
+``DailyOrders``, con la cantidad de órdenes distintas por día y categoría.
+
+Cada orden suma sus unidades, importes y órdenes a las tablas dentro de la misma
+transacción en que se crea (ver ``place_order``), con INSERT ... ON CONFLICT. Los
+reportes leen sólo estas tablas, así que su costo depende de la cantidad de días y
+productos consultados y no de la cantidad de órdenes. ``rebuild_daily_sales`` las
+recalcula desde ``orders`` y ``order_items`` (comando ``rebuild_daily_sales``); el
+admin la usa para los días de las órdenes que se editan o se borran.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import DailyOrders, DailySales, OrderItem
+
+ROLLUP_COLUMNS = ('date', 'product_id', 'category_id', 'units', 'revenue', 'order_count')
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+TOTALS = {
+    'units': Coalesce(Sum('units'), 0),
+    'revenue': Coalesce(Sum('revenue'), Value(Decimal(0)), output_field=MONEY),
+}
+
+
+def record_order_sales(order, items, products):
+    """
+    Suma los items de ``order`` a las ventas del día. ``products`` es el diccionario
+    ``{id: Product}`` con la categoría de cada producto; se llama dentro de la
+    transacción que crea la orden.
+    """
+    if order.order_date is None:
+        return
+    totals = {}
+    for item in items:
+        units, revenue = totals.get(item.product_id, (0, Decimal(0)))
+        totals[item.product_id] = (units + item.quantity, revenue + item.line_total)
+    rows = [
+        (order.order_date, product_id, products[product_id].category_id, units, revenue, 1)
+        for product_id, (units, revenue) in sorted(totals.items())
+    ]
+    qn = connection.ops.quote_name
+    _upsert(DailySales, ROLLUP_COLUMNS, ('date', 'product_id'), None, ('units', 'revenue', 'order_count'), rows)
+
+    # La orden cuenta una vez en el día y una vez en cada categoría de sus productos
+    categories = sorted({products[product_id].category_id for product_id in totals})
+    _upsert(DailyOrders, ('date', 'category_id', 'order_count'), ('date', 'category_id'),
+            f'{qn("category_id")} IS NOT NULL', ('order_count',),
+            [(order.order_date, category_id, 1) for category_id in categories])
+    _upsert(DailyOrders, ('date', 'order_count'), ('date',),
+            f'{qn("category_id")} IS NULL', ('order_count',), [(order.order_date, 1)])
+
+
+def _upsert(model, columns, conflict, condition, increments, rows):
+    """
+    INSERT de ``rows`` en la tabla de ``model`` que, si la fila ya existe (índice único
+    sobre ``conflict``, parcial con ``condition``), suma las columnas ``increments``.
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    placeholders = ', '.join(['({})'.format(', '.join(['%s'] * len(columns)))] * len(rows))
+    target = '({})'.format(', '.join(qn(column) for column in conflict))
+    if condition:
+        target += f' WHERE {condition}'
+    updates = ', '.join(
+        f'{qn(column)} = {table}.{qn(column)} + EXCLUDED.{qn(column)}' for column in increments
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(qn(column) for column in columns)}) VALUES {placeholders} '
+            f'ON CONFLICT {target} DO UPDATE SET {updates}',
+            [value for row in rows for value in row],
+        )
+
+
+def rebuild_daily_sales(start=None, end=None):
+    """
+    Recalcula las ventas y órdenes diarias entre ``start`` y ``end`` (inclusive; sin
+    límites, todas) con un INSERT ... SELECT por tabla. Devuelve la cantidad de filas
+    de ventas generadas.
+    """
+    rollup = DailySales.objects.all()
+    orders = DailyOrders.objects.all()
+    items = OrderItem.objects.filter(product__isnull=False, order__order_date__isnull=False).order_by()
+    if start is not None:
+        rollup = rollup.filter(date__gte=start)
+        orders = orders.filter(date__gte=start)
+        items = items.filter(order__order_date__gte=start)
+    if end is not None:
+        rollup = rollup.filter(date__lte=end)
+        orders = orders.filter(date__lte=end)
+        items = items.filter(order__order_date__lte=end)
+
+    sales = (
+        items.values('order__order_date', 'product_id', 'product__category_id')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Coalesce(Sum('line_total'), Value(Decimal(0)), output_field=MONEY),
+            order_count=Count('order_id', distinct=True),
+        )
+        .values_list('order__order_date', 'product_id', 'product__category_id', 'units', 'revenue', 'order_count')
+    )
+    by_category = (
+        items.values('order__order_date', 'product__category_id')
+        .annotate(order_count=Count('order_id', distinct=True))
+        .values_list('order__order_date', 'product__category_id', 'order_count')
+    )
+    by_day = (
+        items.values('order__order_date')
+        .annotate(order_count=Count('order_id', distinct=True))
+        .values_list('order__order_date', 'order_count')
+    )
+    with transaction.atomic():
+        rollup.delete()
+        orders.delete()
+        rows = _insert_select(DailySales, ROLLUP_COLUMNS, sales)
+        _insert_select(DailyOrders, ('date', 'category_id', 'order_count'), by_category)
+        _insert_select(DailyOrders, ('date', 'order_count'), by_day)
+    return rows
+
+
+def rebuild_sales_days(dates):
+    """Recalcula las ventas de cada día de ``dates`` (p. ej. al editar órdenes en el admin)."""
+    for day in sorted({day for day in dates if day is not None}):
+        rebuild_daily_sales(day, day)
+
+
+def _insert_select(model, columns, queryset):
+    sql, params = queryset.query.sql_with_params()
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(model._meta.db_table)} ({", ".join(qn(column) for column in columns)}) {sql}', params,
+        )
+        return cursor.rowcount
+
+
+def _filter(start, end, category=None):
+    queryset = DailySales.objects.filter(date__range=(start, end))
+    if category is not None:
+        queryset = queryset.filter(category_id=category)
+    return queryset
+
+
+def _orders(start, end, category):
+    """Subconsulta con las órdenes de la categoría (``None``: todas) en el período."""
+    queryset = DailyOrders.objects.filter(date__range=(start, end))
+    if category is None:
+        return queryset.filter(category__isnull=True)
+    return queryset.filter(category=category)
+
+
+def sales_by_day(start, end, category=None):
+    """Unidades, ingresos y órdenes distintas por día."""
+    orders = _orders(start, end, category).filter(date=OuterRef('date')).values('order_count')
+    return list(
+        _filter(start, end, category).values('date')
+        .annotate(**TOTALS, orders=Coalesce(Subquery(orders[:1]), 0))
+        .order_by('date')
+    )
+
+
+def sales_by_category(start, end):
+    """
+    Unidades, ingresos y órdenes distintas por categoría en el período (una orden con
+    productos de varias categorías cuenta en cada una).
+    """
+    orders = (
+        DailyOrders.objects.filter(date__range=(start, end), category=OuterRef('category_id'))
+        .values('category').annotate(total=Sum('order_count')).values('total')
+    )
+    return list(
+        _filter(start, end)
+        .values('category_id', category_name=F('category__name'))
+        .annotate(**TOTALS, orders=Coalesce(Subquery(orders), 0))
+        .order_by('-revenue', 'category_id')
+    )
+
+
+def top_products(start, end, category=None, order_by='units', limit=10):
+    """Productos más vendidos en el período, por unidades o por ingresos, con sus órdenes."""
+    tie_breaker = 'revenue' if order_by == 'units' else 'units'
+    return list(
+        _filter(start, end, category)
+        .values('product_id', product_name=F('product__name'))
+        # order_count es por día y producto: sumado por producto da sus órdenes distintas
+        .annotate(**TOTALS, orders=Coalesce(Sum('order_count'), 0))
+        .order_by(f'-{order_by}', f'-{tie_breaker}', 'product_id')[:limit]
+    )
@@ -1,4 +1,14 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+
+
+def is_last_post_migrate(sender):
+    """
+    Indica si ``sender`` es la última aplicación que recibe ``post_migrate``. Los
+    receptores que deben ejecutarse una sola vez por migrate (con las tablas y los
+    permisos de todos los modelos ya creados) esperan esa señal.
+    """
+    app_configs = [config for config in apps.get_app_configs() if config.models_module is not None]
+    return sender is app_configs[-1]
 
 class MyComicAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
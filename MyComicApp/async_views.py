@@ -0,0 +1,210 @@
+"""
+Versiones asíncronas de las vistas de sólo lectura, usadas al servir con ASGI
+(``SERVER_MODE=asgi``). Comparten filtros, caché, ETags y serializadores con las
+vistas DRF; los métodos de escritura se delegan a esas vistas sincrónicas.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import exceptions, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import views
+from .cache import aget_versions, build_cache_key, record
+from .conditional import build_etag
+from .filters import filter_products
+from .models import Category, Product
+from .orders import order_history_queryset
+from .pagination import OrderCursorPagination, ProductCursorPagination
+from .serializers import CategorySerializer, OrderSerializer, ProductSerializer
+
+# Vistas DRF sincrónicas que atienden los métodos de escritura
+product_list_sync = views.ProductViewSet.as_view({'get': 'list', 'post': 'create'})
+product_detail_sync = views.ProductViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+)
+category_list_sync = views.CategoryViewSet.as_view({'get': 'list', 'post': 'create'})
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def throttle_wait(drf_request, view_class):
+    """
+    Aplica los límites de la vista DRF equivalente. Devuelve ``None`` si el request
+    está permitido o los segundos a esperar (como ``APIView.check_throttles``).
+    """
+    view = view_class()
+    waits = [throttle.wait() for throttle in view.get_throttles() if not throttle.allow_request(drf_request, view)]
+    if not waits:
+        return None
+    return max((wait for wait in waits if wait is not None), default=0)
+
+
+async def throttled_response(drf_request, view_class):
+    """Respuesta 429 si el request supera algún límite, o ``None``."""
+    if not api_settings.DEFAULT_THROTTLE_CLASSES:
+        return None
+    wait = await sync_to_async(throttle_wait)(drf_request, view_class)
+    if wait is None:
+        return None
+    exc = exceptions.Throttled(wait)
+    response = json_response({'detail': exc.detail}, status=exc.status_code)
+    if exc.wait:
+        response['Retry-After'] = str(exc.wait)
+    return response
+
+
+async def conditional_cached_response(request, basename, dependencies, last_modified, parts, build):
+    """
+    Igual que ``ConditionalGetMixin`` + ``CachedResponseMixin``: responde 304 si el
+    cliente tiene la versión vigente y, si no, sirve los datos desde la caché o los
+    construye con ``build``.
+    """
+    versions = await aget_versions(dependencies)
+    etag = build_etag(request, versions, *parts)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
+
+    key = build_cache_key(basename, versions, request)
+    data = await cache.aget(key)
+    record(hit=data is not None)
+    cache_status = 'HIT'
+    if data is None:
+        cache_status = 'MISS'
+        data = await build()
+        await cache.aset(key, data, settings.API_CACHE_TIMEOUT)
+
+    response = json_response(data)
+    response['X-Cache'] = cache_status
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def product_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(product_list_sync)(request)
+
+    drf_request = Request(request)
+    throttled = await throttled_response(drf_request, views.ProductViewSet)
+    if throttled is not None:
+        return throttled
+    try:
+        queryset = filter_products(Product.objects.all(), request.GET)
+        serializer = ProductSerializer(many=True, context={'request': drf_request})
+    except serializers.ValidationError as e:
+        return json_response(e.detail, status=400)
+    state = await queryset.order_by().aaggregate(last_modified=Max('updated_at'))
+
+    def paginate():
+        # La paginación por cursor evalúa el queryset de forma sincrónica; las filas de
+        # values() se serializan sin instanciar un Product por fila
+        paginator = ProductCursorPagination()
+        view = views.ProductViewSet()
+        # Sólo se agregan las columnas del ordenamiento pedido, que el cursor lee de la
+        # última fila (ver ProductViewSet.selected_columns)
+        ordering = {field.lstrip('-') for field in paginator.get_ordering(drf_request, queryset, view)}
+        rows = queryset.values(*serializer.child.columns() | ordering)
+        page = paginator.paginate_queryset(rows, drf_request, view=view)
+        data = serializer.to_representation(page)
+        return paginator.get_paginated_response(data).data
+
+    # Los listados no envían Last-Modified (ver ConditionalGetMixin)
+    return await conditional_cached_response(
+        request, 'product', (Product,), None, (state['last_modified'],), sync_to_async(paginate),
+    )
+
+
+async def product_detail(request, pk):
+    if request.method != 'GET':
+        return await sync_to_async(product_detail_sync)(request, pk=pk)
+
+    drf_request = Request(request)
+    throttled = await throttled_response(drf_request, views.ProductViewSet)
+    if throttled is not None:
+        return throttled
+    try:
+        queryset = filter_products(Product.objects.filter(pk=pk), request.GET)
+        serializer = ProductSerializer(context={'request': drf_request})
+    except serializers.ValidationError as e:
+        return json_response(e.detail, status=400)
+    last_modified = await queryset.values_list('updated_at', flat=True).afirst()
+    if last_modified is None:
+        return json_response({'detail': 'Not found.'}, status=404)
+
+    async def build():
+        product = await queryset.only(*serializer.columns()).aget()
+        return serializer.to_representation(product)
+
+    return await conditional_cached_response(
+        request, 'product', (Product,), last_modified, (last_modified,), build,
+    )
+
+
+async def category_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(category_list_sync)(request)
+
+    throttled = await throttled_response(Request(request), views.CategoryViewSet)
+    if throttled is not None:
+        return throttled
+    queryset = Category.objects.all()
+    state = await queryset.order_by().aaggregate(last_modified=Max('updated_at'))
+
+    async def build():
+        categories = [category async for category in queryset]
+        return CategorySerializer(categories, many=True).data
+
+    return await conditional_cached_response(
+        request, 'category', (Category,), None, (state['last_modified'],), build,
+    )
+
+
+async def user_orders(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    drf_request = Request(request)
+    user = None
+    try:
+        for authentication_class in views.UserOrdersView.authentication_classes:
+            user_auth = await sync_to_async(authentication_class().authenticate)(drf_request)
+            if user_auth is not None:
+                user = user_auth[0]
+                break
+    except exceptions.AuthenticationFailed as e:
+        response = json_response(e.get_full_details(), status=401)
+        response['WWW-Authenticate'] = 'Bearer realm="api"'
+        return response
+    if user is None:
+        response = json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+        response['WWW-Authenticate'] = 'Bearer realm="api"'
+        return response
+    drf_request.user = user
+    throttled = await throttled_response(drf_request, views.UserOrdersView)
+    if throttled is not None:
+        return throttled
+
+    def paginate():
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(order_history_queryset(user.id), drf_request)
+        return paginator.get_paginated_response(OrderSerializer(page, many=True).data).data
+
+    return json_response(await sync_to_async(paginate)())
+
+
+# Las escrituras delegadas se autentican con JWT, igual que en las vistas DRF
+for view in (product_list, product_detail, category_list, user_orders):
+    view.csrf_exempt = True
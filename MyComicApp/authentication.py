@@ -0,0 +1,144 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+# Claims que se agregan al token al emitirlo (ver CustomTokenObtainPairSerializer)
+USER_CLAIMS = ('email', 'is_staff', 'is_superuser', 'role', 'groups')
+
+_user_states = {}
+_user_states_lock = threading.Lock()
+
+
+def get_user_state(user_id):
+    """
+    Estado del usuario que puede revocar un token (existencia, ``is_active`` y
+    privilegios), cacheado en el proceso durante ``JWT_USER_STATE_TTL`` segundos.
+    Devuelve ``None`` si el usuario ya no existe.
+    """
+    now = time.monotonic()
+    with _user_states_lock:
+        entry = _user_states.get(user_id)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    state = (
+        get_user_model().objects.filter(pk=user_id)
+        .values('is_active', 'is_staff', 'is_superuser')
+        .first()
+    )
+    with _user_states_lock:
+        _user_states[user_id] = (now + settings.JWT_USER_STATE_TTL, state)
+    return state
+
+
+def forget_user_state(user_id=None):
+    """Descarta el estado cacheado de un usuario (o de todos) en este proceso."""
+    with _user_states_lock:
+        if user_id is None:
+            _user_states.clear()
+        else:
+            _user_states.pop(user_id, None)
+
+
+def get_user_instance(user):
+    """Devuelve la instancia de ``User`` detrás de ``request.user``."""
+    return user.instance if isinstance(user, ClaimsUser) else user
+
+
+class ClaimsUser(TokenUser):
+    """
+    Usuario construido con los claims firmados del token. La fila de ``User`` se
+    carga recién cuando una vista usa un atributo que no viaja en el token; los
+    permisos de Django también se resuelven con la instancia.
+    """
+
+    def __str__(self):
+        return self.email
+
+    @cached_property
+    def instance(self):
+        return get_user_model().objects.get(pk=self.id)
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def role_name(self):
+        return self.token.get('role')
+
+    @cached_property
+    def group_names(self):
+        return frozenset(self.token.get('groups', ()))
+
+    def get_username(self):
+        return self.email
+
+    @property
+    def groups(self):
+        return self.instance.groups
+
+    @property
+    def user_permissions(self):
+        return self.instance.user_permissions
+
+    def get_group_permissions(self, obj=None):
+        return self.instance.get_group_permissions(obj)
+
+    def get_all_permissions(self, obj=None):
+        return self.instance.get_all_permissions(obj)
+
+    def has_perm(self, perm, obj=None):
+        return self.instance.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return self.instance.has_perms(perm_list, obj)
+
+    def has_module_perms(self, module):
+        return self.instance.has_module_perms(module)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_') or attr in ('token', 'instance'):
+            raise AttributeError(attr)
+        return getattr(self.instance, attr)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Autenticación JWT sin leer ``User`` en cada request: ``request.user`` es un
+    ``ClaimsUser`` armado con los claims del token.
+
+    Para que desactivar un usuario o quitarle privilegios tenga efecto antes de que
+    venza el token, se consulta su estado con una caché de pocos segundos por proceso.
+    El rol y los grupos se vuelven a leer en cada rotación del refresh token (ver
+    ``CustomTokenRefreshSerializer``).
+    Los tokens emitidos antes de agregar los claims se autentican como siempre.
+    """
+
+    def get_user(self, validated_token):
+        if 'email' not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('El token no contiene la identificación del usuario')
+
+        state = get_user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed('Usuario no encontrado', code='user_not_found')
+        if not state['is_active']:
+            raise AuthenticationFailed('El usuario está inactivo', code='user_inactive')
+
+        user = ClaimsUser(validated_token)
+        # Los privilegios quitados después de emitir el token se respetan
+        user.is_staff = user.is_staff and state['is_staff']
+        user.is_superuser = user.is_superuser and state['is_superuser']
+        return user
@@ -0,0 +1,21 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .permissions import get_cached_permissions
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` que además cachea los permisos de cada usuario entre requests.
+
+    Django sólo los guarda en el objeto ``user`` del request; acá se reutilizan hasta
+    que cambia la versión de permisos (grupos, membresías o permisos asignados).
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = get_cached_permissions(
+                user_obj, lambda: super(CachedModelBackend, self).get_all_permissions(user_obj)
+            )
+        return user_obj._perm_cache
@@ -0,0 +1,223 @@
+"""
+Importación y exportación masiva de productos en CSV o NDJSON (un objeto JSON por línea).
+
+La importación lee el archivo en streaming, valida las filas por bloques con
+``ProductImportSerializer`` y hace un upsert por ISBN con ``bulk_create``. La
+exportación recorre el catálogo con un cursor del servidor, así que la memoria usada
+no depende de la cantidad de productos.
+"""
+import codecs
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import bump_version
+from .models import Category, Product
+from .search import update_search_vectors
+from .serializers import ProductSerializer
+
+FILE_TYPES = ('csv', 'ndjson')
+
+# Campos que se importan; el resto (imagen, estado de la imagen, etc.) no se modifica
+IMPORT_FIELDS = [
+    'isbn', 'name', 'description', 'price', 'discount', 'stock',
+    'pages', 'format', 'weight', 'category', 'calification',
+]
+EXPORT_FIELDS = ['id_product', *IMPORT_FIELDS, 'image']
+
+CHUNK_SIZE = 1000
+# Cantidad máxima de errores detallados en el resultado
+MAX_REPORTED_ERRORS = 1000
+
+
+class CategoryField(serializers.PrimaryKeyRelatedField):
+    # Las categorías se resuelven con un diccionario cargado una vez por importación
+    def to_internal_value(self, data):
+        categories = self.context['categories']
+        try:
+            return categories[int(data)]
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class ProductImportSerializer(ProductSerializer):
+    image = None
+    images = None
+    category = CategoryField(queryset=Category.objects.all())
+
+    class Meta(ProductSerializer.Meta):
+        exclude = None
+        fields = IMPORT_FIELDS
+
+
+def detect_file_type(name, file_type=None):
+    if file_type:
+        file_type = file_type.lower()
+    elif name.lower().endswith('.csv'):
+        file_type = 'csv'
+    elif name.lower().endswith(('.ndjson', '.jsonl')):
+        file_type = 'ndjson'
+    if file_type not in FILE_TYPES:
+        raise serializers.ValidationError({'type': f"Tipo de archivo no soportado; use uno de: {', '.join(FILE_TYPES)}."})
+    return file_type
+
+
+def check_encoding(binary_file):
+    """
+    Verifica que el archivo sea UTF-8 antes de importar nada (un error a mitad de la
+    lectura dejaría la importación por la mitad) y lo vuelve al inicio.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    number = 0
+    try:
+        for number, line in enumerate(binary_file, start=1):
+            decoder.decode(line)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise serializers.ValidationError({'file': [f'El archivo no está codificado en UTF-8 (línea {number}).']})
+    binary_file.seek(0)
+
+
+def iter_rows(binary_file, file_type):
+    """Produce ``(número de fila, dict)`` leyendo el archivo línea por línea."""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    if file_type == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            # En CSV una celda vacía equivale a "sin valor"
+            yield number, {key: (value if value != '' else None) for key, value in row.items()}
+    else:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, e
+                continue
+            yield number, row if isinstance(row, dict) else ValueError('Se esperaba un objeto JSON')
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _upsert(products):
+    """
+    Inserta o actualiza ``products``. Cada fila se asocia al producto con su
+    ``id_product`` (presente en los archivos exportados) o, si no lo trae, al de su
+    ISBN. El ISBN no es único en la tabla (el catálogo inicial tiene repetidos), así
+    que el conflicto se resuelve sobre la clave primaria.
+    """
+    ids = {product.pk for product in products if product.pk is not None}
+    existing_ids = set(Product.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    isbns = {product.isbn for product in products if product.isbn}
+    by_isbn = {}
+    for pk, isbn in Product.objects.filter(isbn__in=isbns).order_by('-pk').values_list('pk', 'isbn'):
+        by_isbn[isbn] = pk  # con ISBN repetido queda el de menor id
+
+    by_key = {}
+    for product in products:
+        if product.pk not in existing_ids:
+            product.pk = by_isbn.get(product.isbn)
+        # Si dos filas del bloque apuntan al mismo producto gana la última
+        key = product.pk or product.isbn or id(product)
+        by_key[key] = product
+    products = list(by_key.values())
+
+    updated = [product for product in products if product.pk is not None]
+    created = [product for product in products if product.pk is None]
+    if updated:
+        Product.objects.bulk_create(
+            updated, update_conflicts=True, unique_fields=['id_product'],
+            update_fields=[*IMPORT_FIELDS, 'updated_at'],
+        )
+    if created:
+        Product.objects.bulk_create(created)
+    return len(created), len(updated)
+
+
+def import_products(binary_file, file_type, chunk_size=CHUNK_SIZE):
+    """
+    Importa productos desde ``binary_file``. Las filas válidas de cada bloque se
+    guardan aunque otras tengan errores; devuelve los totales y los errores por fila.
+    """
+    check_encoding(binary_file)
+    started = timezone.now()
+    # Un solo serializer para todas las filas: construir sus campos es lo más costoso
+    serializer = ProductImportSerializer(context={'categories': Category.objects.in_bulk()})
+    result = {'created': 0, 'updated': 0, 'invalid': 0, 'errors': []}
+
+    for chunk in _chunks(iter_rows(binary_file, file_type), chunk_size):
+        products = []
+        for number, row in chunk:
+            if isinstance(row, Exception):
+                errors = {'non_field_errors': [str(row)]}
+            else:
+                product_id = row.get('id_product')
+                try:
+                    validated_data = serializer.run_validation(row)
+                    if product_id is not None and not str(product_id).isdigit():
+                        raise serializers.ValidationError({'id_product': ['Debe ser un número entero.']})
+                except serializers.ValidationError as e:
+                    errors = e.detail
+                else:
+                    products.append(Product(pk=int(product_id) if product_id is not None else None, **validated_data))
+                    continue
+            result['invalid'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append({'row': number, 'errors': errors})
+
+        if products:
+            with transaction.atomic():
+                created, updated = _upsert(products)
+            result['created'] += created
+            result['updated'] += updated
+
+    if result['created'] or result['updated']:
+        # bulk_create no llama a Product.save ni emite señales
+        update_search_vectors(Product.objects.filter(updated_at__gte=started))
+        bump_version(Product)
+    return result
+
+
+class _Echo:
+    # "Archivo" cuyo write devuelve la línea, para usar csv.writer en un generador
+    def write(self, value):
+        return value
+
+
+def export_products(file_type, queryset=None, chunk_size=2000):
+    """Genera el catálogo línea por línea en CSV o NDJSON."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    columns = [field if field != 'category' else 'category_id' for field in EXPORT_FIELDS]
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+
+    if file_type == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(_export_value(value) for value in row)
+    else:
+        for row in rows:
+            yield json.dumps(
+                dict(zip(EXPORT_FIELDS, map(_export_value, row))), cls=DjangoJSONEncoder, ensure_ascii=False,
+            ) + '\n'
+
+
+def _export_value(value):
+    # Las imágenes se exportan como URL pública
+    return getattr(value, 'url', value)
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+VERSION_KEY = 'api-cache:version:{}'
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def _initial_version():
+    # Si la clave de versión fue desalojada no se debe volver a un valor ya usado
+    return int(time.time() * 1000)
+
+
+def get_versions(models):
+    """Devuelve la versión actual de cada modelo con una sola lectura a la caché."""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(models):
+    """Versión asíncrona de ``get_versions`` para las vistas async."""
+    keys = [_version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, _initial_version(), None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def build_cache_key(basename, versions, request):
+    """Clave de una respuesta: host, ruta, parámetros ordenados y versiones de sus modelos."""
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    raw = f'{request.get_host()}{request.path}?{params}'
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return 'api-cache:{}:{}:{}'.format(basename, '.'.join(str(v) for v in versions), digest)
+
+
+def bump_version(model):
+    """Invalida todas las respuestas cacheadas que dependen de ``model``."""
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), None)
+
+
+def record(hit):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+    stats['backend'] = settings.CACHES['default']['BACKEND']
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Cachea las respuestas de ``list`` y ``retrieve`` de un ViewSet.
+
+    La clave incluye los parámetros de la consulta y la versión de cada modelo en
+    ``cache_dependencies``; las señales de guardado/borrado incrementan esa versión,
+    por lo que una escritura deja obsoletas las páginas cacheadas sin vaciar la caché.
+    """
+    cache_dependencies = ()
+    cache_timeout = None
+
+    def get_cache_key(self, request, *args, **kwargs):
+        return build_cache_key(self.basename, get_versions(self.cache_dependencies), request)
+
+    def cached_response(self, action, request, *args, **kwargs):
+        key = self.get_cache_key(request, *args, **kwargs)
+        data = cache.get(key)
+        if data is not None:
+            record(hit=True)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record(hit=False)
+        response = action(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.cache_timeout if self.cache_timeout is not None else settings.API_CACHE_TIMEOUT
+            cache.set(key, response.data, timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
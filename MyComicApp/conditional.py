@@ -0,0 +1,67 @@
+import hashlib
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_versions
+
+
+def build_etag(request, versions, *parts):
+    """ETag fuerte a partir de la URL, las versiones de caché y el estado de las filas."""
+    raw = '|'.join(str(part) for part in (request.get_full_path(), *versions, *parts))
+    return '"{}"'.format(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Agrega ``ETag`` a ``list`` y ``retrieve`` (y ``Last-Modified`` a ``retrieve``) y
+    responde 304 cuando el cliente ya tiene la versión vigente (``If-None-Match`` /
+    ``If-Modified-Since``).
+
+    El estado se obtiene de la columna indexada ``updated_at`` con una sola consulta
+    agregada, sin serializar el contenido. El ETag de los listados incluye además la
+    versión de caché del modelo, que cambia con los borrados; los listados no envían
+    ``Last-Modified`` porque ``Max(updated_at)`` no cambia al borrar una fila.
+    """
+    updated_field = 'updated_at'
+
+    def get_etag(self, request, *parts):
+        return build_etag(request, get_versions(getattr(self, 'cache_dependencies', ())), *parts)
+
+    def conditional_response(self, action, request, last_modified, etag, *args, **kwargs):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+
+        response = action(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            response['Cache-Control'] = 'no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        last_modified = queryset.order_by().aggregate(last_modified=Max(self.updated_field))['last_modified']
+        etag = self.get_etag(request, last_modified)
+        return self.conditional_response(super().list, request, None, etag, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            last_modified = (
+                self.filter_queryset(self.get_queryset())
+                .filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+                .values_list(self.updated_field, flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            last_modified = None
+        if last_modified is None:
+            # El objeto no existe o el id es inválido: la vista devuelve el 404 habitual
+            return super().retrieve(request, *args, **kwargs)
+        etag = self.get_etag(request, last_modified)
+        return self.conditional_response(super().retrieve, request, last_modified, etag, *args, **kwargs)
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones en proceso, compartido por todos los hilos de un worker.
+
+    Conserva hasta ``max_size`` conexiones ociosas y permite abrir ``max_overflow``
+    conexiones extra en picos, que se cierran al devolverse si ya no hay lugar entre
+    las ociosas. Si no hay conexiones disponibles se espera hasta ``timeout`` segundos
+    antes de fallar. Una conexión que estuvo ociosa más de ``ping_after`` segundos se
+    verifica con ``SELECT 1`` antes de reutilizarla.
+    """
+
+    def __init__(self, connect, max_size=5, max_overflow=5, timeout=10.0, ping_after=300.0):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'overflow': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time': 0.0,
+        }
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, released_at = self._checkout(deadline)
+            if conn is None:
+                return self._open()
+            # El ping se hace fuera del lock: con la base lenta o caída los demás hilos no
+            # esperan detrás de él
+            if self._is_healthy(conn, released_at):
+                with self._cond:
+                    self._stats['reused'] += 1
+                return conn
+            with self._cond:
+                self._in_use -= 1
+                self._size -= 1
+                self._stats['discarded'] += 1
+                self._cond.notify()
+            self._close(conn)
+
+    def _checkout(self, deadline):
+        """
+        Toma la conexión ociosa más reciente, o reserva el lugar para abrir una nueva
+        (devuelve ``None``), esperando hasta ``deadline`` si el pool está lleno.
+        """
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    self._in_use += 1
+                    return conn, released_at
+                if self._size < self.max_size + self.max_overflow:
+                    self._size += 1
+                    self._in_use += 1
+                    if self._size > self.max_size:
+                        self._stats['overflow'] += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No hay conexiones disponibles en el pool tras {self.timeout}s '
+                        f'(max_size={self.max_size}, max_overflow={self.max_overflow})'
+                    )
+                if not waited:
+                    waited = True
+                    self._stats['waits'] += 1
+                started = time.monotonic()
+                self._cond.wait(remaining)
+                self._stats['wait_time'] += time.monotonic() - started
+
+    def _open(self):
+        # Abrir la conexión fuera del lock: el handshake puede tardar
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            self._in_use -= 1
+            # Como máximo se conservan max_size conexiones ociosas; el resto se cierra
+            if discard or conn.closed or len(self._idle) >= self.max_size:
+                self._discard(conn)
+            else:
+                try:
+                    # No devolver al pool una conexión con una transacción abierta
+                    if conn.info.transaction_status != 0:
+                        conn.rollback()
+                    self._idle.append((conn, time.monotonic()))
+                except Exception:
+                    self._discard(conn)
+            self._cond.notify()
+
+    def _is_healthy(self, conn, released_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - released_at < self.ping_after:
+            return True
+        # Conexión ociosa por mucho tiempo: verificar que el servidor siga respondiendo
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        self._size -= 1
+        self._stats['discarded'] += 1
+        self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        """Cierra las conexiones ociosas (p. ej. antes de eliminar la base de datos)."""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(size=self._size, idle=len(self._idle), in_use=self._in_use,
+                         max_size=self.max_size, max_overflow=self.max_overflow)
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict, connect):
+    # Un pool por base de destino: durante los tests el mismo alias apunta a otra base
+    key = (alias, settings_dict['NAME'], settings_dict['HOST'], settings_dict['PORT'], settings_dict['USER'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = settings_dict.get('POOL', {})
+            pool = ConnectionPool(
+                connect,
+                max_size=options.get('MAX_SIZE', 5),
+                max_overflow=options.get('MAX_OVERFLOW', 5),
+                timeout=options.get('TIMEOUT', 10.0),
+                ping_after=options.get('PING_AFTER', 300.0),
+            )
+            _pools[key] = pool
+        return pool
+
+
+def pool_stats():
+    """Métricas de todos los pools del proceso, por alias y nombre de base de datos."""
+    with _pools_lock:
+        return {f'{key[0]}:{key[1]}': pool.stats() for key, pool in _pools.items()}
+
+
+def close_pools(name=None):
+    """Cierra las conexiones ociosas de los pools, opcionalmente sólo los de la base ``name``."""
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if name is None or key[1] == name]
+    for pool in pools:
+        pool.close_idle()
@@ -0,0 +1,41 @@
+"""
+Backend de PostgreSQL que toma las conexiones de un pool en proceso (ver ``db/pool.py``).
+
+Se habilita con ``DB_POOL=True``; las conexiones se devuelven al pool al terminar
+cada request en lugar de cerrarse.
+"""
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from ..pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Las conexiones ociosas del pool impedirían eliminar la base de tests
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict, self._connect_raw)
+
+    def _connect_raw(self):
+        return super().get_new_connection(self.get_connection_params())
+
+    def get_new_connection(self, conn_params):
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = (
+            IsolationLevel(isolation_level) if isolation_level is not None else IsolationLevel.READ_COMMITTED
+        )
+        return self.pool.acquire()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection, discard=self.errors_occurred)
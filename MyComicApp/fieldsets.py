@@ -0,0 +1,64 @@
+"""
+Selección de campos de las respuestas (sparse fieldsets).
+
+``?fields=id_product,name,price`` envía sólo esos campos y ``?view=card`` un conjunto
+con nombre definido en ``Meta.views`` del serializer (``view=full`` o sin parámetros,
+todos). Las vistas usan los campos elegidos para leer sólo las columnas necesarias
+(ver ``ProductViewSet``).
+"""
+from rest_framework import serializers
+
+FULL_VIEW = 'full'
+
+
+def requested_fields(params, available, views):
+    """
+    Campos pedidos con ``fields`` o ``view`` en el orden de ``available``, o ``None``
+    si se piden todos. ``fields`` tiene prioridad sobre ``view``.
+    """
+    fields = params.get('fields')
+    view = params.get('view')
+    if fields:
+        names = {name.strip() for name in fields.split(',') if name.strip()}
+        unknown = names - set(available)
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Campos desconocidos: {', '.join(sorted(unknown))}"})
+    elif view and view != FULL_VIEW:
+        if view not in views:
+            options = ', '.join([*views, FULL_VIEW])
+            raise serializers.ValidationError({'view': f"Vista desconocida: '{view}'. Opciones: {options}"})
+        names = set(views[view])
+    else:
+        return None
+    return [name for name in available if name in names]
+
+
+class SparseFieldsMixin:
+    """
+    Serializer que, en los GET, envía sólo los campos pedidos en la request de su
+    contexto. Las vistas con nombre se declaran en ``Meta.views``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        selected = requested_fields(request.query_params, list(self.fields), getattr(self.Meta, 'views', {}))
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    """
+    ``ListSerializer`` que acepta filas de ``values()``: arma cada dict con
+    ``child.represent_rows`` en lugar de recorrer los campos de DRF por fila. Con
+    instancias de modelos funciona como siempre.
+    """
+
+    def to_representation(self, data):
+        rows = list(data.all() if hasattr(data, 'all') else data)
+        if rows and isinstance(rows[0], dict):
+            return self.child.represent_rows(rows)
+        return super().to_representation(rows)
@@ -0,0 +1,56 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+def _parse(value, cast, name):
+    try:
+        result = cast(value)
+    except (TypeError, ValueError, InvalidOperation):
+        raise serializers.ValidationError({name: f"Valor inválido: '{value}'"})
+    # Decimal acepta 'NaN' e 'Infinity', que la base no puede comparar
+    if isinstance(result, Decimal) and not result.is_finite():
+        raise serializers.ValidationError({name: f"Valor inválido: '{value}'"})
+    return result
+
+
+def filter_products(queryset, params):
+    """
+    Filtros del catálogo respaldados por índices de ``Product``:
+
+    - ``category``: id de la categoría
+    - ``min_price`` / ``max_price``: rango de precio
+    - ``in_stock``: ``true`` para listar sólo productos con stock
+    - ``min_calification``: calificación mínima
+    """
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(category_id=_parse(category, int, 'category'))
+
+    min_price = params.get('min_price')
+    if min_price:
+        queryset = queryset.filter(price__gte=_parse(min_price, Decimal, 'min_price'))
+
+    max_price = params.get('max_price')
+    if max_price:
+        queryset = queryset.filter(price__lte=_parse(max_price, Decimal, 'max_price'))
+
+    in_stock = params.get('in_stock', '').lower()
+    if in_stock in ('true', '1'):
+        queryset = queryset.filter(stock__gt=0)
+    elif in_stock in ('false', '0'):
+        queryset = queryset.filter(stock__lte=0)
+
+    min_calification = params.get('min_calification')
+    if min_calification:
+        queryset = queryset.filter(calification__gte=_parse(min_calification, Decimal, 'min_calification'))
+
+    return queryset
+
+
+class ProductFilter(BaseFilterBackend):
+    """Aplica ``filter_products`` con los parámetros de la consulta."""
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_products(queryset, request.query_params)
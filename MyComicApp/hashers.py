@@ -0,0 +1,38 @@
+"""
+Hashers de contraseñas con parámetros configurables (ver PASSWORD_HASHER en settings).
+
+Conservan el identificador de algoritmo de Django (``argon2`` y ``bcrypt_sha256``),
+así que los hashes existentes se siguen verificando. Como ``must_update`` compara los
+parámetros guardados con los configurados, al cambiar el perfil cada contraseña se
+vuelve a hashear la próxima vez que su usuario inicia sesión.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, BCryptSHA256PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id con el perfil de ``ARGON2_TIME_COST``, ``ARGON2_MEMORY_COST`` (KiB) y
+    ``ARGON2_PARALLELISM``. El perfil por defecto (t=2, 19 MiB, p=1) es el mínimo
+    recomendado por OWASP y mantiene el login en pocos milisegundos por núcleo.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """bcrypt (sobre SHA-256) con ``BCRYPT_ROUNDS`` rondas."""
+
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
@@ -0,0 +1,116 @@
+"""
+Requests idempotentes con el header ``Idempotency-Key``.
+
+Un cliente que reintenta un POST (p. ej. tras un timeout) envía la misma clave; la
+primera ejecución guarda su respuesta en ``IdempotencyKey`` y los reintentos la
+reciben sin volver a ejecutar la escritura. La clave es por usuario y se asocia a una
+huella del request (ruta y cuerpo): reutilizarla con otro cuerpo es un error.
+
+La fila de la clave se inserta y se bloquea en la misma transacción que la escritura.
+Un duplicado concurrente espera ese bloqueo (no los de ``products``) y, cuando la
+primera transacción confirma, recibe la respuesta guardada. Sólo se guardan las
+respuestas exitosas: si la escritura falla, la clave se descarta con la transacción
+y el cliente puede reintentar. Las claves vencen a las ``IDEMPOTENCY_KEY_TTL`` horas
+(comando ``purge_idempotency_keys``).
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def request_fingerprint(request):
+    """Huella de la ruta y el cuerpo del request (sin importar el orden de las claves)."""
+    body = json.dumps(request.data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def run_once(user_id, key, fingerprint, handler):
+    """
+    Ejecuta ``handler()`` una sola vez por usuario y clave. ``handler`` devuelve
+    ``(status_code, data)``. Devuelve ``(status_code, data, replayed)``; ``status_code``
+    es ``None`` si la clave ya se usó con otra huella.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # INSERT ... ON CONFLICT DO NOTHING: si otra transacción insertó la misma clave y
+        # todavía no confirmó, espera a que termine
+        IdempotencyKey.objects.bulk_create(
+            [IdempotencyKey(user_id=user_id, key=key, fingerprint=fingerprint, created_at=now,
+                            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL))],
+            ignore_conflicts=True,
+        )
+        record = IdempotencyKey.objects.select_for_update().get(user_id=user_id, key=key)
+
+        if record.status_code is not None and record.expires_at > now:
+            if record.fingerprint != fingerprint:
+                return None, None, False
+            return record.status_code, record.response, True
+
+        status_code, data = handler()
+        if not status.is_success(status_code):
+            # Sin respuesta guardada el cliente puede reintentar con la misma clave
+            transaction.set_rollback(True)
+            return status_code, data, False
+
+        record.fingerprint = fingerprint
+        record.status_code = status_code
+        record.response = data
+        record.created_at = now
+        record.expires_at = now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL)
+        record.save()
+    return status_code, data, False
+
+
+def idempotent_response(request, handler):
+    """
+    Respuesta de una vista con soporte de ``Idempotency-Key``. Sin header se ejecuta
+    ``handler()`` como siempre; los reintentos se marcan con ``Idempotent-Replayed``.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        status_code, data = handler()
+        return Response(data, status=status_code)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {'error': f'El header {HEADER} debe tener entre 1 y {MAX_KEY_LENGTH} caracteres.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    status_code, data, replayed = run_once(request.user.id, key, request_fingerprint(request), handler)
+    if status_code is None:
+        return Response(
+            {'error': f'El {HEADER} ya se usó con otros datos.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(data, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def purge_expired_keys(batch_size=5000, pause=0.0):
+    """Borra las claves vencidas en lotes de ``batch_size``. Devuelve la cantidad borrada."""
+    cutoff = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lt=cutoff)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,66 @@
+from functools import lru_cache
+
+import cloudinary
+
+from .uploads import public_id_from_url
+
+# Tamaños precalculados para la grilla del catálogo, las tarjetas y el detalle
+IMAGE_VARIANTS = {
+    'thumbnail': {'width': 150, 'height': 225, 'crop': 'fill'},
+    'card': {'width': 300, 'height': 450, 'crop': 'fill'},
+    'detail': {'width': 800, 'crop': 'limit'},
+}
+
+# 'auto' deja que Cloudinary elija el formato según el header Accept del navegador
+IMAGE_FORMATS = {
+    'url': 'auto',
+    'webp': 'webp',
+    'avif': 'avif',
+}
+
+
+def get_public_id(image):
+    """
+    Devuelve el public_id de Cloudinary de la imagen de un producto, o ``None`` si la
+    imagen no está alojada en Cloudinary (p. ej. rutas ``/assets/...`` del frontend).
+    """
+    if not image:
+        return None
+    value = getattr(image, 'public_id', None) or str(image)
+    if value.startswith('/'):
+        return None
+    if value.startswith(('http://', 'https://')):
+        if 'res.cloudinary.com' not in value:
+            return None
+        return public_id_from_url(value)
+    return value
+
+
+@lru_cache(maxsize=4096)
+def build_image_urls(public_id):
+    """
+    URLs de todas las variantes de ``public_id``, memoizadas por proceso.
+
+    El resultado se comparte entre llamadas: no debe modificarse.
+    """
+    urls = {}
+    for variant, transformation in IMAGE_VARIANTS.items():
+        urls[variant] = {
+            key: cloudinary.CloudinaryImage(public_id).build_url(
+                secure=True,
+                transformation=[dict(transformation, quality='auto', fetch_format=fetch_format)],
+            )
+            for key, fetch_format in IMAGE_FORMATS.items()
+        }
+    return urls
+
+
+def product_image_urls(image, variants=None):
+    """Variantes de la imagen de un producto, opcionalmente limitadas a ``variants``."""
+    public_id = get_public_id(image)
+    if public_id is None:
+        return None
+    urls = build_image_urls(public_id)
+    if variants is None:
+        return urls
+    return {variant: urls[variant] for variant in variants if variant in urls}
@@ -1,49 +1,325 @@
+"""
+Carga de los datos iniciales (``initial_data.sql``) al terminar ``migrate``.
+
+El archivo se lee en streaming y se recorre una sola vez: cada ``INSERT INTO tabla
+(...) VALUES (...), ...`` se separa en filas que se insertan en lotes (con COPY en
+PostgreSQL), así que el tamaño del archivo no está limitado por la memoria. Cada tabla
+se carga sólo si está vacía, en su propia transacción, y el checksum del archivo queda
+registrado en ``SeedData`` para no volver a procesarlo mientras no cambie.
+"""
+import hashlib
+import io
 import os
-from django.db import connection
+import re
+import sys
+from decimal import Decimal
+
+from django.apps import apps
 from django.conf import settings
+from django.db import DatabaseError, connection, transaction
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
+from django.utils import timezone
 
-@receiver(post_migrate)
-def load_data_script(sender, **kwargs):
-    sql_file_path = os.path.join(settings.BASE_DIR, 'MyComicApp', 'initial_data.sql')
+from .apps import is_last_post_migrate
 
-    if not os.path.exists(sql_file_path):
-        print(f'SQL file not found: {sql_file_path}')
-        return
+SEED_FILE = os.path.join(settings.BASE_DIR, 'MyComicApp', 'initial_data.sql')
 
-    # Lista de tablas afectadas por el script
-    affected_tables = ['categories', 'products', 'roles', 'mycomicapp_user', 'orders', 'order_items']
+# Tamaño de lectura del archivo y cantidad de filas por lote
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+
+INT_RE = re.compile(r'^[+-]?\d+$')
+DECIMAL_RE = re.compile(r'^[+-]?(\d+\.\d*|\.\d+)([eE][+-]?\d+)?$')
+
+
+class SeedSyntaxError(Exception):
+    pass
+
+
+# Un token por coincidencia; los comentarios y los espacios se descartan. Un texto termina
+# en una comilla que no va seguida de otra ('' es una comilla escapada)
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | '(?P<string>[^']*(?:''[^']*)*)'(?!')
+  | "(?P<ident>[^"]*(?:""[^"]*)*)"(?!")
+  | (?P<punctuation>[(),;])
+  | (?P<word>[^\s(),;'"]+)
+""", re.S | re.X)
+
+
+def _read_chunks(path):
+    with open(path, encoding='utf-8') as file:
+        yield from iter(lambda: file.read(CHUNK_SIZE), '')
+
+
+def tokenize(chunks):
+    """
+    Convierte el SQL (un texto o un iterable de fragmentos) en tokens ``(tipo, valor)``:
+    'string', 'word', 'ident' (entre comillas dobles) o un signo de puntuación. Respeta
+    las comillas y descarta los comentarios, por lo que un ';' dentro de un texto no
+    corta la sentencia.
+
+    Cada fragmento se recorre con ``TOKEN_RE``; un token que llega al final del
+    fragmento puede seguir en el siguiente, así que se vuelve a buscar con más texto.
+    """
+    chunks = iter([chunks] if isinstance(chunks, str) else chunks)
+    buffer, pos, eof = '', 0, False
+    while True:
+        match = TOKEN_RE.match(buffer, pos)
+        if not eof and (match is None or match.end() == len(buffer)):
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        if match is None:
+            if pos == len(buffer):
+                return
+            raise SeedSyntaxError('Texto sin cerrar al final del archivo')
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'string':
+            yield ('string', match.group('string').replace("''", "'"))
+        elif kind == 'ident':
+            yield ('ident', match.group('ident').replace('""', '"'))
+        elif kind == 'punctuation':
+            yield (match.group(kind), match.group(kind))
+        elif kind == 'word':
+            yield ('word', match.group(kind))
+
+
+def _literal(token):
+    kind, value = token
+    if kind == 'string':
+        return value
+    if kind == 'word':
+        upper = value.upper()
+        if upper == 'NULL':
+            return None
+        if upper in ('TRUE', 'FALSE'):
+            return upper == 'TRUE'
+        if INT_RE.match(value):
+            return int(value)
+        if DECIMAL_RE.match(value):
+            return Decimal(value)
+    raise SeedSyntaxError(f'Valor no soportado en los datos iniciales: {value!r}')
+
+
+def iter_inserts(tokens):
+    """
+    Recorre las sentencias ``INSERT`` y produce, para cada una, ``(tabla, columnas,
+    filas)`` donde ``filas`` es un generador que debe consumirse antes de avanzar.
+    Las sentencias de otro tipo se ignoran.
+    """
+    tokens = iter(tokens)
+    for token in tokens:
+        if token[0] == ';':
+            continue
+        if token[0] != 'word' or token[1].upper() != 'INSERT':
+            # Sentencia no soportada: descartarla hasta el ';'
+            for token in tokens:
+                if token[0] == ';':
+                    break
+            continue
+
+        if next(tokens, ('', ''))[1].upper() != 'INTO':
+            raise SeedSyntaxError('Se esperaba INSERT INTO')
+        table = next(tokens)[1]
+        columns = []
+        token = next(tokens)
+        if token[0] == '(':
+            for token in tokens:
+                if token[0] == ')':
+                    break
+                if token[0] != ',':
+                    columns.append(token[1])
+            token = next(tokens)
+        if token[1].upper() != 'VALUES':
+            raise SeedSyntaxError(f'Se esperaba VALUES en el INSERT de {table}')
+
+        yield table, columns, _iter_rows(tokens, table)
 
-    # Verificar y cargar datos en cada tabla individualmente
-    with connection.cursor() as cursor:
-        for table in affected_tables:
-            try:
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                count = cursor.fetchone()[0]
-                if count == 0:
-                    # Leer datos específicos para la tabla
-                    with open(sql_file_path, 'r') as file:
-                        sql = file.read()
-                        # Extraer solo los datos relevantes para la tabla actual
-                        table_data = extract_table_data(sql, table)
-                        if table_data:
-                            cursor.execute(table_data)
-                            print(f'Successfully loaded data for table {table}')
-            except Exception as e:
-                print(f"Skipping table {table} because it does not exist yet: {e}")
-                continue
 
-def extract_table_data(sql, table):
+def _iter_rows(tokens, table):
+    for token in tokens:
+        if token[0] == ';':
+            return
+        if token[0] == ',':
+            continue
+        if token[0] != '(':
+            raise SeedSyntaxError(f'Fila inválida en el INSERT de {table}: {token[1]!r}')
+        row = []
+        for token in tokens:
+            if token[0] == ')':
+                break
+            if token[0] != ',':
+                row.append(_literal(token))
+        yield row
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _insert_batch(cursor, table, columns, rows):
+    qn = connection.ops.quote_name
+    target = qn(table)
+    if columns:
+        target += ' ({})'.format(', '.join(qn(column) for column in columns))
+    if connection.vendor == 'postgresql':
+        sql = f'COPY {target} FROM STDIN'
+        raw_cursor = cursor.cursor
+        with connection.wrap_database_errors:
+            if hasattr(raw_cursor, 'copy_expert'):  # psycopg2
+                data = ''.join('\t'.join(_copy_value(value) for value in row) + '\n' for row in rows)
+                raw_cursor.copy_expert(sql, io.StringIO(data))
+            else:  # psycopg 3
+                with raw_cursor.copy(sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+    else:
+        placeholders = ', '.join(['%s'] * len(rows[0]))
+        cursor.executemany(f'INSERT INTO {target} VALUES ({placeholders})', rows)
+
+
+def _model_defaults(table, columns):
+    """
+    Columnas obligatorias del modelo de ``table`` que el archivo no incluye (p. ej.
+    ``updated_at``), con el valor que les daría Django al crear el objeto.
+    """
+    model = next((model for model in apps.get_models() if model._meta.db_table == table), None)
+    if model is None or not columns:
+        return [], []
+    extra_columns, values = [], []
+    for field in model._meta.concrete_fields:
+        if field.column in columns or field.primary_key or field.null:
+            continue
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            value = timezone.now()
+        elif field.has_default():
+            value = field.get_default()
+        else:
+            continue
+        extra_columns.append(field.column)
+        values.append(field.get_db_prep_save(value, connection))
+    return extra_columns, values
+
+
+def _table_is_empty(cursor, table):
+    cursor.execute(f'SELECT 1 FROM {connection.ops.quote_name(table)} LIMIT 1')
+    return cursor.fetchone() is None
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_seed_file(path=SEED_FILE, force=False, batch_size=BATCH_SIZE, verbosity=1, stdout=None):
     """
-    Función auxiliar para extraer los datos de la tabla específica desde el archivo SQL.
+    Carga ``path`` en las tablas vacías. Devuelve la cantidad de filas cargadas por
+    tabla, o ``None`` si el archivo no cambió desde la última carga. El progreso se
+    escribe en ``stdout`` (por defecto, la salida estándar).
     """
-    # Dividir el SQL en sentencias individuales
-    sql_statements = sql.split(';')
-    table_data = []
+    from .models import SeedData
+
+    stdout = stdout or sys.stdout
 
-    for statement in sql_statements:
-        if table in statement:
-            table_data.append(statement.strip())
+    def log(message):
+        if verbosity >= 1:
+            stdout.write(f'{message}\n')
+    if not os.path.exists(path):
+        log(f'SQL file not found: {path}')
+        return None
 
-    return ';\n'.join(table_data) + ';' if table_data else None
\ No newline at end of file
+    name = os.path.basename(path)
+    stat = os.stat(path)
+    record = SeedData.objects.filter(name=name).first()
+    if record is not None and not force:
+        if (record.size, record.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return None
+    checksum = file_checksum(path)
+    if record is not None and not force and record.checksum == checksum:
+        SeedData.objects.filter(pk=record.pk).update(mtime_ns=stat.st_mtime_ns)
+        return None
+
+    loaded = {}
+    # Tablas a cargar (True), a omitir (False) o que fallaron (None)
+    decisions = {}
+    # Cada tabla se carga en su propia transacción y no todo el archivo en una sola: una
+    # tabla a medio cargar quedaría no vacía y el próximo migrate ya no la completaría
+    with connection.cursor() as cursor:
+        for table, columns, rows in iter_inserts(tokenize(_read_chunks(path))):
+            if table not in decisions:
+                try:
+                    with transaction.atomic():
+                        decisions[table] = _table_is_empty(cursor, table)
+                except DatabaseError as e:
+                    log(f'Skipping table {table} because it does not exist yet: {e}')
+                    decisions[table] = None
+            if not decisions[table]:
+                for _ in rows:
+                    pass
+                continue
+
+            extra_columns, extra_values = _model_defaults(table, columns)
+            try:
+                with transaction.atomic():
+                    batch = []
+                    for row in rows:
+                        batch.append(row + extra_values)
+                        if len(batch) >= batch_size:
+                            _insert_batch(cursor, table, columns + extra_columns, batch)
+                            loaded[table] = loaded.get(table, 0) + len(batch)
+                            batch = []
+                    if batch:
+                        _insert_batch(cursor, table, columns + extra_columns, batch)
+                        loaded[table] = loaded.get(table, 0) + len(batch)
+                    # Las claves foráneas son diferidas: verificarlas antes de confirmar la tabla
+                    connection.check_constraints(table_names=[table])
+            except DatabaseError as e:
+                log(f'Skipping table {table} because its data could not be loaded: {e}')
+                decisions[table] = None
+                loaded.pop(table, None)
+                for _ in rows:
+                    pass
+
+        # Si alguna tabla falló se reintenta en el próximo migrate (sólo se cargan las vacías)
+        if None not in decisions.values():
+            SeedData.objects.update_or_create(
+                name=name,
+                defaults={'checksum': checksum, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns},
+            )
+
+    for table, count in loaded.items():
+        log(f'Successfully loaded {count} rows for table {table}')
+
+    if 'products' in loaded:
+        # Los productos cargados por SQL no pasan por Product.save
+        from .models import Product
+        from .search import update_search_vectors
+        update_search_vectors(Product.objects.filter(search_vector__isnull=True))
+    if 'order_items' in loaded:
+        # Los items cargados por SQL no traen la copia del producto (ver OrderItem.snapshot)
+        from .analytics import rebuild_daily_sales
+        from .orders import fill_item_snapshots
+        fill_item_snapshots()
+        rebuild_daily_sales()
+    return loaded
+
+
+@receiver(post_migrate)
+def load_data_script(sender, verbosity=1, stdout=None, **kwargs):
+    if is_last_post_migrate(sender):
+        load_seed_file(verbosity=verbosity, stdout=stdout)
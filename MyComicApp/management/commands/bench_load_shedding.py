@@ -0,0 +1,116 @@
+import http.client
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from MyComicApp.management.commands.bench_server_modes import wait_for_port
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga: levanta gunicorn y envía requests a una tasa fija mayor a la que puede '
+        'atender, sin y con descarte de carga, para comparar latencia y requests atendidos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=float, default=300, help='Requests por segundo enviados.')
+        parser.add_argument('--duration', type=float, default=10, help='Segundos de carga por variante.')
+        parser.add_argument('--workers', type=int, default=1, help='Workers de gunicorn.')
+        parser.add_argument('--queue-ms', type=float, default=500,
+                            help='LOAD_SHED_QUEUE_MS de la variante con descarte.')
+        parser.add_argument('--timeout', type=float, default=10, help='Segundos que espera cada cliente.')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--path', default='/api/products/?page_size=24')
+        parser.add_argument('--throttle', action='store_true',
+                            help='Mantiene los límites por cliente (todos los requests salen de la misma IP).')
+
+    def handle(self, *args, **options):
+        variants = {'sin descarte': '0', 'con descarte': str(options['queue_ms'])}
+        self.stdout.write(
+            f"{'variante':<14}{'enviados':>10}{'200':>8}{'503':>8}{'429':>8}{'errores':>9}"
+            f"{'200/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        )
+        for name, queue_ms in variants.items():
+            env = dict(
+                os.environ,
+                SERVER_MODE='wsgi',
+                WEB_CONCURRENCY=str(options['workers']),
+                GUNICORN_BIND=f"127.0.0.1:{options['port']}",
+                GUNICORN_ERRORLOG='-',
+                GUNICORN_TIMEOUT='120',
+                LOAD_SHED_QUEUE_MS=queue_ms,
+                # Sin caché cada request llega a la base, como en una ráfaga de scraping
+                API_CACHE_TIMEOUT='0',
+            )
+            if not options['throttle']:
+                env['THROTTLE_ENABLED'] = 'False'
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+            try:
+                if not wait_for_port('127.0.0.1', options['port'], timeout=30):
+                    raise CommandError(f'gunicorn no arrancó: {server.stderr.read1().decode()}')
+                result = self.run_load(options)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            self.stdout.write(
+                f"{name:<14}{result['sent']:>10}{result[200]:>8}{result[503]:>8}{result[429]:>8}"
+                f"{result['errors']:>9}{result[200] / options['duration']:>8.1f}"
+                f"{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+            )
+
+    def run_load(self, options):
+        def request(scheduled):
+            # Llegadas a tasa fija (carga abierta): cada request sale a su hora aunque los
+            # anteriores no hayan terminado, como los clientes reales
+            delay = scheduled - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            connection = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=options['timeout'])
+            try:
+                # El cliente hace de nginx: marca la hora en que el request llegó
+                connection.request('GET', options['path'], headers={'X-Request-Start': f't={scheduled:.3f}'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = None
+            finally:
+                connection.close()
+            return status, time.time() - scheduled
+
+        # Calentamiento: la primera request de cada worker carga Django
+        for _ in range(options['workers'] * 2):
+            request(time.time())
+
+        total = int(options['rate'] * options['duration'])
+        start = time.time() + 0.5
+        schedule = [start + i / options['rate'] for i in range(total)]
+        result = {'sent': total, 200: 0, 503: 0, 429: 0, 'errors': 0}
+        latencies = []
+        # Un hilo por request en vuelo: con carga abierta pueden acumularse hasta el timeout
+        threads = min(total, int(options['rate'] * options['timeout']) + 1)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for status, latency in executor.map(request, schedule):
+                if status in result:
+                    result[status] += 1
+                else:
+                    result['errors'] += 1
+                if status == 200:
+                    latencies.append(latency)
+        latencies.sort()
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[max(int(len(latencies) * p) - 1, 0)] * 1000
+
+        result.update(p50=percentile(0.50), p95=percentile(0.95), p99=percentile(0.99))
+        return result
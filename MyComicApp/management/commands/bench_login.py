@@ -0,0 +1,108 @@
+import io
+import json
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from MyComicApp.models import User
+from MyComicApp.serializers import CustomTokenObtainPairSerializer
+
+EMAIL = 'bench-login@example.com'
+PASSWORD = 'bench-password'
+
+
+def login_environ(path, body):
+    return {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+
+
+def legacy_login():
+    """Flujo anterior del login (autentica y luego valida el serializer), sólo para comparar."""
+    user = authenticate(email=EMAIL, password=PASSWORD)
+    serializer = CustomTokenObtainPairSerializer(data={'email': EMAIL, 'password': PASSWORD})
+    return user is not None and serializer.is_valid()
+
+
+class Command(BaseCommand):
+    help = 'Mide logins por segundo en un núcleo con cada hasher de contraseñas (los cambios se descartan).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help='Logins por hasher.')
+        parser.add_argument('--hasher', action='append', choices=list(settings.PASSWORD_HASHER_PROFILES),
+                            help='Hasher a medir (se puede repetir; por defecto todos los disponibles).')
+        parser.add_argument('--legacy', action='store_true',
+                            help='Mide también el flujo anterior, que verificaba la contraseña dos veces.')
+
+    def handle(self, *args, **options):
+        names = options['hasher'] or list(settings.PASSWORD_HASHER_PROFILES)
+        path = reverse('login')
+        body = json.dumps({'email': EMAIL, 'password': PASSWORD}).encode()
+
+        self.stdout.write(f"{'hasher':<10}{'hash ms':>10}{'login ms':>10}{'logins/s':>10}{'anterior/s':>12}")
+        # Como el cliente de pruebas: la conexión no se cierra al terminar cada request,
+        # para que los logins corran dentro de la transacción que se descarta
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        with transaction.atomic():
+            user = User.objects.create_user(email=EMAIL, password=PASSWORD, role=None)
+            for name in names:
+                with override_settings(PASSWORD_HASHERS=[settings.PASSWORD_HASHER_PROFILES[name]]):
+                    try:
+                        hasher = get_hasher()
+                        if hasher.library:
+                            hasher._load_library()
+                    except ValueError as error:
+                        self.stdout.write(f'{name:<10}no disponible: {error}')
+                        continue
+                    user.set_password(PASSWORD)
+                    user.save(update_fields=['password'])
+                    handler = WSGIHandler()
+
+                    started = time.perf_counter()
+                    hasher.verify(PASSWORD, user.password)
+                    hash_ms = (time.perf_counter() - started) * 1000
+
+                    elapsed = self.measure(options['logins'], lambda: self.login(handler, path, body))
+                    legacy = ''
+                    if options['legacy']:
+                        legacy = f"{options['logins'] / self.measure(options['logins'], legacy_login):>12.1f}"
+                self.stdout.write(
+                    f"{name:<10}{hash_ms:>10.1f}{elapsed / options['logins'] * 1000:>10.1f}"
+                    f"{options['logins'] / elapsed:>10.1f}{legacy}"
+                )
+            transaction.set_rollback(True)
+
+    def login(self, handler, path, body):
+        response = handler(login_environ(path, body), lambda status, headers: None)
+        b''.join(response)
+        response.close()
+        if response.status_code != 200:
+            raise RuntimeError(f'El login respondió {response.status_code}')
+
+    def measure(self, count, function):
+        started = time.perf_counter()
+        for _ in range(count):
+            function()
+        return time.perf_counter() - started
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from MyComicApp.management.commands.bench_products_rps import wsgi_environ
+
+MIDDLEWARE_PATH = 'MyComicApp.metrics.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia de un endpoint con y sin MetricsMiddleware (en el mismo proceso).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests por ronda y variante.')
+        parser.add_argument('--rounds', type=int, default=5, help='Rondas alternando las variantes.')
+        parser.add_argument('--path', default='/api/products/')
+        parser.add_argument('--query', default='page_size=24')
+
+    def handle(self, *args, **options):
+        without = [path for path in settings.MIDDLEWARE if path != MIDDLEWARE_PATH]
+        variants = {
+            'sin métricas': without,
+            'con métricas': [MIDDLEWARE_PATH, *without],
+        }
+        handlers = {}
+        for name, middleware in variants.items():
+            with override_settings(MIDDLEWARE=middleware):
+                handlers[name] = WSGIHandler()
+
+        totals = dict.fromkeys(variants, 0.0)
+        for _ in range(options['rounds']):
+            # Alternar las variantes reparte el ruido (caché, GC, CPU) entre ambas
+            for name, handler in handlers.items():
+                totals[name] += self.run(handler, options)
+
+        requests = options['requests'] * options['rounds']
+        self.stdout.write(f"{'variante':<14}{'us/request':>12}")
+        for name, total in totals.items():
+            self.stdout.write(f'{name:<14}{total / requests * 1e6:>12.1f}')
+        baseline = totals['sin métricas']
+        self.stdout.write(f"sobrecarga: {(totals['con métricas'] - baseline) / baseline * 100:+.2f}%")
+
+    def run(self, handler, options):
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            response = handler(wsgi_environ(options['path'], options['query']), lambda status, headers: None)
+            b''.join(response)
+            response.close()
+        return time.perf_counter() - started
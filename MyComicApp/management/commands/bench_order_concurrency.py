@@ -0,0 +1,102 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework import serializers
+
+from MyComicApp.idempotency import run_once
+from MyComicApp.models import Category, Product, User
+from MyComicApp.orders import place_order
+
+
+class Command(BaseCommand):
+    help = 'Lanza órdenes concurrentes contra un mismo producto y verifica que no haya sobreventa.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200, help='Cantidad total de órdenes a enviar.')
+        parser.add_argument('--threads', type=int, default=16, help='Órdenes enviadas en paralelo.')
+        parser.add_argument('--stock', type=int, default=100, help='Stock inicial del producto de prueba.')
+        parser.add_argument('--quantity', type=int, default=1, help='Unidades por orden.')
+        parser.add_argument('--duplicates', type=int, default=1,
+                            help='Envíos concurrentes de cada orden con la misma Idempotency-Key (1 = sin clave).')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializa todas las escrituras: use PostgreSQL para obtener resultados representativos.'
+            ))
+
+        suffix = uuid.uuid4().hex[:8]
+        category = Category.objects.create(name=f'bench-{suffix}')
+        product = Product.objects.create(
+            name=f'bench-{suffix}', description='benchmark', price=100, stock=options['stock'], category=category,
+        )
+        user = User.objects.create_user(email=f'bench-{suffix}@example.com', password=None, role=None)
+
+        latencies = []
+        results = {'ok': 0, 'replayed': 0, 'rejected': 0, 'error': 0}
+        lock = threading.Lock()
+
+        def create():
+            order = place_order(
+                [{'product': product, 'quantity': options['quantity']}],
+                id_user=user, state='En proceso', payment_method='credit_card',
+                shipping_method='express', payment_status='pagado',
+            )
+            return 201, {'id_order': order.pk}
+
+        def submit(index):
+            start = time.perf_counter()
+            try:
+                if options['duplicates'] > 1:
+                    # Los envíos consecutivos de una misma orden comparten la clave
+                    key = f"bench-{index // options['duplicates']}"
+                    _, _, replayed = run_once(user.pk, key, 'bench', create)
+                    outcome = 'replayed' if replayed else 'ok'
+                else:
+                    create()
+                    outcome = 'ok'
+            except serializers.ValidationError:
+                outcome = 'rejected'
+            except Exception as e:
+                self.stderr.write(f'Error inesperado: {e}')
+                outcome = 'error'
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+                latencies.append(time.perf_counter() - start)
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                list(executor.map(submit, range(options['orders'])))
+            elapsed = time.perf_counter() - started
+
+            product.refresh_from_db()
+            expected_stock = options['stock'] - results['ok'] * options['quantity']
+            latencies.sort()
+
+            self.stdout.write(f"Órdenes aceptadas: {results['ok']}, reintentos con la respuesta guardada: "
+                              f"{results['replayed']}, rechazadas por stock: {results['rejected']}, "
+                              f"errores: {results['error']}")
+            self.stdout.write(f"Throughput: {options['orders'] / elapsed:.1f} órdenes/s en {elapsed:.2f}s")
+            self.stdout.write(f"Latencia p50: {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+                              f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms")
+
+            if product.stock != expected_stock or product.stock < 0:
+                self.stdout.write(self.style.ERROR(
+                    f'Stock inconsistente: {product.stock} (esperado {expected_stock})'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Stock final consistente: {product.stock}'))
+            created = user.orders.count()
+            if created != results['ok']:
+                self.stdout.write(self.style.ERROR(f'Órdenes creadas: {created} (esperadas {results["ok"]})'))
+        finally:
+            user.delete()
+            product.delete()
+            category.delete()
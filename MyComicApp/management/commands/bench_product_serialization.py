@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from MyComicApp.models import Product
+from MyComicApp.serializers import ProductSerializer
+
+
+def product_request(params):
+    return Request(RequestFactory().get('/api/products/', params))
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cuánto tarda el listado de productos en leer, serializar y renderizar cada 1.000 '
+        'productos: ModelSerializer con instancias completas (flujo anterior) y filas de values() '
+        'con todos los campos o con ?view=card.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Productos por página.')
+        parser.add_argument('--repeat', type=int, default=10, help='Repeticiones de cada variante.')
+
+    def handle(self, *args, **options):
+        limit = options['products']
+        variants = {
+            'instancias': (self.instances, {}),
+            'values': (self.rows, {}),
+            'instancias card': (self.instances, {'view': 'card'}),
+            'values card': (self.rows, {'view': 'card'}),
+        }
+        self.stdout.write(
+            f"{'variante':<20}{'consulta ms':>13}{'serializar ms':>15}{'JSON ms':>10}{'total ms':>10}{'KB':>9}"
+        )
+        for name, (fetch, params) in variants.items():
+            request = product_request(params)
+            timings = {'query': [], 'serialize': [], 'render': []}
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                page, serializer = fetch(request, limit)
+                fetched = time.perf_counter()
+                data = serializer.to_representation(page)
+                serialized = time.perf_counter()
+                content = JSONRenderer().render(data)
+                rendered = time.perf_counter()
+                timings['query'].append(fetched - start)
+                timings['serialize'].append(serialized - fetched)
+                timings['render'].append(rendered - serialized)
+
+            # Mediana por cada 1.000 productos
+            scale = 1000 / max(len(page), 1) * 1000
+            query, serialize, render = (sorted(values)[len(values) // 2] * scale for values in timings.values())
+            self.stdout.write(
+                f'{name:<20}{query:>13.1f}{serialize:>15.1f}{render:>10.1f}{query + serialize + render:>10.1f}'
+                f'{len(content) / len(page) * 1000 / 1024:>9.0f}'
+            )
+
+    def instances(self, request, limit):
+        # Flujo anterior: un Product por fila y cada campo resuelto por DRF
+        serializer = ProductSerializer(many=True, context={'request': request})
+        queryset = Product.objects.order_by('id_product')
+        if request.query_params:
+            queryset = queryset.only(*serializer.child.columns())
+        return list(queryset[:limit]), serializer
+
+    def rows(self, request, limit):
+        serializer = ProductSerializer(many=True, context={'request': request})
+        rows = Product.objects.order_by('id_product').values(*serializer.child.columns())
+        return list(rows[:limit]), serializer
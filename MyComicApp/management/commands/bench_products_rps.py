@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+# Variables de entorno de cada modo comparado (ver DATABASES en settings.py)
+MODES = {
+    'sin-persistencia': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': 'False'},
+    'persistente': {'DB_CONN_MAX_AGE': '600', 'DB_POOL': 'False'},
+    'pool': {'DB_POOL': 'True'},
+}
+
+
+def wsgi_environ(path, query_string):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+
+
+class Command(BaseCommand):
+    help = 'Mide requests/s sobre /api/products/ sin conexiones persistentes, con conexiones persistentes y con pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests por modo.')
+        parser.add_argument('--threads', type=int, default=8, help='Requests concurrentes.')
+        parser.add_argument('--path', default='/api/products/')
+        parser.add_argument('--query', default='page_size=24')
+        parser.add_argument('--mode', choices=list(MODES), help='Ejecuta un único modo en este proceso.')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            return self.run_mode(options)
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('El pool sólo aplica a PostgreSQL: se compararán los modos disponibles.'))
+
+        self.stdout.write(f"{'modo':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errores':>10}")
+        for mode, overrides in MODES.items():
+            # La caché de respuestas se desactiva para que cada request llegue a la base, y los
+            # límites por cliente también: todas las requests salen de 127.0.0.1 y se medirían 429
+            env = dict(os.environ, API_CACHE_TIMEOUT='0', THROTTLE_ENABLED='False', **overrides)
+            command = [
+                sys.executable, sys.argv[0], 'bench_products_rps', '--mode', mode,
+                '--requests', str(options['requests']), '--threads', str(options['threads']),
+                '--path', options['path'], '--query', options['query'],
+            ]
+            output = subprocess.run(command, env=env, capture_output=True, text=True)
+            if output.returncode != 0:
+                self.stderr.write(output.stderr)
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            self.stdout.write(f"{mode:<18}{result['rps']:>10.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}"
+                              f"{result['errors']:>10}")
+            if result.get('pool'):
+                self.stdout.write(f"  pool: {result['pool']}")
+
+    def run_mode(self, options):
+        handler = WSGIHandler()
+        latencies = []
+        errors = 0
+
+        def request(_):
+            statuses = []
+            start = time.perf_counter()
+            # El handler WSGI emite request_started/request_finished, que abren y
+            # cierran (o devuelven al pool) la conexión como en gunicorn
+            response = handler(wsgi_environ(options['path'], options['query']),
+                               lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return time.perf_counter() - start, statuses[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            for latency, ok in executor.map(request, range(options['requests'])):
+                latencies.append(latency)
+                errors += not ok
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+
+        result = {
+            'rps': options['requests'] / elapsed,
+            'p50': latencies[len(latencies) // 2] * 1000,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            'errors': errors,
+        }
+        if settings.DATABASES['default']['ENGINE'] == 'MyComicApp.db.postgresql':
+            from MyComicApp.db.pool import pool_stats
+            result['pool'] = pool_stats()
+        self.stdout.write(json.dumps(result))
@@ -0,0 +1,110 @@
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = ('wsgi', 'asgi')
+
+
+def wait_for_port(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = 'Levanta gunicorn en modo WSGI y ASGI y compara requests/s y latencia con requests concurrentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests por modo.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests concurrentes.')
+        parser.add_argument('--workers', type=int, default=2, help='Workers de gunicorn.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--path', default='/api/products/?page_size=24')
+        parser.add_argument('--header', action='append', default=[],
+                            help='Header extra, p. ej. "Authorization: Bearer <token>".')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Desactiva la caché de respuestas para que cada request llegue a la base.')
+
+    def handle(self, *args, **options):
+        headers = dict(header.split(':', 1) for header in options['header'])
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+
+        self.stdout.write(f"{'modo':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>10}")
+        for mode in MODES:
+            env = dict(
+                os.environ,
+                SERVER_MODE=mode,
+                WEB_CONCURRENCY=str(options['workers']),
+                GUNICORN_BIND=f"127.0.0.1:{options['port']}",
+                GUNICORN_ERRORLOG='-',
+                # Todas las requests salen de 127.0.0.1: sin límites por cliente se mide el
+                # servidor y no los 429
+                THROTTLE_ENABLED='False',
+            )
+            if options['no_cache']:
+                env['API_CACHE_TIMEOUT'] = '0'
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+            try:
+                if not wait_for_port('127.0.0.1', options['port'], timeout=30):
+                    raise CommandError(f'gunicorn no arrancó en modo {mode}: {server.stderr.read1().decode()}')
+                result = self.run_load(options, headers)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            self.stdout.write(f"{mode:<8}{result['rps']:>10.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}"
+                              f"{result['p99']:>10.1f}{result['errors']:>10}")
+
+    def run_load(self, options, headers):
+        def request(_):
+            connection = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=30)
+            start = time.perf_counter()
+            try:
+                connection.request('GET', options['path'], headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+            finally:
+                connection.close()
+            return time.perf_counter() - start, ok
+
+        # Calentamiento: la primera request de cada worker carga Django
+        for _ in range(options['workers'] * 2):
+            request(None)
+
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            for latency, ok in executor.map(request, range(options['requests'])):
+                latencies.append(latency)
+                errors += not ok
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[max(int(len(latencies) * p) - 1, 0)] * 1000
+
+        return {
+            'rps': options['requests'] / elapsed,
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'errors': errors,
+        }
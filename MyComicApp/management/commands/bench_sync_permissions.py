@@ -0,0 +1,82 @@
+import time
+
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from MyComicApp.models import Role, User
+from MyComicApp.permissions import ROLE_GROUPS, create_groups_and_permissions
+
+# Proporción de usuarios de cada rol en la tabla sintética
+ROLE_MIX = (('User', 0.80), ('Vendedor', 0.15), ('Admin', 0.05))
+
+
+def legacy_sync(vendedor_perms, all_permissions, groups):
+    """Implementación anterior (una o más consultas por usuario), sólo para comparar."""
+    for user in User.objects.all():
+        if user.role and user.role.name == 'Vendedor':
+            user.user_permissions.set(vendedor_perms.exclude(codename__in=['add_user', 'change_user', 'delete_user']))
+        elif user.role and user.role.name == 'Admin':
+            user.user_permissions.set(all_permissions)
+    for user in User.objects.all():
+        if user.role and user.role.name in groups:
+            user.groups.add(groups[user.role.name])
+
+
+class Command(BaseCommand):
+    help = 'Mide create_groups_and_permissions sobre una tabla sintética de usuarios (los cambios se descartan).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000, help='Usuarios sintéticos a crear.')
+        parser.add_argument('--legacy', action='store_true',
+                            help='Mide también la implementación por usuario (lenta con muchos usuarios).')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options['users'])
+            self.measure('set-based (en frío)', create_groups_and_permissions)
+            self.measure('set-based (sin cambios)', create_groups_and_permissions)
+
+            if options['legacy']:
+                User.user_permissions.through.objects.all().delete()
+                User.groups.through.objects.all().delete()
+                groups = {group.name: group for group in Group.objects.filter(name__in=ROLE_GROUPS)}
+                vendedor_perms = Permission.objects.filter(
+                    content_type__app_label='MyComicApp',
+                    content_type__model__in=['order', 'product', 'category', 'user'],
+                )
+                self.measure('por usuario (anterior)',
+                             lambda: legacy_sync(vendedor_perms, Permission.objects.all(), groups))
+
+            transaction.set_rollback(True)
+
+    def populate(self, count):
+        roles = {name: Role.objects.get_or_create(name=name)[0] for name, _ in ROLE_MIX}
+        started = time.perf_counter()
+        users = []
+        offset = 0
+        for name, share in ROLE_MIX:
+            amount = round(count * share)
+            users.extend(
+                User(email=f'bench-{offset + i}@example.com', first_name='Bench', last_name='User',
+                     password='!', role=roles[name])
+                for i in range(amount)
+            )
+            offset += amount
+        User.objects.bulk_create(users, batch_size=5000)
+        self.stdout.write(f'{len(users)} usuarios sintéticos creados en {time.perf_counter() - started:.2f}s')
+
+    def measure(self, label, function):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - started
+        detail = f" ({result['inserted']} insertadas, {result['deleted']} eliminadas)" if result else ''
+        self.stdout.write(f'{label:<26}{elapsed:>9.2f}s {queries:>8} consultas{detail}')
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from MyComicApp.bulk import export_products
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo de productos en CSV o NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--output', help='Archivo de salida (por defecto, la salida estándar).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Filas leídas por vez del cursor.')
+
+    def handle(self, *args, **options):
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for line in export_products(options['type'], chunk_size=options['chunk_size']):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
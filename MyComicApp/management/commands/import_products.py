@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+
+from MyComicApp.bulk import CHUNK_SIZE, detect_file_type, import_products
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un archivo CSV o NDJSON (upsert por ISBN).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=['csv', 'ndjson'], help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Filas validadas y guardadas por bloque.')
+
+    def handle(self, *args, **options):
+        try:
+            file_type = detect_file_type(options['path'], options['type'])
+        except serializers.ValidationError as e:
+            raise CommandError(e.detail['type'][0])
+
+        with open(options['path'], 'rb') as file:
+            try:
+                result = import_products(file, file_type, chunk_size=options['chunk_size'])
+            except serializers.ValidationError as e:
+                raise CommandError(e.detail['file'][0])
+
+        for error in result['errors']:
+            self.stderr.write(f"Fila {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['created']} productos creados, {result['updated']} actualizados, {result['invalid']} filas inválidas"
+        ))
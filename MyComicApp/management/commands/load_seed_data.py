@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from MyComicApp.load_initial_data import BATCH_SIZE, SEED_FILE, load_seed_file
+
+
+class Command(BaseCommand):
+    help = 'Carga un archivo de datos iniciales en las tablas vacías (se omite si no cambió desde la última carga).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=SEED_FILE, help='Archivo SQL con sentencias INSERT.')
+        parser.add_argument('--force', action='store_true', help='Procesa el archivo aunque su checksum no haya cambiado.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Filas por lote.')
+
+    def handle(self, *args, **options):
+        loaded = load_seed_file(options['path'], force=options['force'], batch_size=options['batch_size'],
+                                verbosity=options['verbosity'], stdout=self.stdout)
+        if loaded is None:
+            self.stdout.write('Los datos iniciales no cambiaron desde la última carga.')
+        elif not loaded:
+            self.stdout.write('No había tablas vacías para cargar.')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from MyComicApp.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra por lotes las Idempotency-Key vencidas (IDEMPOTENCY_KEY_TTL). '
+        'Pensado para ejecutarse periódicamente (por ejemplo, una vez por hora desde cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Claves borradas por consulta.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Segundos de espera entre lotes.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = purge_expired_keys(options['batch_size'], options['pause'])
+        self.stdout.write(f'{deleted} claves vencidas borradas en {time.perf_counter() - started:.2f}s')
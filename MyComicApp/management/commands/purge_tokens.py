@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from MyComicApp.revocation import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra por lotes los refresh tokens vencidos y su entrada en la lista negra. '
+        'Pensado para ejecutarse periódicamente (por ejemplo, una vez por hora desde cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tokens borrados por transacción.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Segundos de espera entre lotes.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = purge_expired_tokens(options['batch_size'], options['pause'])
+        self.stdout.write(f'{deleted} tokens vencidos borrados en {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from MyComicApp.uploads import get_upload_queue, retry_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        'Vuelve a encolar las subidas de imágenes que quedaron pendientes (p. ej. por un reinicio '
+        'de gunicorn) y marca como fallidos los productos pendientes sin archivo guardado. '
+        'Pensado para ejecutarse periódicamente desde cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=float, default=15,
+                            help='Antigüedad a partir de la cual una subida pendiente se considera perdida.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        retried, failed = retry_stale_uploads(timedelta(minutes=options['minutes']))
+        # Esperar a que terminen las subidas reencoladas antes de salir
+        executor = get_upload_queue().executor
+        if hasattr(executor, 'shutdown'):
+            executor.shutdown(wait=True)
+        self.stdout.write(
+            f'{retried} subidas reencoladas y {failed} productos marcados como fallidos '
+            f'en {time.perf_counter() - started:.2f}s'
+        )
@@ -0,0 +1,254 @@
+"""
+Métricas de rendimiento por endpoint, expuestas en el formato de texto de Prometheus.
+
+``MetricsMiddleware`` mide cada request (latencia, consultas y tiempo de base de
+datos, tamaño de la respuesta y tiempo en servicios externos como Cloudinary), lo
+acumula en histogramas por vista y agrega un header ``Server-Timing`` con el
+detalle del request. ``metrics_view`` publica los histogramas.
+
+Las consultas se cuentan con un ``execute_wrapper`` que se instala en cada conexión
+al crearla (ver signals.py) y que escribe en el request actual a través de una
+``ContextVar``; así también se cuentan las consultas de las vistas async, que corren
+en otros hilos. Los valores se guardan en memoria: cada worker de gunicorn publica
+sus propias métricas (Prometheus las distingue por la instancia que responde).
+
+Con ``DB_POOL=True`` también se publican las conexiones, esperas y timeouts del pool
+de conexiones del proceso (ver db/pool.py).
+"""
+import bisect
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from .db.pool import pool_stats
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_lock = threading.Lock()
+_registry = []
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [conteo por bucket..., +Inf, suma]
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def clear(self):
+        with _lock:
+            self._series.clear()
+
+    def render(self):
+        with _lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            separator = ',' if label_text else ''
+            suffix = f'{{{label_text}}}' if label_text else ''
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text}{separator}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{suffix} {values[-1]}')
+            lines.append(f'{self.name}_count{suffix} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Duración de los requests por vista.',
+    ('view', 'method', 'status'), DURATION_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Consultas a la base de datos por request.', ('view',), QUERY_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Tiempo en la base de datos por request.', ('view',), DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Tamaño del cuerpo de las respuestas (sin streaming).', ('view',), SIZE_BUCKETS,
+)
+EXTERNAL_DURATION = Histogram(
+    'external_call_duration_seconds', 'Duración de las llamadas a servicios externos.',
+    ('service',), DURATION_BUCKETS,
+)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time', 'external')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.external = {}
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """``execute_wrapper`` que suma cada consulta al request en curso."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def track_external(service):
+    """Mide una llamada a un servicio externo (p. ej. ``with track_external('cloudinary'):``)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        EXTERNAL_DURATION.observe((service,), elapsed)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.external[service] = metrics.external.get(service, 0.0) + elapsed
+
+
+class MetricsMiddleware:
+    """Registra las métricas de cada request; funciona con WSGI y ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics)
+        return response
+
+    def record(self, request, response, metrics):
+        elapsed = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        # El nombre de la vista mantiene acotada la cantidad de series (no incluye ids)
+        view = (match.view_name or match.route) if match else 'unmatched'
+
+        REQUEST_DURATION.observe((view, request.method, str(response.status_code)), elapsed)
+        DB_QUERIES.observe((view,), metrics.queries)
+        DB_DURATION.observe((view,), metrics.db_time)
+        if not response.streaming:
+            RESPONSE_SIZE.observe((view,), len(response.content))
+
+        if settings.METRICS_SERVER_TIMING:
+            timings = [
+                f'app;dur={elapsed * 1000:.1f}',
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+            ]
+            timings += [f'{service};dur={seconds * 1000:.1f}' for service, seconds in metrics.external.items()]
+            response['Server-Timing'] = ', '.join(timings)
+
+
+# Contadores de cada pool de conexiones (ver db/pool.py): nombre, clave en stats() y descripción
+POOL_COUNTERS = (
+    ('db_pool_connections_created_total', 'created', 'Conexiones abiertas por el pool.'),
+    ('db_pool_connections_reused_total', 'reused', 'Conexiones ociosas reutilizadas.'),
+    ('db_pool_overflow_total', 'overflow', 'Conexiones abiertas por encima de max_size.'),
+    ('db_pool_connections_discarded_total', 'discarded', 'Conexiones cerradas por el pool.'),
+    ('db_pool_waits_total', 'waits', 'Pedidos que esperaron una conexión libre.'),
+    ('db_pool_timeouts_total', 'timeouts', 'Pedidos que fallaron por no conseguir una conexión.'),
+    ('db_pool_wait_seconds_total', 'wait_time', 'Tiempo total esperando una conexión.'),
+)
+
+
+def render_pool_metrics(pools):
+    """Líneas de Prometheus para ``pool_stats()`` (vacío si el pool no está habilitado)."""
+    if not pools:
+        return []
+    lines = ['# HELP db_pool_connections Conexiones del pool por estado.', '# TYPE db_pool_connections gauge']
+    for database, stats in sorted(pools.items()):
+        for state in ('idle', 'in_use'):
+            lines.append(f'db_pool_connections{{database="{_escape(database)}",state="{state}"}} {stats[state]}')
+    for name, key, documentation in POOL_COUNTERS:
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} counter']
+        lines += [
+            f'{name}{{database="{_escape(database)}"}} {stats[key]}' for database, stats in sorted(pools.items())
+        ]
+    return lines
+
+
+def render_metrics():
+    lines = []
+    for histogram in _registry:
+        lines += histogram.render()
+    lines += render_pool_metrics(pool_stats())
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    for histogram in _registry:
+        histogram.clear()
+
+
+def metrics_view(request):
+    """
+    Métricas en formato Prometheus. Con ``METRICS_TOKEN`` se exige el header
+    ``Authorization: Bearer <token>``; sin token, sólo usuarios staff con sesión.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse('No autorizado', status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,129 @@
+# Generated by Django 4.2 on 2026-10-17 21:50
+
+import cloudinary.models
+from decimal import Decimal
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id_category', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=45)),
+            ],
+            options={
+                'verbose_name': 'Category',
+                'verbose_name_plural': 'Categories',
+                'db_table': 'categories',
+            },
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id_order', models.AutoField(primary_key=True, serialize=False)),
+                ('state', models.CharField(blank=True, max_length=45)),
+                ('order_date', models.DateField(null=True)),
+                ('payment_method', models.CharField(blank=True, max_length=45)),
+                ('shipping_method', models.CharField(max_length=45, null=True)),
+                ('payment_status', models.CharField(max_length=45, null=True)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+            ],
+            options={
+                'verbose_name': 'Order',
+                'verbose_name_plural': 'Orders',
+                'db_table': 'orders',
+            },
+        ),
+        migrations.CreateModel(
+            name='Role',
+            fields=[
+                ('id_role', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=45)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='auth.group')),
+            ],
+            options={
+                'verbose_name': 'Role',
+                'verbose_name_plural': 'Roles',
+                'db_table': 'roles',
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('first_name', models.CharField(max_length=30)),
+                ('last_name', models.CharField(max_length=30)),
+                ('address', models.CharField(default='', max_length=255)),
+                ('phone', models.CharField(default='', max_length=20)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='images/')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_staff', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_superuser', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('role', models.ForeignKey(default=1, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='MyComicApp.role')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'db_table': 'mycomicapp_user',
+            },
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id_product', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.CharField(max_length=5000)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount', models.IntegerField(blank=True, null=True)),
+                ('stock', models.IntegerField()),
+                ('image', cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='image')),
+                ('pages', models.IntegerField(blank=True, null=True)),
+                ('format', models.CharField(blank=True, max_length=45, null=True)),
+                ('weight', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('isbn', models.CharField(blank=True, max_length=45, null=True)),
+                ('calification', models.DecimalField(blank=True, decimal_places=1, max_digits=4, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.0')), django.core.validators.MaxValueValidator(Decimal('5.0'))])),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='MyComicApp.category')),
+            ],
+            options={
+                'verbose_name': 'Product',
+                'verbose_name_plural': 'Products',
+                'db_table': 'products',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id_order_items', models.AutoField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='MyComicApp.order')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='MyComicApp.product')),
+            ],
+            options={
+                'verbose_name': 'Order Item',
+                'verbose_name_plural': 'Order Items',
+                'db_table': 'order_items',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='id_user',
+            field=models.ForeignKey(db_column='user_id', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
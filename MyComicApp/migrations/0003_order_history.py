@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 21:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0002_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='MyComicApp.order'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['id_user', '-order_date', '-id_order'], name='orders_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-17 21:57
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def create_search_indexes(apps, schema_editor):
+    # Los índices GIN y la extensión pg_trgm sólo existen en PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS products_search_vector_idx ON products USING gin (search_vector)'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        trigram_available = cursor.fetchone() is not None
+    if trigram_available:
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS products_name_trgm_idx ON products USING gin (name gin_trgm_ops)'
+        )
+
+    # Calcular el vector de los productos existentes
+    schema_editor.execute(
+        """
+        UPDATE products SET search_vector =
+            setweight(to_tsvector(%s::regconfig, coalesce(products.name, '')), 'A') ||
+            setweight(to_tsvector(%s::regconfig, coalesce(products.description, '')), 'B') ||
+            setweight(to_tsvector(%s::regconfig, coalesce(categories.name, '')), 'C')
+        FROM categories
+        WHERE categories.id_category = products.category_id
+        """,
+        [settings.SEARCH_CONFIG] * 3,
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS products_name_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS products_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0005_product_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['isbn'], name='products_isbn_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-17 22:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeedData',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('checksum', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('mtime_ns', models.BigIntegerField()),
+                ('loaded_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Seed Data',
+                'verbose_name_plural': 'Seed Data',
+                'db_table': 'seed_data',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-17 22:30
+
+from django.db import migrations, transaction
+from django.db.models import F, OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_snapshot(apps, schema_editor):
+    # Copia nombre y precio actuales a los items existentes, por rangos de id para no
+    # mantener bloqueada toda la tabla en una sola transacción
+    OrderItem = apps.get_model('MyComicApp', 'OrderItem')
+    Product = apps.get_model('MyComicApp', 'Product')
+    db_alias = schema_editor.connection.alias
+
+    pending = OrderItem.objects.using(db_alias).filter(unit_price__isnull=True, product__isnull=False)
+    product = Product.objects.using(db_alias).filter(pk=OuterRef('product_id'))
+    last_id = 0
+    while True:
+        ids = list(pending.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        with transaction.atomic(using=db_alias):
+            OrderItem.objects.using(db_alias).filter(pk__in=ids).update(
+                product_name=Subquery(product.values('name')[:1]),
+                unit_price=Subquery(product.values('price')[:1]),
+            )
+            OrderItem.objects.using(db_alias).filter(pk__in=ids).update(line_total=F('unit_price') * F('quantity'))
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('MyComicApp', '0008_order_item_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-17 22:23
+
+from itertools import islice
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 5000
+
+
+def populate_daily_sales(apps, schema_editor):
+    # Ventas de las órdenes existentes; las nuevas se suman al crearlas
+    OrderItem = apps.get_model('MyComicApp', 'OrderItem')
+    DailySales = apps.get_model('MyComicApp', 'DailySales')
+    db_alias = schema_editor.connection.alias
+
+    rows = (
+        OrderItem.objects.using(db_alias)
+        .filter(product__isnull=False, order__order_date__isnull=False)
+        .values('order__order_date', 'product_id', 'product__category_id')
+        .annotate(units=Sum('quantity'), revenue=Sum('line_total'), order_count=Count('order_id', distinct=True))
+        .order_by()
+    )
+    objs = (
+        DailySales(
+            date=row['order__order_date'], product_id=row['product_id'],
+            category_id=row['product__category_id'], units=row['units'],
+            revenue=row['revenue'] or 0, order_count=row['order_count'],
+        )
+        for row in rows.iterator(chunk_size=BATCH_SIZE)
+    )
+    while batch := list(islice(objs, BATCH_SIZE)):
+        DailySales.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0009_backfill_order_item_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='MyComicApp.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='MyComicApp.product')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+                'db_table': 'daily_sales',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailysales',
+            index=models.Index(fields=['category', 'date'], name='daily_sales_category_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='daily_sales_date_product_uniq'),
+        ),
+        migrations.RunPython(populate_daily_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-17 22:26
+
+from django.db import migrations, models
+
+
+def create_email_prefix_index(apps, schema_editor):
+    # La búsqueda del admin por prefijo del email (istartswith) compara UPPER(email::text)
+    # con LIKE; el índice con text_pattern_ops permite resolverla sin recorrer la tabla
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS mycomicapp_user_email_upper_idx '
+        'ON mycomicapp_user (UPPER(email::text) text_pattern_ops)'
+    )
+
+
+def drop_email_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS mycomicapp_user_email_upper_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0010_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date'], name='orders_date_idx'),
+        ),
+        migrations.RunPython(create_email_prefix_index, drop_email_prefix_index),
+    ]
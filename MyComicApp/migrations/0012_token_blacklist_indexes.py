@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# Índices sobre las tablas de token_blacklist (de simplejwt, que no los define): la
+# purga busca los tokens vencidos por expires_at y el filtro de revocaciones lee las
+# nuevas por blacklisted_at
+INDEXES = (
+    ('token_outstanding_expires_idx', 'token_blacklist_outstandingtoken', 'expires_at'),
+    ('token_blacklisted_at_idx', 'token_blacklist_blacklistedtoken', 'blacklisted_at'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    for name, table, column in INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})')
+
+
+def drop_indexes(apps, schema_editor):
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0011_admin_indexes'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
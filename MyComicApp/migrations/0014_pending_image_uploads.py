@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-17 23:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0013_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingImageUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.BinaryField()),
+                ('replaces', models.CharField(blank=True, default='', max_length=255)),
+                ('queued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_uploads', to='MyComicApp.product')),
+            ],
+            options={
+                'verbose_name': 'Pending Image Upload',
+                'verbose_name_plural': 'Pending Image Uploads',
+                'db_table': 'pending_image_uploads',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pendingimageupload',
+            index=models.Index(fields=['queued_at'], name='pending_uploads_queued_idx'),
+        ),
+    ]
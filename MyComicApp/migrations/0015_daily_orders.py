@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-17 23:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def populate_daily_orders(apps, schema_editor):
+    # Órdenes de los días existentes; las nuevas se suman al crearlas
+    OrderItem = apps.get_model('MyComicApp', 'OrderItem')
+    DailyOrders = apps.get_model('MyComicApp', 'DailyOrders')
+    db_alias = schema_editor.connection.alias
+
+    items = (
+        OrderItem.objects.using(db_alias)
+        .filter(product__isnull=False, order__order_date__isnull=False)
+        .order_by()
+    )
+    by_category = items.values('order__order_date', 'product__category_id').annotate(order_count=Count('order_id', distinct=True))
+    by_day = items.values('order__order_date').annotate(order_count=Count('order_id', distinct=True))
+    DailyOrders.objects.using(db_alias).bulk_create(
+        [
+            DailyOrders(date=row['order__order_date'], category_id=row['product__category_id'], order_count=row['order_count'])
+            for row in by_category.iterator()
+        ] + [
+            DailyOrders(date=row['order__order_date'], order_count=row['order_count'])
+            for row in by_day.iterator()
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MyComicApp', '0014_pending_image_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrders',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_orders', to='MyComicApp.category')),
+            ],
+            options={
+                'verbose_name': 'Daily Orders',
+                'verbose_name_plural': 'Daily Orders',
+                'db_table': 'daily_orders',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyorders',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('date', 'category'), name='daily_orders_date_category_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyorders',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('date',), name='daily_orders_date_uniq'),
+        ),
+        migrations.RunPython(populate_daily_orders, migrations.RunPython.noop),
+    ]
@@ -2,11 +2,13 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, Permis
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import Group 
-import cloudinary
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
-from .utils import generate_public_id
+from .uploads import enqueue_product_image, public_id_from_url
 
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, role=None, **extra_fields):
@@ -18,6 +20,10 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def get_by_natural_key(self, email):
+        # El login emite el token con el rol del usuario: traerlo en la misma consulta
+        return self.select_related('role').get(**{self.model.USERNAME_FIELD: email})
+
     def create_superuser(self, email, password=None, role=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -72,6 +78,7 @@ class Role(models.Model):
 class Category(models.Model):
     id_category = models.AutoField(primary_key=True)
     name = models.CharField(max_length=45, blank=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         db_table = 'categories'
@@ -81,8 +88,29 @@ class Category(models.Model):
     def __str__(self):
         return self.name    
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nombre leído de la base, para saber si un guardado lo cambia (ver signals.py)
+        if 'name' in field_names:
+            instance._loaded_name = values[field_names.index('name')]
+        return instance
+
+    def name_changed(self):
+        """Indica si ``name`` difiere del leído de la base (``True`` si no se conoce)."""
+        return getattr(self, '_loaded_name', None) != self.name
+
 
 class Product(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     id_product = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100, blank=False)
     description = models.CharField(max_length=5000, blank=False)
@@ -90,11 +118,15 @@ class Product(models.Model):
     discount = models.IntegerField(blank=True, null=True)
     stock = models.IntegerField(blank=False)
     image = CloudinaryField('image', blank=True, null=True)  
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default=IMAGE_READY)
     pages = models.IntegerField(blank=True, null=True)
     format = models.CharField(max_length=45, blank=True, null=True)
     weight = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     isbn = models.CharField(max_length=45, blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Mantenido en cada guardado; en PostgreSQL tiene un índice GIN (ver migración 0006)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     calification = models.DecimalField(
         max_digits=4,
@@ -111,29 +143,44 @@ class Product(models.Model):
         db_table = 'products'
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
+        indexes = [
+            # Índices que respaldan los filtros y el ordenamiento del catálogo
+            models.Index(fields=['category', 'price'], name='products_category_price_idx'),
+            models.Index(fields=['price'], name='products_price_idx'),
+            models.Index(fields=['calification'], name='products_calification_idx'),
+            models.Index(fields=['id_product'], condition=models.Q(stock__gt=0), name='products_in_stock_idx'),
+            models.Index(fields=['isbn'], name='products_isbn_idx'),
+        ]
         
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        if self.image:
-            public_id = generate_public_id(self, self.image.name)
-            try:
-                # Subir la imagen a Cloudinary con la carpeta especificada
-                upload_result = cloudinary.uploader.upload(
-                    self.image,
-                    public_id=public_id,
-                    folder='planetsuperheroes/images/productos',  # Especifica la carpeta
-                    use_asset_folder_as_public_id_prefix=True  # Sincroniza la carpeta y el public_id
-                )
-                # Asignar la URL de la imagen a self.image
-                self.image = upload_result['secure_url']
-            except Exception as e:
-                print(f"Error al subir la imagen a Cloudinary: {e}")  # Para debugging
-                raise  # Lanza el error nuevamente
+        # Las imágenes nuevas se suben a Cloudinary en segundo plano (ver uploads.py);
+        # el producto se guarda de inmediato con la imagen pendiente.
+        pending_image = None
+        replaces = None
+        if isinstance(self.image, File):
+            pending_image = self.image
+            current_image = None
+            if self.pk:
+                current_image = Product.objects.filter(pk=self.pk).values_list('image', flat=True).first()
+            if current_image:
+                replaces = public_id_from_url(current_image.public_id)
+            self.image = current_image
+            self.image_status = self.IMAGE_PENDING
 
         super().save(*args, **kwargs)
 
+        # Actualizar el vector de búsqueda sólo si cambiaron los campos indexados
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'name', 'description', 'category'} & set(update_fields):
+            from .search import update_search_vectors
+            update_search_vectors(Product.objects.filter(pk=self.pk))
+
+        if pending_image is not None:
+            enqueue_product_image(self, pending_image, replaces=replaces)
+
 
 
 
@@ -151,6 +198,12 @@ class Order(models.Model):
         db_table = 'orders'
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            # Historial de órdenes por usuario, paginado por fecha
+            models.Index(fields=['id_user', '-order_date', '-id_order'], name='orders_user_date_idx'),
+            # Jerarquía de fechas del admin
+            models.Index(fields=['order_date'], name='orders_date_idx'),
+        ]
 
     def __str__(self):
         return f'Order {self.id_order}'
@@ -160,12 +213,140 @@ class OrderItem(models.Model):
     id_order_items = models.AutoField(primary_key=True)
     quantity = models.IntegerField(blank=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, related_name='order_items')
-    order = models.ForeignKey(Order, on_delete=models.CASCADE)
-    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
+    # Datos del producto al momento de la compra: el historial se muestra sin consultar productos
+    product_name = models.CharField(max_length=100, blank=True, default='')
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
     class Meta:
         db_table = 'order_items'
         verbose_name = 'Order Item'
         verbose_name_plural = 'Order Items'
-        
+
     def __str__(self):
-        return f'{self.quantity} of {self.product.name} in Order {self.order.id_order}'
\ No newline at end of file
+        return f'{self.quantity} of {self.product_name} in Order {self.order_id}'
+
+    def snapshot(self, product):
+        """Copia el nombre y el precio actuales de ``product`` al item."""
+        self.product_name = product.name
+        self.unit_price = product.price
+        self.line_total = product.price * self.quantity
+
+    def save(self, *args, **kwargs):
+        # Los items creados fuera de place_order (p. ej. desde el admin) también guardan la copia
+        if self.unit_price is None and self.product_id is not None:
+            self.snapshot(Product.objects.only('name', 'price').get(pk=self.product_id))
+        elif self.unit_price is not None:
+            self.line_total = self.unit_price * self.quantity
+        super().save(*args, **kwargs)
+
+
+class DailySales(models.Model):
+    # Ventas acumuladas por día y producto; se actualiza al crear cada orden (ver analytics.py)
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_sales'
+        verbose_name = 'Daily Sales'
+        verbose_name_plural = 'Daily Sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='daily_sales_date_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'date'], name='daily_sales_category_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} - {self.product_id}'
+
+
+class DailyOrders(models.Model):
+    # Órdenes distintas por día y categoría; la fila sin categoría cuenta todas las del
+    # día (una orden con productos de varias categorías suma una vez en cada una)
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, related_name='daily_orders')
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_orders'
+        verbose_name = 'Daily Orders'
+        verbose_name_plural = 'Daily Orders'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], condition=models.Q(category__isnull=False),
+                                    name='daily_orders_date_category_uniq'),
+            models.UniqueConstraint(fields=['date'], condition=models.Q(category__isnull=True),
+                                    name='daily_orders_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} - {self.category_id}'
+
+
+class IdempotencyKey(models.Model):
+    # Resultado de un request con header Idempotency-Key (ver idempotency.py); los
+    # reintentos del mismo usuario con la misma clave reciben esta respuesta
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_keys_user_key_uniq'),
+        ]
+        indexes = [
+            # Purga de las claves vencidas
+            models.Index(fields=['expires_at'], name='idempotency_keys_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} - {self.key}'
+
+
+class PendingImageUpload(models.Model):
+    # Archivo de una subida a Cloudinary todavía no confirmada (ver uploads.py): si el
+    # worker que la tenía en cola se reinicia, retry_image_uploads la vuelve a encolar
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='pending_uploads')
+    content = models.BinaryField()
+    replaces = models.CharField(max_length=255, blank=True, default='')
+    queued_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'pending_image_uploads'
+        verbose_name = 'Pending Image Upload'
+        verbose_name_plural = 'Pending Image Uploads'
+        indexes = [
+            models.Index(fields=['queued_at'], name='pending_uploads_queued_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} - {self.queued_at}'
+
+
+class SeedData(models.Model):
+    # Registro de cada archivo de datos iniciales cargado (ver load_initial_data.py)
+    name = models.CharField(max_length=255, unique=True)
+    checksum = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    loaded_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'seed_data'
+        verbose_name = 'Seed Data'
+        verbose_name_plural = 'Seed Data'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,108 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Prefetch, Q, Subquery, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from .analytics import record_order_sales
+from .cache import bump_version
+from .models import Order, OrderItem, Product
+
+
+def place_order(order_items, **order_fields):
+    """
+    Crea una orden y reserva el stock de sus productos dentro de una única transacción.
+
+    Todas las filas de ``Product`` involucradas se bloquean con una sola consulta
+    (ordenadas por clave primaria para evitar deadlocks), el stock se descuenta con un
+    único UPDATE condicional y los items se insertan con ``bulk_create``. Las ventas
+    del día se actualizan en la misma transacción (ver analytics.py).
+    """
+    # Agrupar cantidades por producto (una orden puede repetir el mismo producto)
+    quantities = {}
+    for order_item_data in order_items:
+        product_id = order_item_data['product'].pk
+        # Una cantidad negativa sumaría stock con el UPDATE condicional de abajo
+        if order_item_data['quantity'] <= 0:
+            raise serializers.ValidationError("La cantidad de cada producto debe ser mayor a cero.")
+        quantities[product_id] = quantities.get(product_id, 0) + order_item_data['quantity']
+    product_ids = sorted(quantities)
+
+    with transaction.atomic():
+        locked = (
+            Product.objects.select_for_update()
+            .filter(pk__in=product_ids)
+            .only('id_product', 'name', 'price', 'stock', 'category')
+            .order_by('pk')
+        )
+        products = {product.pk: product for product in locked}
+
+        for product_id in product_ids:
+            product = products.get(product_id)
+            if product is None:
+                raise serializers.ValidationError(f"El producto {product_id} no existe.")
+            if product.stock < quantities[product_id]:
+                raise serializers.ValidationError(f"No hay suficiente stock para {product.name}")
+
+        # Descontar el stock de todos los productos con un único UPDATE condicional
+        condition = Q()
+        whens = []
+        for product_id in product_ids:
+            condition |= Q(pk=product_id, stock__gte=quantities[product_id])
+            whens.append(When(pk=product_id, then=F('stock') - quantities[product_id]))
+        updated = Product.objects.filter(condition).update(
+            stock=Case(*whens, default=F('stock')),
+            updated_at=timezone.now(),
+        )
+        if updated != len(product_ids):
+            raise serializers.ValidationError("No hay suficiente stock para completar la orden.")
+
+        total_amount = Decimal(0)
+        for order_item_data in order_items:
+            total_amount += products[order_item_data['product'].pk].price * order_item_data['quantity']
+
+        order_fields['total_amount'] = total_amount
+        order = Order.objects.create(**order_fields)
+
+        items = []
+        for order_item_data in order_items:
+            product = products[order_item_data['product'].pk]
+            item = OrderItem(order=order, product=product, quantity=order_item_data['quantity'])
+            item.snapshot(product)
+            items.append(item)
+        OrderItem.objects.bulk_create(items)
+        record_order_sales(order, items, products)
+
+        # El UPDATE masivo no emite post_save: invalidar el catálogo cacheado al confirmar
+        transaction.on_commit(lambda: bump_version(Product))
+
+    return order
+
+
+def fill_item_snapshots():
+    """Completa la copia del producto en los items que no la tienen (p. ej. los cargados por SQL)."""
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    pending = OrderItem.objects.filter(unit_price__isnull=True, product__isnull=False)
+    pending.update(
+        product_name=Subquery(product.values('name')[:1]),
+        unit_price=Subquery(product.values('price')[:1]),
+    )
+    OrderItem.objects.filter(line_total__isnull=True, unit_price__isnull=False).update(
+        line_total=F('unit_price') * F('quantity'),
+    )
+
+
+def order_history_queryset(user_id):
+    """
+    Órdenes de un usuario con sus items precargados.
+
+    El historial se resuelve con una cantidad fija de consultas sin importar cuántas
+    órdenes o items tenga el usuario: las órdenes (junto a su usuario) y sus items, que
+    guardan una copia del nombre y el precio del producto y no necesitan ``products``.
+    """
+    return (
+        Order.objects.filter(id_user=user_id)
+        .select_related('id_user')
+        .prefetch_related(Prefetch('order_items', queryset=OrderItem.objects.order_by('pk')))
+    )
@@ -0,0 +1,63 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre ``id_product``: cada página se resuelve con
+    ``WHERE id_product > ... LIMIT n`` en lugar de un OFFSET que crece con el catálogo.
+
+    Con ``?ordering=`` por un campo que no es único (``name``, ``price``, ``stock``) el
+    cursor guarda además cuántas filas del último valor ya se enviaron, y la página
+    siguiente las saltea con OFFSET. Para que esas filas sean siempre las mismas se
+    agrega ``id_product`` como segundo criterio: sin él la base puede devolver los
+    empates en otro orden en cada consulta y repetir u omitir productos. Los campos que
+    admiten NULL no pueden usarse, porque el cursor no sabe ubicar un NULL (ver
+    ``ProductViewSet.ordering_fields``).
+    """
+    ordering = 'id_product'
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[0].lstrip('-') == 'id_product':
+            return ordering
+        return (*ordering, 'id_product')
+
+
+class OrderCursorPagination(CursorPagination):
+    """Historial de órdenes paginado por fecha (las órdenes del mismo día se desempatan por id)."""
+    ordering = ('-order_date', '-id_order')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginador para los listados del admin sobre tablas grandes. Sin filtros, el total
+    se toma de la estimación de PostgreSQL (``pg_class.reltuples``, actualizada por
+    ANALYZE) en lugar de un ``COUNT(*)`` que recorre toda la tabla. Con filtros, o si
+    la tabla es chica, se cuenta de forma exacta.
+    """
+    # Por debajo de esta cantidad estimada de filas el COUNT(*) es barato
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+            if row is not None and row[0] > self.threshold:
+                return row[0]
+        return super().count
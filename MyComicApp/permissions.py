@@ -1,59 +1,152 @@
+from django.conf import settings
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_migrate
-from django.dispatch import receiver
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.permissions import BasePermission
+from .cache import bump_version, get_versions
 from .models import Order, Product, Category, Role
 
-@receiver(post_migrate)
-def create_groups_and_permissions_on_startup(sender, **kwargs):
-    create_groups_and_permissions()
+ROLES_KEY = 'permissions:roles:{}:{}'
+PERMS_KEY = 'permissions:perms:{}:{}:{}'
+
+# Roles con un grupo de Django del mismo nombre
+ROLE_GROUPS = ('User', 'Vendedor', 'Admin')
+
+
+def permissions_version():
+    # Cambia con cualquier modificación de grupos, membresías o permisos (ver signals.py)
+    return get_versions([Group])[0]
+
+
+def invalidate_permissions():
+    bump_version(Group)
+
+
+def get_user_roles(user):
+    """
+    Nombres de los grupos del usuario. Se guardan en el objeto ``user`` (dura lo que
+    el request) y en la caché, con la versión de permisos en la clave.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_role_names', None)
+    if roles is None:
+        key = ROLES_KEY.format(user.pk, permissions_version())
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(Group.objects.filter(user=user.pk).values_list('name', flat=True))
+            cache.set(key, roles, settings.PERMISSIONS_CACHE_TIMEOUT)
+        user._role_names = roles
+    return roles
+
+
+def user_has_role(user, *roles):
+    """True si el usuario pertenece a alguno de los grupos ``roles``."""
+    return not get_user_roles(user).isdisjoint(roles)
+
+
+def get_cached_permissions(user, load):
+    """Permisos del usuario cacheados entre requests; ``load`` los calcula si no están."""
+    key = PERMS_KEY.format(user.pk, int(user.is_superuser), permissions_version())
+    perms = cache.get(key)
+    if perms is None:
+        perms = load()
+        cache.set(key, perms, settings.PERMISSIONS_CACHE_TIMEOUT)
+    return perms
+
+
+class HasRole(BasePermission):
+    """
+    Permiso DRF por rol: ``permission_classes = [HasRole.of('Admin', 'Vendedor')]``.
+    """
+    roles = ()
+
+    @classmethod
+    def of(cls, *roles):
+        return type('HasRole', (cls,), {'roles': roles})
+
+    def has_permission(self, request, view):
+        return user_has_role(request.user, *self.roles)
+
+
+def _insert_missing_pairs(through, left_field, right_field, left_queryset, right_queryset):
+    """
+    Inserta en la tabla intermedia ``through`` los pares (izquierda, derecha) del producto
+    cartesiano de ambos querysets que todavía no existen, con un único INSERT ... SELECT.
+    """
+    qn = connection.ops.quote_name
+    table = qn(through._meta.db_table)
+    left_column = qn(through._meta.get_field(left_field).column)
+    right_column = qn(through._meta.get_field(right_field).column)
+    left_sql, left_params = left_queryset.values_list('pk').query.sql_with_params()
+    right_sql, right_params = right_queryset.values_list('pk').query.sql_with_params()
+    left_pk = qn(left_queryset.model._meta.pk.column)
+    right_pk = qn(right_queryset.model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({left_column}, {right_column}) '
+            f'SELECT l.{left_pk}, r.{right_pk} FROM ({left_sql}) l CROSS JOIN ({right_sql}) r '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {table} t '
+            f'WHERE t.{left_column} = l.{left_pk} AND t.{right_column} = r.{right_pk})',
+            (*left_params, *right_params),
+        )
+        return cursor.rowcount
+
 
 def create_groups_and_permissions():
+    """
+    Sincroniza grupos, roles y permisos con una cantidad fija de consultas, sin importar
+    la cantidad de usuarios: las filas faltantes de las tablas intermedias se insertan con
+    INSERT ... SELECT y las sobrantes se borran con un DELETE por conjunto.
+    Devuelve la cantidad de filas insertadas y eliminadas.
+    """
     User = get_user_model()
+    UserPermission = User.user_permissions.through
+    UserGroup = User.groups.through
+    stats = {'inserted': 0, 'deleted': 0}
+
+    with transaction.atomic():
+        # Crear grupos
+        groups = {name: Group.objects.get_or_create(name=name)[0] for name in ROLE_GROUPS}
+
+        # Asociar grupos a roles
+        for name, group in groups.items():
+            Role.objects.filter(name=name).update(group=group)
+
+        # Permisos para los modelos que gestiona el rol 'Vendedor'
+        content_types = ContentType.objects.get_for_models(Order, Product, Category, User).values()
+        vendedor_perms = Permission.objects.filter(content_type__in=content_types)
+        all_permissions = Permission.objects.all()
+
+        # Permisos de los grupos 'Vendedor' y 'Admin'
+        groups['Vendedor'].permissions.set(vendedor_perms)
+        groups['Admin'].permissions.set(all_permissions)
+
+        # Permisos directos según el rol: los de cada rol se reemplazan por los deseados.
+        # El rol 'Vendedor' no puede crear, modificar ni borrar usuarios.
+        direct_perms = {
+            'Vendedor': vendedor_perms.exclude(codename__in=['add_user', 'change_user', 'delete_user']),
+            'Admin': all_permissions,
+        }
+        for role_name, permissions in direct_perms.items():
+            users = User.objects.filter(role__name=role_name)
+            stats['deleted'] += UserPermission.objects.filter(user__in=users).exclude(
+                permission__in=permissions
+            ).delete()[0]
+            stats['inserted'] += _insert_missing_pairs(UserPermission, 'user', 'permission', users, permissions)
+
+        # Asociar el superusuario y a cada usuario con el grupo de su rol
+        superuser_id = User.objects.filter(is_superuser=True).order_by('pk').values_list('pk', flat=True).first()
+        if superuser_id is not None:
+            stats['inserted'] += _insert_missing_pairs(
+                UserGroup, 'user', 'group', User.objects.filter(pk=superuser_id), Group.objects.filter(name='Admin')
+            )
+        for role_name, group in groups.items():
+            stats['inserted'] += _insert_missing_pairs(
+                UserGroup, 'user', 'group', User.objects.filter(role__name=role_name), Group.objects.filter(pk=group.pk)
+            )
 
-    # Crear grupos
-    user_group, _ = Group.objects.get_or_create(name='User')
-    vendedor_group, _ = Group.objects.get_or_create(name='Vendedor')
-    admin_group, _ = Group.objects.get_or_create(name='Admin')
-
-    # Asociar grupos a roles
-    Role.objects.filter(name='User').update(group=user_group)
-    Role.objects.filter(name='Vendedor').update(group=vendedor_group)
-    Role.objects.filter(name='Admin').update(group=admin_group)
-
-    # Obtener permisos para los modelos
-    order_perms = Permission.objects.filter(content_type=ContentType.objects.get_for_model(Order))
-    product_perms = Permission.objects.filter(content_type=ContentType.objects.get_for_model(Product))
-    category_perms = Permission.objects.filter(content_type=ContentType.objects.get_for_model(Category))
-    user_perms = Permission.objects.filter(content_type=ContentType.objects.get_for_model(User))
-
-    # Asignar permisos al grupo 'Vendedor'
-    vendedor_group.permissions.set(order_perms | product_perms | category_perms | user_perms)
-
-    # Asignar permisos al grupo 'Admin'
-    all_permissions = Permission.objects.all()
-    admin_group.permissions.set(all_permissions)
-
-    # Asociar permisos directamente a los usuarios basados en su rol
-    for user in User.objects.all():
-        if user.role and user.role.name == 'Vendedor':
-            # Eliminar permisos para crear usuarios de tipo Admin y Vendedor
-            user_perms_without_admin_vendedor = user_perms.exclude(codename__in=['add_user', 'change_user', 'delete_user'])
-            user.user_permissions.set(order_perms | product_perms | category_perms | user_perms_without_admin_vendedor)
-        elif user.role and user.role.name == 'Admin':
-            user.user_permissions.set(all_permissions)
-
-    # Asociar el superusuario al grupo 'Admin'
-    superuser = User.objects.filter(is_superuser=True).first()
-    if superuser:
-        superuser.groups.add(admin_group)
-
-    # Asociar usuarios a grupos basados en su rol
-    for user in User.objects.all():
-        if user.role and user.role.name == 'Vendedor':
-            user.groups.add(vendedor_group)
-        elif user.role and user.role.name == 'User':
-            user.groups.add(user_group)
-        elif user.role and user.role.name == 'Admin':
-            user.groups.add(admin_group)
\ No newline at end of file
+    invalidate_permissions()
+    return stats
@@ -0,0 +1,186 @@
+"""
+Detector de consultas N+1 y consultas lentas, para tests y staging.
+
+``QueryDetector`` registra las consultas ejecutadas mientras está activo y las agrupa
+por su forma (el SQL sin valores literales ni largos de listas ``IN``). Una forma que
+se repite ``QUERY_DETECTOR_REPEAT_THRESHOLD`` veces o más suele ser una consulta dentro
+de un bucle; se informa junto al frame de ``MyComicApp`` que la originó. Las
+consultas que superan ``QUERY_DETECTOR_SLOW_MS`` se informan siempre.
+
+Se usa como middleware (``QueryDetectorMiddleware``, que deja los hallazgos en el log)
+o en los tests con ``QueryDetectorMixin``, que revisa cada request del cliente de
+pruebas y puede hacer fallar el test. Las consultas se capturan en las conexiones del
+hilo del request, por lo que no incluye a las vistas async.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(APP_DIR)
+# Módulos que envuelven la ejecución de consultas: no son el origen de ninguna
+_WRAPPER_FILES = {__file__, os.path.join(APP_DIR, 'metrics.py')}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+_SAVEPOINT_RE = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Forma de la consulta: sin literales y con las listas ``IN (...)`` de cualquier largo iguales."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _origin():
+    # Frame más interno del código de la aplicación (fuera de este módulo)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename not in _WRAPPER_FILES:
+            return f'{os.path.relpath(filename, BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryIssues(AssertionError):
+    pass
+
+
+class QueryDetector:
+    """
+    Context manager que captura las consultas de las conexiones del hilo actual.
+    Al salir, ``repeated`` y ``slow`` contienen lo detectado.
+    """
+
+    def __init__(self, repeat_threshold=None, slow_ms=None):
+        self.repeat_threshold = repeat_threshold or settings.QUERY_DETECTOR_REPEAT_THRESHOLD
+        self.slow_ms = slow_ms if slow_ms is not None else settings.QUERY_DETECTOR_SLOW_MS
+        self.counts = Counter()
+        self.origins = {}
+        self.slow = []
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if not _SAVEPOINT_RE.match(sql):
+                shape = fingerprint(sql)
+                origin = _origin()
+                self.counts[shape] += 1
+                self.origins.setdefault(shape, Counter())[origin] += 1
+                if elapsed_ms > self.slow_ms:
+                    self.slow.append({'sql': shape, 'ms': round(elapsed_ms, 1), 'origin': origin})
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(None, None, None)
+
+    @property
+    def repeated(self):
+        return [
+            {'sql': shape, 'count': count, 'origin': self.origins[shape].most_common(1)[0][0]}
+            for shape, count in self.counts.most_common()
+            if count >= self.repeat_threshold
+        ]
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def report(self, label=''):
+        """Texto con los hallazgos, o cadena vacía si no hay."""
+        lines = []
+        for issue in self.repeated:
+            lines.append(f"{label}consulta repetida {issue['count']} veces desde {issue['origin']}: {issue['sql']}")
+        for issue in self.slow:
+            lines.append(f"{label}consulta de {issue['ms']} ms desde {issue['origin']}: {issue['sql']}")
+        return '\n'.join(lines)
+
+
+class QueryDetectorMiddleware:
+    """Registra en el log las consultas repetidas o lentas de cada request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryDetector() as detector:
+            response = self.get_response(request)
+        report = detector.report(f'{request.method} {request.path}: ')
+        if report:
+            logger.warning(report)
+        return response
+
+
+class QueryDetectorMixin:
+    """
+    Mixin de ``TestCase`` que revisa las consultas de cada request hecho con el
+    cliente de pruebas (no las de la preparación de datos del test). Con
+    ``fail_on_query_issues`` (por defecto ``QUERY_DETECTOR_FAIL_TESTS``) los
+    hallazgos hacen fallar el test; si no, sólo se registran en el log. Los
+    ``setUp`` de las subclases deben llamar a ``super().setUp()``.
+    """
+    query_repeat_threshold = None
+    query_slow_ms = None
+    fail_on_query_issues = None
+
+    def setUp(self):
+        super().setUp()
+        self.query_reports = []
+        self._detectors = []
+        request_started.connect(self._start_query_detector)
+        request_finished.connect(self._stop_query_detector)
+        self.addCleanup(self._check_query_reports)
+
+    def _start_query_detector(self, sender, environ=None, scope=None, **kwargs):
+        detector = QueryDetector(self.query_repeat_threshold, self.query_slow_ms)
+        detector.path = (environ or {}).get('PATH_INFO') or (scope or {}).get('path', '')
+        self._detectors.append(detector.__enter__())
+
+    def _stop_query_detector(self, sender, **kwargs):
+        if not self._detectors:
+            return
+        detector = self._detectors.pop()
+        detector.__exit__(None, None, None)
+        report = detector.report(f'{detector.path}: ')
+        if report:
+            self.query_reports.append(report)
+
+    def _check_query_reports(self):
+        request_started.disconnect(self._start_query_detector)
+        request_finished.disconnect(self._stop_query_detector)
+        while self._detectors:
+            self._stop_query_detector(None)
+        if not self.query_reports:
+            return
+        report = '\n'.join(self.query_reports)
+        fail = self.fail_on_query_issues
+        if fail is None:
+            fail = settings.QUERY_DETECTOR_FAIL_TESTS
+        if fail:
+            raise QueryIssues(f'Consultas problemáticas en {self.id()}:\n{report}')
+        logger.warning(report)
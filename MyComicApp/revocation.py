@@ -0,0 +1,200 @@
+"""
+Revocación de refresh tokens sobre la lista negra de ``token_blacklist``.
+
+Cada refresh con rotación agrega el token usado a la lista negra, así que consultarla
+en cada refresh es una consulta más por request. ``is_revoked`` responde primero con
+un filtro de Bloom en memoria con los jti revocados que todavía no vencieron: si el
+jti no está en el filtro el token no fue revocado y no se consulta la base; si está
+(o es un falso positivo, ~1%) se confirma con la tabla.
+
+El filtro se actualiza cada ``JWT_REVOCATION_SYNC_INTERVAL`` segundos con las filas
+nuevas de ``BlacklistedToken`` (por ``blacklisted_at``, indexado en la migración
+0012). Las revocaciones hechas en el mismo proceso se agregan al instante; las de
+otros procesos tardan como máximo ese intervalo en verse, igual que
+``JWT_USER_STATE_TTL`` con la desactivación de usuarios.
+
+``purge_expired_tokens`` borra por lotes los tokens vencidos, que ya no sirven para
+nada (comando ``purge_tokens``).
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Tasa de falsos positivos del filtro con la cantidad de jti prevista
+FALSE_POSITIVE_RATE = 0.01
+# Margen al leer revocaciones nuevas, por inserciones que confirman fuera de orden
+SYNC_OVERLAP = timedelta(seconds=10)
+
+
+class BloomFilter:
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        self.size = math.ceil(-self.capacity * math.log(FALSE_POSITIVE_RATE) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        positions = self._positions(value)
+        if all(self.bits[position >> 3] & (1 << (position & 7)) for position in positions):
+            return
+        for position in positions:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class _RevokedTokens:
+    """
+    Filtro de jti revocados de este proceso. Las consultas a la base (carga completa o
+    sincronización) las hace un solo hilo y fuera del lock, que sólo protege el
+    reemplazo del filtro y del watermark: el resto de los hilos sigue respondiendo con
+    el filtro anterior mientras tanto, o con la base si todavía no hay ninguno.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.synced_at = 0.0
+        self.watermark = None
+        self.refreshing = False
+        # jti revocados en este proceso mientras se carga un filtro nuevo
+        self.added = []
+
+    def reset(self):
+        with self.lock:
+            self.filter = None
+
+    def add(self, jti):
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+            if self.refreshing:
+                self.added.append(jti)
+
+    def __contains__(self, jti):
+        now = time.monotonic()
+        with self.lock:
+            rebuild = self.filter is None or self.filter.count > self.filter.capacity
+            due = rebuild or now - self.synced_at >= settings.JWT_REVOCATION_SYNC_INTERVAL
+            refresh = due and not self.refreshing
+            if refresh:
+                self.refreshing = True
+                self.added = []
+                watermark = self.watermark
+        if refresh:
+            try:
+                if rebuild:
+                    self._rebuild(now)
+                else:
+                    self._sync(now, watermark)
+            finally:
+                with self.lock:
+                    self.refreshing = False
+        with self.lock:
+            # Sin filtro (otro hilo lo está cargando) se confirma con la base
+            return self.filter is None or jti in self.filter
+
+    def _rebuild(self, now):
+        # Sólo importan los tokens sin vencer: uno vencido no pasa la verificación
+        watermark = timezone.now()
+        revoked = BlacklistedToken.objects.filter(token__expires_at__gt=watermark)
+        bloom = BloomFilter(max(settings.JWT_REVOCATION_FILTER_CAPACITY, 2 * revoked.count()))
+        for jti, blacklisted_at in revoked.values_list('token__jti', 'blacklisted_at').iterator():
+            bloom.add(jti)
+            watermark = max(watermark, blacklisted_at)
+        with self.lock:
+            for jti in self.added:
+                bloom.add(jti)
+            self.filter = bloom
+            self.watermark = watermark
+            self.synced_at = now
+
+    def _sync(self, now, watermark):
+        revoked = list(
+            BlacklistedToken.objects.filter(blacklisted_at__gte=watermark - SYNC_OVERLAP)
+            .values_list('token__jti', 'blacklisted_at')
+        )
+        with self.lock:
+            # reset() descartó el filtro mientras tanto: lo recarga la próxima consulta
+            if self.filter is None:
+                return
+            for jti, blacklisted_at in revoked:
+                self.filter.add(jti)
+                self.watermark = max(self.watermark, blacklisted_at)
+            self.synced_at = now
+
+
+_revoked = _RevokedTokens()
+
+
+def is_revoked(jti):
+    """Indica si el refresh token con ese jti está en la lista negra."""
+    if jti not in _revoked:
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def mark_revoked(jti):
+    """Agrega un jti recién revocado al filtro de este proceso."""
+    _revoked.add(jti)
+
+
+def forget_revocations():
+    """Descarta el filtro de este proceso; se vuelve a cargar en la próxima consulta."""
+    _revoked.reset()
+
+
+class RevocableRefreshToken(RefreshToken):
+    """``RefreshToken`` que consulta la lista negra a través de ``is_revoked``."""
+
+    def check_blacklist(self):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('El token fue revocado')
+
+    def blacklist(self):
+        # El jti se toma antes: al rotar, el serializer le asigna otro al mismo objeto
+        jti = self.payload[api_settings.JTI_CLAIM]
+        result = super().blacklist()
+        transaction.on_commit(lambda: mark_revoked(jti))
+        return result
+
+
+def purge_expired_tokens(batch_size=5000, pause=0.0):
+    """
+    Borra los tokens vencidos (y su entrada en la lista negra) en lotes de
+    ``batch_size``, cada uno en su propia transacción, para no bloquear las tablas
+    mientras se emiten o revocan tokens. Devuelve la cantidad de tokens borrados.
+    """
+    cutoff = timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lt=cutoff)
+                .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            _, per_model = OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += per_model.get(OutstandingToken._meta.label, 0)
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,87 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import Category, Product
+
+ISBN_RE = re.compile(r'^[0-9][0-9\- ]{8,}[0-9Xx]$')
+
+_trigram_available = None
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def trigram_available():
+    """Indica si la extensión pg_trgm está instalada (se consulta una sola vez por proceso)."""
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def product_search_vector():
+    """Vector ponderado: nombre (A), descripción (B) y nombre de la categoría (C)."""
+    from django.contrib.postgres.search import SearchVector
+
+    config = settings.SEARCH_CONFIG
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('description', weight='B', config=config)
+        + SearchVector(category_name, weight='C', config=config)
+    )
+
+
+def update_search_vectors(queryset):
+    """Recalcula ``search_vector`` de los productos de ``queryset`` con un único UPDATE."""
+    if not is_postgres():
+        return 0
+    return queryset.update(search_vector=product_search_vector())
+
+
+def search_products(term, queryset=None):
+    """
+    Busca productos por ``term``.
+
+    - ISBN: coincidencia exacta sobre la columna indexada ``isbn``.
+    - PostgreSQL: búsqueda de texto completo sobre ``search_vector`` (índice GIN),
+      ordenada por relevancia; si no hay resultados y pg_trgm está disponible se
+      buscan nombres similares para tolerar errores de tipeo.
+    - Otros motores (SQLite en tests): ``icontains`` sobre nombre, descripción y categoría.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    term = term.strip()
+
+    if ISBN_RE.match(term):
+        candidates = {term, re.sub(r'[\- ]', '', term)}
+        matches = queryset.filter(isbn__in=candidates)
+        if matches.exists():
+            return matches
+
+    if not is_postgres():
+        return queryset.filter(
+            Q(name__icontains=term) | Q(description__icontains=term) | Q(category__name__icontains=term)
+        ).order_by('id_product')
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+    query = SearchQuery(term, config=settings.SEARCH_CONFIG, search_type='websearch')
+    results = (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', 'id_product')
+    )
+    if results.exists() or not trigram_available():
+        return results
+
+    return (
+        queryset.filter(name__trigram_similar=term)
+        .annotate(similarity=TrigramSimilarity('name', term))
+        .order_by('-similarity', 'id_product')
+    )
@@ -2,12 +2,16 @@
 
 from rest_framework import serializers
 from .models import Role, User, Product, Category, Order, OrderItem
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from datetime import timedelta
 from decimal import Decimal
 from django.utils import timezone
-from .utils import generate_public_id  # Asegúrate de que la ruta es correcta
-import cloudinary
-import cloudinary.uploader
+from .fieldsets import SparseFieldsMixin, ValuesListSerializer
+from .images import product_image_urls
+from .orders import place_order
+from .revocation import RevocableRefreshToken
 
 
 # 1. User Serializer
@@ -50,29 +54,66 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 # 5. Product Serializer
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     image = serializers.ImageField(required=False, allow_null=True)
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['search_vector']
+        read_only_fields = ['image_status']
+        list_serializer_class = ValuesListSerializer
+        # ?view=card: lo que muestra la grilla del catálogo
+        views = {
+            'card': ['id_product', 'name', 'price', 'discount', 'stock', 'calification', 'category', 'image', 'images'],
+        }
+
+    def image_variants(self):
+        # ?images=thumbnail,card limita las variantes enviadas (p. ej. para la grilla del catálogo)
+        request = self.context.get('request')
+        if request is not None and request.query_params.get('images'):
+            return request.query_params['images'].split(',')
+        return None
+
+    def get_images(self, obj):
+        return product_image_urls(obj.image, self.image_variants())
+
+    def columns(self):
+        """Columnas de ``products`` que leen los campos seleccionados."""
+        columns = {'id_product'}
+        for name, field in self.fields.items():
+            if not field.write_only:
+                columns.add('image' if name == 'images' else field.source)
+        return columns
+
+    def represent_rows(self, rows):
+        """
+        Representación de filas de ``values(*self.columns())``, igual a la de
+        ``to_representation``: los conversores se eligen una vez y no por fila.
+        """
+        converters = []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name == 'images':
+                variants = self.image_variants()
+                converters.append((name, 'image', lambda image: product_image_urls(image, variants)))
+            elif isinstance(field, (serializers.DecimalField, serializers.DateTimeField, serializers.FileField)):
+                converters.append((name, field.source, field.to_representation))
+            else:
+                # Enteros, textos y la categoría (su id) ya vienen como los envía DRF
+                converters.append((name, field.source, None))
+        return [
+            {
+                name: value if convert is None or value is None else convert(value)
+                for name, source, convert in converters
+                for value in (row[source],)
+            }
+            for row in rows
+        ]
 
     def create(self, validated_data):
-        image = validated_data.pop('image', None)
-        if image:
-            # Generar un public_id basado en el nombre del archivo
-            public_id = generate_public_id(None, image.name)
-
-            # Comprobar si ya existe una imagen con ese public_id
-            try:
-                cloudinary.uploader.destroy(public_id)  # Intenta eliminar la imagen existente
-            except cloudinary.exceptions.NotFound:
-                pass  # Ignora si la imagen no existe
-
-            # Subir la nueva imagen
-            upload_result = cloudinary.uploader.upload(image, public_id=public_id)
-            validated_data['image'] = upload_result['secure_url']  # Guarda la URL
-
+        # La imagen se sube en segundo plano al guardar el producto (ver Product.save)
         product = Product.objects.create(**validated_data)
         return product
 
@@ -91,19 +132,8 @@ class ProductSerializer(serializers.ModelSerializer):
 
         new_image = validated_data.get('image', None)
         if new_image:
-            public_id = generate_public_id(None, new_image.name)
-
-            if instance.image: 
-                # Extraer el public_id del URL actual
-                old_public_id = instance.image.split('/')[-1].split('.')[0]  # Suponiendo que la URL está en el formato estándar de Cloudinary
-                try:
-                    cloudinary.uploader.destroy(old_public_id)  # Eliminar la imagen antigua de Cloudinary
-                except cloudinary.exceptions.NotFound:
-                    pass  # Ignora si la imagen no existe
-
-            # Subir la nueva imagen
-            upload_result = cloudinary.uploader.upload(new_image, public_id=public_id)
-            instance.image = upload_result['secure_url']  # Guarda la nueva URL
+            # Product.save encola la subida y elimina la imagen anterior al terminar
+            instance.image = new_image
 
         instance.save()  # Guarda los cambios
         return instance
@@ -111,15 +141,63 @@ class ProductSerializer(serializers.ModelSerializer):
 
 # El resto de los serializers permanecen sin cambios
 class LogoutSerializer(serializers.Serializer):
-    user = serializers.IntegerField()
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            token = RevocableRefreshToken(value)
+        except TokenError:
+            raise serializers.ValidationError('El token es inválido o ya venció.')
+        # Sólo se puede cerrar la sesión propia
+        if token.get('user_id') != self.context['request'].user.id:
+            raise serializers.ValidationError('El token no pertenece al usuario autenticado.')
+        return token
+
+def set_user_claims(token, user):
+    token['email'] = user.email
+    # Claims usados por StatelessJWTAuthentication para no leer el usuario en cada request
+    token['is_staff'] = user.is_staff
+    token['is_superuser'] = user.is_superuser
+    token['role'] = user.role.name if user.role_id else None
+    token['groups'] = sorted(user.groups.values_list('name', flat=True))
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RevocableRefreshToken
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        token['email'] = user.email
+        set_user_claims(token, user)
         return token
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    # Consulta la lista negra con el filtro en memoria de revocation.py
+    token_class = RevocableRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        # Los claims del usuario se vuelven a leer en cada rotación: un cambio de rol, grupos
+        # o privilegios llega con el próximo access token y no dura lo que dura el refresh
+        if 'email' in refresh:
+            user = (
+                User.objects.select_related('role')
+                .filter(pk=refresh[jwt_settings.USER_ID_CLAIM], is_active=True)
+                .first()
+            )
+            if user is None:
+                raise AuthenticationFailed('El usuario no existe o está inactivo', code='user_inactive')
+            set_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -131,10 +209,40 @@ class RoleSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # Order Serializer---> Order Items Serializer 
+class OrderProductField(serializers.PrimaryKeyRelatedField):
+    # Productos de la orden ya cargados por OrderItemListSerializer ({id: Product})
+    products = None
+
+    def to_internal_value(self, data):
+        if self.products is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            product = self.products.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if product is None:
+            self.fail('does_not_exist', pk_value=data)
+        return product
+
+class OrderItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # Todos los productos de la orden se cargan con una sola consulta
+        if isinstance(data, list):
+            ids = {item.get('product') for item in data if isinstance(item, dict)}
+            ids = {int(pk) for pk in ids if isinstance(pk, (int, str)) and str(pk).isdigit()}
+            self.child.fields['product'].products = Product.objects.in_bulk(ids)
+        return super().to_internal_value(data)
+
 class OrderItemCreateSerializer(serializers.ModelSerializer):
+    product = OrderProductField(queryset=Product.objects.all())
+
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity']
+        list_serializer_class = OrderItemListSerializer
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
 class OrderCreateSerializer(serializers.ModelSerializer):
     order_items = OrderItemCreateSerializer(many=True)
@@ -161,37 +269,55 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         order_items_data = validated_data.pop('order_items')
-        total_amount = Decimal(0)
-
-        for order_item_data in order_items_data:
-            product = order_item_data['product']
-            quantity = order_item_data['quantity']
-            subtotal = product.price * quantity
-            total_amount += subtotal
-
-            # Actualizar el stock del producto
-            product.stock -= quantity
-            product.save()
-
-        validated_data['total_amount'] = total_amount
-        order = Order.objects.create(**validated_data)
-
-        for order_item_data in order_items_data:
-            OrderItem.objects.create(order=order, **order_item_data)
-
-        return order
+        # Reserva de stock e inserción de items en una sola transacción
+        return place_order(order_items_data, **validated_data)
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = serializers.StringRelatedField()
+    # Nombre y precio copiados al crear la orden (no cambian si cambia el producto)
+    product = serializers.CharField(source='product_name', read_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ['id_order_items', 'product', 'quantity']
+        fields = ['id_order_items', 'product', 'product_id', 'quantity', 'unit_price', 'line_total']
 
 class OrderSerializer(serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
-    user = serializers.StringRelatedField()
+    user = serializers.StringRelatedField(source='id_user')
 
     class Meta:
         model = Order
         fields = ['id_order', 'user', 'state', 'order_date', 'payment_method', 'shipping_method', 'payment_status', 'total_amount', 'order_items']
+
+# Parámetros de los reportes de ventas (ver analytics.py)
+class SalesQuerySerializer(serializers.Serializer):
+    # Período por defecto: los últimos 30 días
+    DEFAULT_DAYS = 30
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = serializers.IntegerField(required=False, min_value=1)
+    order_by = serializers.ChoiceField(choices=['units', 'revenue'], default='units')
+    limit = serializers.IntegerField(default=10, min_value=1, max_value=100)
+
+    def validate(self, attrs):
+        end = attrs.setdefault('end', timezone.localdate())
+        start = attrs.setdefault('start', end - timedelta(days=self.DEFAULT_DAYS - 1))
+        if start > end:
+            raise serializers.ValidationError("La fecha 'start' no puede ser posterior a 'end'.")
+        return attrs
+
+class SalesTotalsSerializer(serializers.Serializer):
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders = serializers.IntegerField()
+
+class SalesByDaySerializer(SalesTotalsSerializer):
+    date = serializers.DateField()
+
+class SalesByCategorySerializer(SalesTotalsSerializer):
+    category_id = serializers.IntegerField()
+    category_name = serializers.CharField()
+
+class TopProductSerializer(SalesTotalsSerializer):
+    product_id = serializers.IntegerField()
+    product_name = serializers.CharField()
@@ -1,7 +1,62 @@
-from django.db.models.signals import post_migrate
+import sys
+import time
+
+from django.contrib.auth.models import Group
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_migrate, post_save, post_delete
 from django.dispatch import receiver
-from .permissions import create_groups_and_permissions
+from .apps import is_last_post_migrate
+from .authentication import forget_user_state
+from .permissions import create_groups_and_permissions, invalidate_permissions
+from .cache import bump_version
+from .metrics import install_query_recorder
+from .search import update_search_vectors
+from .models import Product, Category, User
 
+# Sincronizar grupos y permisos una sola vez por migrate, cuando ya existen los
+# permisos de todos los modelos
 @receiver(post_migrate)
-def create_groups_and_permissions_on_startup(sender, **kwargs):
-    create_groups_and_permissions()
\ No newline at end of file
+def create_groups_and_permissions_on_startup(sender, verbosity=1, stdout=None, **kwargs):
+    if not is_last_post_migrate(sender):
+        return
+    started = time.perf_counter()
+    stats = create_groups_and_permissions()
+    if verbosity >= 1:
+        (stdout or sys.stdout).write(
+            f"Grupos y permisos sincronizados en {time.perf_counter() - started:.2f}s "
+            f"({stats['inserted']} filas insertadas, {stats['deleted']} eliminadas)\n"
+        )
+
+# Invalidar las respuestas cacheadas del catálogo ante cualquier escritura
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_version(sender)
+
+# Renombrar una categoría cambia el vector de búsqueda de sus productos
+@receiver(post_save, sender=Category)
+def update_category_search_vectors(sender, instance, created, update_fields=None, **kwargs):
+    renamed = not created and instance.name_changed() and (update_fields is None or 'name' in update_fields)
+    instance._loaded_name = instance.name
+    if renamed:
+        update_search_vectors(Product.objects.filter(category=instance))
+        bump_version(Product)
+
+# Desactivar o borrar un usuario invalida su estado cacheado en este proceso
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user_state(sender, instance, **kwargs):
+    forget_user_state(instance.pk)
+
+# Cualquier cambio de grupos, membresías o permisos invalida los roles y permisos cacheados
+@receiver([post_save, post_delete], sender=Group)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_cached_permissions(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        invalidate_permissions()
+
+# Cada conexión nueva registra sus consultas en las métricas del request en curso
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
@@ -1,3 +1,1676 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
\ No newline at end of file
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.apps import apps
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_migrate
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, revocation
+from .authentication import USER_CLAIMS, ClaimsUser, forget_user_state
+from .db.pool import ConnectionPool, PoolTimeout
+from .hashers import TunedArgon2PasswordHasher
+from .idempotency import purge_expired_keys
+from .images import IMAGE_FORMATS, IMAGE_VARIANTS, build_image_urls, get_public_id, product_image_urls
+from .load_shedding import queue_seconds
+from .load_initial_data import SeedSyntaxError, iter_inserts, load_seed_file, tokenize
+from .metrics import MetricsMiddleware, render_metrics, reset_metrics, track_external
+from .query_detector import QueryDetector, QueryDetectorMixin, fingerprint
+from .analytics import rebuild_daily_sales
+from .models import (
+    Category, DailyOrders, DailySales, IdempotencyKey, Order, OrderItem, PendingImageUpload, Product, Role, SeedData, User,
+)
+from .orders import place_order
+from .permissions import create_groups_and_permissions, user_has_role
+from .revocation import (
+    BloomFilter, RevocableRefreshToken, forget_revocations, is_revoked, mark_revoked, purge_expired_tokens,
+)
+from .serializers import CustomTokenObtainPairSerializer, ProductSerializer
+from .throttling import LocalBuckets, reset_throttles, take_token
+from .uploads import ImageUploadQueue, LocalExecutor, retry_stale_uploads
+
+
+class UserOrdersViewTests(TestCase):
+    # Consultas del historial: órdenes (con su usuario) + items (con la copia del producto)
+    MAX_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='orders@example.com', password='secret', role=None)
+        category = Category.objects.create(name='Test')
+        cls.products = [
+            Product.objects.create(name=f'Comic {i}', description='-', price=100, stock=100, category=category)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(id_user=self.user, state='En proceso', total_amount=500)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, product_name=product.name,
+                          unit_price=product.price, line_total=product.price)
+                for product in self.products
+            ])
+
+    def test_order_items_are_rendered(self):
+        self.create_orders(1)
+        response = self.client.get(reverse('orders_user_list'))
+        self.assertEqual(response.status_code, 200)
+        order = response.json()['results'][0]
+        self.assertEqual(order['user'], self.user.email)
+        self.assertEqual(len(order['order_items']), len(self.products))
+        self.assertEqual(order['order_items'][0]['product'], 'Comic 0')
+
+    def test_items_keep_the_name_and_price_paid(self):
+        response = self.client.post(reverse('orders_create'), {
+            'order_items': [{'product': self.products[0].pk, 'quantity': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        Product.objects.filter(pk=self.products[0].pk).update(name='Renombrado', price=999)
+
+        item = self.client.get(reverse('orders_user_list')).json()['results'][0]['order_items'][0]
+        self.assertEqual(item['product'], 'Comic 0')
+        self.assertEqual((item['unit_price'], item['line_total']), ('100.00', '200.00'))
+
+    def test_query_count_does_not_grow_with_history(self):
+        for count in (1, 20):
+            self.create_orders(count)
+            with self.assertNumQueries(self.MAX_QUERIES):
+                response = self.client.get(reverse('orders_user_list'))
+            self.assertEqual(response.status_code, 200)
+
+
+class PlaceOrderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='place@example.com', password='secret', role=None)
+        category = Category.objects.create(name='Stock')
+        cls.first = Product.objects.create(name='Primero', description='-', price=100, stock=5, category=category)
+        cls.second = Product.objects.create(name='Segundo', description='-', price=10, stock=1, category=category)
+
+    def setUp(self):
+        reset_throttles()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, *items):
+        return self.client.post(reverse('orders_create'), {
+            'order_items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items],
+        }, format='json')
+
+    def assertStock(self, first, second):
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[self.first.pk, self.second.pk]).order_by('pk').values_list('stock', flat=True)),
+            [first, second],
+        )
+
+    def test_overselling_is_rejected(self):
+        self.assertEqual(self.create((self.first, 6)).status_code, 400)
+        self.assertStock(5, 1)
+        self.assertFalse(Order.objects.filter(id_user=self.user).exists())
+
+    def test_repeated_product_quantities_are_summed(self):
+        # Cada línea entra en el stock, la suma no
+        self.assertEqual(self.create((self.first, 3), (self.first, 3)).status_code, 400)
+        self.assertStock(5, 1)
+
+        response = self.create((self.first, 2), (self.first, 2))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_amount'], '400.00')
+        self.assertStock(1, 1)
+
+    def test_products_are_locked_and_updated_in_one_query_each(self):
+        items = [{'product': self.second, 'quantity': 1}, {'product': self.first, 'quantity': 2},
+                 {'product': self.first, 'quantity': 1}]
+        with CaptureQueriesContext(connection) as queries:
+            place_order(items, id_user=self.user, state='En proceso')
+        table = Product._meta.db_table
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and f'FROM "{table}"' in q['sql']]
+        updates = [q['sql'] for q in queries if q['sql'].startswith(f'UPDATE "{table}"')]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(len(updates), 1)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', selects[0])
+        self.assertStock(2, 0)
+
+    def test_failing_line_rolls_back_the_whole_order(self):
+        # El stock cambió después de validar el serializer: place_order lo vuelve a comprobar
+        items = [{'product': self.first, 'quantity': 2}, {'product': self.second, 'quantity': 2}]
+        sales = list(DailySales.objects.values_list('pk', 'units', 'revenue'))
+        with self.assertRaises(serializers.ValidationError):
+            place_order(items, id_user=self.user, state='En proceso')
+        self.assertStock(5, 1)
+        self.assertFalse(Order.objects.filter(id_user=self.user).exists())
+        self.assertEqual(list(DailySales.objects.values_list('pk', 'units', 'revenue')), sales)
+
+    def test_non_positive_quantities_are_rejected(self):
+        for quantity in (-50, 0):
+            self.assertEqual(self.create((self.first, quantity)).status_code, 400)
+        self.assertStock(5, 1)
+        self.assertFalse(Order.objects.filter(id_user=self.user).exists())
+        with self.assertRaises(serializers.ValidationError):
+            place_order([{'product': self.first, 'quantity': -1}], id_user=self.user, state='En proceso')
+        self.assertStock(5, 1)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class ProductCatalogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Catálogo')
+        # Precios repetidos para que el cursor tenga que desempatar
+        cls.products = [
+            Product.objects.create(name=f'Comic {i}', description='-', price=price, stock=i % 3,
+                                   category=cls.category, calification=calification)
+            for i, (price, calification) in enumerate([(10, None), (20, 4), (20, None), (20, 5), (30, 3), (10, 2)])
+        ]
+
+    def setUp(self):
+        reset_throttles()
+        self.client = APIClient()
+
+    def walk(self, **params):
+        """Ids de todas las páginas del catálogo de la categoría, siguiendo el cursor."""
+        response = self.client.get('/api/products/', {'category': self.category.pk, 'page_size': 2, **params})
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id_product'] for row in response.json()['results']]
+            if not response.json()['next']:
+                return ids
+            response = self.client.get(response.json()['next'])
+
+    def test_filters(self):
+        self.assertEqual(len(self.walk(min_price='20', max_price='20')), 3)
+        self.assertEqual(self.walk(in_stock='true'), [p.pk for p in self.products if p.stock > 0])
+        self.assertEqual(self.walk(min_calification='4'), [self.products[1].pk, self.products[3].pk])
+
+    def test_invalid_and_non_finite_values_return_400(self):
+        for params in ({'min_price': 'NaN'}, {'max_price': 'Infinity'}, {'min_calification': '-inf'},
+                       {'min_price': 'abc'}, {'category': 'x'}):
+            response = self.client.get('/api/products/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_cursor_pages_cover_every_product_once(self):
+        ids = [p.pk for p in self.products]
+        self.assertEqual(self.walk(), sorted(ids))
+        by_price = self.walk(ordering='-price')
+        self.assertEqual(sorted(by_price), sorted(ids))
+        # Los empates de precio salen por id_product, en el mismo orden en cada página
+        self.assertEqual(by_price, [p.pk for p in sorted(self.products, key=lambda p: (-p.price, p.pk))])
+
+    def test_non_unique_ordering_adds_the_primary_key(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/products/', {'category': self.category.pk, 'ordering': 'price'})
+        table = Product._meta.db_table
+        sql = next(q['sql'] for q in queries if 'ORDER BY' in q['sql'] and f'FROM "{table}"' in q['sql'])
+        self.assertIn(f'ORDER BY "{table}"."price" ASC, "{table}"."id_product" ASC', sql)
+
+    def test_nullable_fields_are_not_orderable(self):
+        # Se ignora y se usa el orden por defecto
+        self.assertEqual(self.walk(ordering='calification'), sorted(p.pk for p in self.products))
+
+
+class CatalogCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='cache@example.com', password='secret', role=None)
+        cls.category = Category.objects.create(name='Caché')
+        cls.product = Product.objects.create(name='Original', description='-', price=100, stock=5, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+        reset_throttles()
+        self.client = APIClient()
+        self.list_url = f'/api/products/?category={self.category.pk}'
+        self.detail_url = f'/api/products/{self.product.pk}/'
+
+    def warm(self):
+        for url in (self.list_url, self.detail_url):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_product_save_invalidates_list_and_detail(self):
+        self.warm()
+        self.product.name = 'Renombrado'
+        self.product.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['name'], 'Renombrado')
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['name'], 'Renombrado')
+
+    def test_product_delete_invalidates_list(self):
+        self.warm()
+        Product.objects.get(pk=self.product.pk).delete()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'], [])
+        self.assertEqual(self.client.get(self.detail_url).status_code, 404)
+
+    def test_order_placement_invalidates_stock(self):
+        self.warm()
+        self.client.force_authenticate(self.user)
+        # El UPDATE masivo del stock invalida la caché al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('orders_create'), {
+                'order_items': [{'product': self.product.pk, 'quantity': 2}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['stock'], 3)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['stock'], 3)
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Condicional')
+        cls.products = [
+            Product.objects.create(name=f'Comic {i}', description='-', price=100, stock=1, category=cls.category)
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        reset_throttles()
+        self.client = APIClient()
+        self.url = f'/api/products/?category={self.category.pk}'
+
+    def test_list_etag_and_304(self):
+        first = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', first)
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached_list_does_not_count_rows(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_delete_changes_list_validators(self):
+        first = self.client.get(self.url)
+        self.products[1].delete()
+        response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        # Sin Last-Modified en el listado, If-Modified-Since no puede dar un 304 obsoleto
+        response = self.client.get(self.url, headers={'If-Modified-Since': 'Thu, 01 Jan 2099 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_last_modified(self):
+        url = f'/api/products/{self.products[0].pk}/'
+        first = self.client.get(url)
+        response = self.client.get(url, headers={'If-Modified-Since': first['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Manga')
+        cls.akira = Product.objects.create(name='Akira', description='Neo-Tokio', price=100, stock=1,
+                                           category=cls.category, isbn='9790000000011')
+        cls.other = Product.objects.create(name='Monster', description='Un thriller', price=100, stock=1,
+                                           category=cls.category, isbn='9790000000028')
+
+    def setUp(self):
+        reset_throttles()
+        self.client = APIClient()
+
+    def search(self, **params):
+        return self.client.get(reverse('product-search'), params)
+
+    def test_isbn_matches_exactly_with_or_without_dashes(self):
+        for isbn in ('9790000000011', '979-0-00-000001-1'):
+            response = self.search(q=isbn)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row['id_product'] for row in response.json()['results']], [self.akira.pk])
+
+    def test_text_search(self):
+        response = self.search(q='thriller', category=self.category.pk)
+        self.assertEqual([row['id_product'] for row in response.json()['results']], [self.other.pk])
+
+    def test_empty_query_and_invalid_limit(self):
+        self.assertEqual(self.search(q='  ').status_code, 400)
+        self.assertEqual(self.search(q='Akira', limit='x').status_code, 400)
+        # Un límite negativo o cero se ajusta a 1
+        response = self.search(q='Manga', limit='-1', category=self.category.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_category_vectors_are_recomputed_only_on_rename(self):
+        category = Category.objects.get(pk=self.category.pk)
+        with mock.patch('MyComicApp.signals.update_search_vectors') as update:
+            category.save()
+            category.save(update_fields=['updated_at'])
+            update.assert_not_called()
+            category.name = 'Seinen'
+            category.save()
+            self.assertEqual(update.call_count, 1)
+            category.save()
+            self.assertEqual(update.call_count, 1)
+
+
+class ImageUploadQueueTests(TestCase):
+    SECURE_URL = 'https://res.cloudinary.com/demo/image/upload/v1/planetsuperheroes/images/productos/abc.jpg'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Test')
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('MyComicApp.uploads.get_upload_queue', return_value=ImageUploadQueue(LocalExecutor()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_product(self, content=b'imagen'):
+        return Product.objects.create(
+            name='Comic', description='-', price=100, stock=1, category=self.category,
+            image=SimpleUploadedFile('portada.jpg', content),
+        )
+
+    @mock.patch('cloudinary.uploader.upload')
+    def test_product_is_saved_pending_and_updated_after_upload(self, upload):
+        upload.return_value = {'secure_url': self.SECURE_URL}
+        with self.captureOnCommitCallbacks() as callbacks:
+            product = self.create_product()
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, Product.IMAGE_PENDING)
+        self.assertFalse(product.image)
+
+        for callback in callbacks:
+            callback()
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, Product.IMAGE_READY)
+        self.assertIn('planetsuperheroes/images/productos/abc', product.image.url)
+
+    @mock.patch('cloudinary.uploader.upload')
+    def test_identical_files_are_uploaded_once(self, upload):
+        upload.return_value = {'secure_url': self.SECURE_URL}
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_product()
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.create_product()
+        self.assertEqual(upload.call_count, 1)
+        second.refresh_from_db()
+        self.assertEqual(second.image_status, Product.IMAGE_READY)
+
+    @mock.patch('cloudinary.uploader.destroy')
+    @mock.patch('cloudinary.uploader.upload')
+    def test_destroyed_image_is_uploaded_again(self, upload, destroy):
+        upload.side_effect = lambda content, public_id, folder, **kwargs: {
+            'secure_url': f'https://res.cloudinary.com/demo/image/upload/v1/{folder}/{public_id}.jpg',
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.create_product(b'primera')
+        # Al reemplazarla ningún producto usa la primera imagen y se borra de Cloudinary
+        product.refresh_from_db()
+        product.image = SimpleUploadedFile('portada.jpg', b'segunda')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(destroy.call_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other = self.create_product(b'primera')
+        self.assertEqual(upload.call_count, 3)
+        other.refresh_from_db()
+        self.assertEqual(other.image_status, Product.IMAGE_READY)
+
+    @mock.patch('MyComicApp.uploads.time.sleep')
+    @mock.patch('cloudinary.uploader.upload', side_effect=Exception('timeout'))
+    def test_failed_upload_is_retried_then_marked(self, upload, sleep):
+        with self.assertLogs('MyComicApp.uploads', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                product = self.create_product()
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, Product.IMAGE_FAILED)
+        self.assertEqual(upload.call_count, 4)
+        self.assertFalse(PendingImageUpload.objects.filter(product=product).exists())
+
+    @mock.patch('cloudinary.uploader.upload')
+    def test_lost_uploads_are_requeued_from_the_stored_file(self, upload):
+        upload.return_value = {'secure_url': self.SECURE_URL}
+        # Los callbacks no se ejecutan: el worker se reinició antes de subir la imagen
+        with self.captureOnCommitCallbacks():
+            product = self.create_product(b'perdida')
+        self.assertEqual(retry_stale_uploads(timezone.timedelta(minutes=5)), (0, 0))
+
+        PendingImageUpload.objects.update(queued_at=timezone.now() - timezone.timedelta(minutes=10))
+        self.assertEqual(retry_stale_uploads(timezone.timedelta(minutes=5)), (1, 0))
+        self.assertEqual(upload.call_args.args[0], b'perdida')
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, Product.IMAGE_READY)
+        self.assertFalse(PendingImageUpload.objects.exists())
+
+    def test_pending_products_without_stored_file_are_marked_failed(self):
+        product = Product.objects.create(name='Comic', description='-', price=100, stock=1, category=self.category,
+                                         image_status=Product.IMAGE_PENDING)
+        Product.objects.filter(pk=product.pk).update(updated_at=timezone.now() - timezone.timedelta(minutes=10))
+        self.assertEqual(retry_stale_uploads(timezone.timedelta(minutes=5)), (0, 1))
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, Product.IMAGE_FAILED)
+
+
+class ProductImageTests(TestCase):
+    CLOUDINARY_URL = 'https://res.cloudinary.com/demo/image/upload/v1712/planetsuperheroes/images/productos/abc.jpg'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Imágenes')
+        cls.with_image = Product.objects.create(name='Con imagen', description='-', price=10, stock=1,
+                                                category=cls.category, image='comics/portada')
+        cls.without_image = Product.objects.create(name='Sin imagen', description='-', price=10, stock=1,
+                                                   category=cls.category, image='')
+
+    def test_public_id(self):
+        self.assertEqual(get_public_id(self.CLOUDINARY_URL), 'planetsuperheroes/images/productos/abc')
+        self.assertEqual(get_public_id('comics/portada'), 'comics/portada')
+        self.assertEqual(get_public_id(SimpleNamespace(public_id='comics/otra')), 'comics/otra')
+        # Imágenes que no están en Cloudinary
+        for image in (None, '', '/assets/portada.jpg', 'https://example.com/portada.jpg'):
+            self.assertIsNone(get_public_id(image), image)
+
+    def test_variant_urls(self):
+        urls = build_image_urls('comics/portada')
+        self.assertEqual(set(urls), set(IMAGE_VARIANTS))
+        for variant in urls.values():
+            self.assertEqual(set(variant), set(IMAGE_FORMATS))
+        self.assertTrue(urls['thumbnail']['webp'].endswith('/image/upload/c_fill,f_webp,h_225,q_auto,w_150/v1/comics/portada'))
+        self.assertTrue(urls['detail']['url'].endswith('/image/upload/c_limit,f_auto,q_auto,w_800/v1/comics/portada'))
+        # Memoizadas por public_id
+        self.assertIs(build_image_urls('comics/portada'), urls)
+
+    def test_product_image_urls_filters_variants(self):
+        self.assertIsNone(product_image_urls('/assets/portada.jpg'))
+        self.assertEqual(set(product_image_urls(self.CLOUDINARY_URL)), set(IMAGE_VARIANTS))
+        urls = product_image_urls(self.CLOUDINARY_URL, ['card', 'poster'])
+        self.assertEqual(list(urls), ['card'])
+        self.assertEqual(product_image_urls(self.CLOUDINARY_URL, ['poster']), {})
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    def test_images_param_limits_the_variants_sent(self):
+        reset_throttles()
+        response = APIClient().get('/api/products/', {'category': self.category.pk, 'images': 'thumbnail,poster'})
+        self.assertEqual(response.status_code, 200)
+        images = {row['id_product']: row['images'] for row in response.json()['results']}
+        self.assertEqual(list(images[self.with_image.pk]), ['thumbnail'])
+        self.assertIsNone(images[self.without_image.pk])
+
+        response = APIClient().get(f'/api/products/{self.with_image.pk}/', {'images': 'card'})
+        self.assertEqual(list(response.json()['images']), ['card'])
+        response = APIClient().get(f'/api/products/{self.with_image.pk}/')
+        self.assertEqual(set(response.json()['images']), set(IMAGE_VARIANTS))
+
+
+class AsyncViewsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Test')
+        for i in range(3):
+            Product.objects.create(name=f'Comic {i}', description='-', price=100, stock=i, category=category)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    @override_settings(API_CACHE_TIMEOUT=0)
+    async def test_product_list_matches_sync_view(self):
+        sync_response = await sync_to_async(APIClient().get)('/api/products/', {'in_stock': 'true'})
+        response = await async_views.product_list(self.factory.get('/api/products/', {'in_stock': 'true'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), sync_response.json())
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+
+    async def test_cached_and_conditional_responses(self):
+        first = await async_views.product_list(self.factory.get('/api/products/'))
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = await async_views.product_list(self.factory.get('/api/products/'))
+        self.assertEqual(second['X-Cache'], 'HIT')
+        not_modified = await async_views.product_list(
+            self.factory.get('/api/products/', headers={'If-None-Match': first['ETag']})
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_invalid_filter_and_missing_product(self):
+        response = await async_views.product_list(self.factory.get('/api/products/', {'min_price': 'x'}))
+        self.assertEqual(response.status_code, 400)
+        response = await async_views.product_detail(self.factory.get('/api/products/0/'), pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_user_orders_requires_authentication(self):
+        response = await async_views.user_orders(self.factory.get('/api/orders/user/'))
+        self.assertEqual(response.status_code, 401)
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='claims@example.com', password='secret', role=None)
+
+    def setUp(self):
+        forget_user_state()
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_order_history_does_not_load_the_user(self):
+        Order.objects.create(id_user=self.user, state='En proceso', total_amount=0)
+        self.client.get(reverse('orders_user_list'))
+        # Con el estado cacheado sólo quedan las consultas del historial
+        with self.assertNumQueries(UserOrdersViewTests.MAX_QUERIES):
+            response = self.client.get(reverse('orders_user_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.wsgi_request.user, ClaimsUser)
+
+    def test_user_view_loads_the_instance(self):
+        response = self.client.get(reverse('user'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], self.user.email)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('orders_user_list')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('orders_user_list')).status_code, 401)
+
+
+class PermissionCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group, _ = Group.objects.get_or_create(name='Vendedor')
+        cls.user = User.objects.create_user(email='vendedor@example.com', password='secret', role=None)
+
+    def setUp(self):
+        cache.clear()
+        self.user.groups.add(self.group)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_roles_are_cached_across_requests(self):
+        self.assertTrue(user_has_role(self.fresh_user(), 'Vendedor'))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user_has_role(user, 'Vendedor'))
+            self.assertFalse(user_has_role(user, 'Admin'))
+
+    def test_membership_change_invalidates_roles(self):
+        self.assertTrue(user_has_role(self.fresh_user(), 'Vendedor'))
+        self.user.groups.remove(self.group)
+        self.assertFalse(user_has_role(self.fresh_user(), 'Vendedor'))
+
+    def test_permissions_are_cached_and_invalidated(self):
+        permission = Permission.objects.get(codename='view_order')
+        self.group.permissions.clear()
+        self.assertFalse(self.fresh_user().has_perm('MyComicApp.view_order'))
+        self.group.permissions.add(permission)
+        self.assertTrue(self.fresh_user().has_perm('MyComicApp.view_order'))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('MyComicApp.view_order'))
+
+
+class GroupPermissionSyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = User.objects.create_user(
+            email='sync-vendedor@example.com', password='secret',
+            role=Role.objects.filter(name='Vendedor').first() or Role.objects.create(name='Vendedor'),
+        )
+        cls.cliente = User.objects.create_user(
+            email='sync-user@example.com', password='secret',
+            role=Role.objects.filter(name='User').first() or Role.objects.create(name='User'),
+        )
+
+    def test_users_get_the_group_and_permissions_of_their_role(self):
+        extra = Permission.objects.get(codename='delete_role')
+        self.vendedor.user_permissions.add(extra)
+        create_groups_and_permissions()
+
+        self.assertEqual(list(self.vendedor.groups.values_list('name', flat=True)), ['Vendedor'])
+        self.assertEqual(list(self.cliente.groups.values_list('name', flat=True)), ['User'])
+        codenames = set(self.vendedor.user_permissions.values_list('codename', flat=True))
+        self.assertIn('view_order', codenames)
+        self.assertNotIn('add_user', codenames)
+        self.assertNotIn('delete_role', codenames)
+        self.assertFalse(self.cliente.user_permissions.exists())
+
+    def test_second_run_changes_nothing(self):
+        create_groups_and_permissions()
+        self.assertEqual(create_groups_and_permissions(), {'inserted': 0, 'deleted': 0})
+
+    def test_post_migrate_runs_once_and_writes_to_migrate_output(self):
+        app_configs = [config for config in apps.get_app_configs() if config.models_module is not None]
+        stdout = io.StringIO()
+        for config in app_configs:
+            post_migrate.send(sender=config, app_config=config, verbosity=1, interactive=False,
+                              using='default', stdout=stdout)
+        self.assertEqual(stdout.getvalue().count('Grupos y permisos sincronizados'), 1)
+
+
+class SeedLoaderTests(TestCase):
+    SQL = (
+        "-- categorías; con comentario\n"
+        "INSERT INTO categories (name) VALUES ('Manga; vol. 1'), ('It''s');\n"
+        "INSERT INTO roles (name) VALUES ('Seed');\n"
+    )
+
+    def write_seed(self, sql):
+        file = tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False, encoding='utf-8')
+        with file:
+            file.write(sql)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_statements_are_grouped_by_exact_table(self):
+        parsed = [(table, columns, list(rows)) for table, columns, rows in iter_inserts(tokenize(self.SQL))]
+        self.assertEqual(parsed, [
+            ('categories', ['name'], [['Manga; vol. 1'], ["It's"]]),
+            ('roles', ['name'], [['Seed']]),
+        ])
+
+    def test_tokens_split_across_chunks(self):
+        sql = self.SQL + (
+            '/* bloque; con "comillas" */ INSERT INTO "weird""name" (a) VALUES (-1.5e3, NULL, TRUE);\n'
+            "INSERT INTO t VALUES ('a''''b', 'x--y', x--y);"
+        )
+        expected = list(tokenize(sql))
+        self.assertIn(('ident', 'weird"name'), expected)
+        self.assertIn(('string', "a''b"), expected)
+        self.assertIn(('string', 'x--y'), expected)
+        self.assertNotIn(('word', 'bloque'), expected)
+        for size in range(1, 8):
+            chunks = [sql[i:i + size] for i in range(0, len(sql), size)]
+            self.assertEqual(list(tokenize(chunks)), expected, size)
+
+        with self.assertRaises(SeedSyntaxError):
+            list(tokenize(["INSERT INTO t VALUES ('sin ", 'cerrar);']))
+
+    def test_only_empty_tables_are_loaded_and_unchanged_files_are_skipped(self):
+        Category.objects.all().delete()
+        roles = Role.objects.count()
+        path = self.write_seed(self.SQL)
+
+        loaded = load_seed_file(path, verbosity=0)
+        self.assertEqual(loaded, {'categories': 2})
+        self.assertEqual(Role.objects.count(), roles)
+        self.assertTrue(Category.objects.filter(name='Manga; vol. 1').exists())
+        self.assertTrue(SeedData.objects.filter(name=os.path.basename(path)).exists())
+
+        Category.objects.all().delete()
+        self.assertIsNone(load_seed_file(path, verbosity=0))
+        self.assertEqual(load_seed_file(path, force=True, verbosity=0), {'categories': 2})
+
+
+class ProductImportExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='bulk@example.com', password='secret', role=None, is_staff=True)
+        cls.category = Category.objects.create(name='Bulk')
+        cls.product = Product.objects.create(
+            name='Existente', description='-', price=100, stock=1, category=cls.category, isbn='ISBN-1',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, name, content):
+        return self.client.post('/api/products/import/', {'file': SimpleUploadedFile(name, content.encode())})
+
+    def test_csv_import_upserts_by_isbn_and_reports_row_errors(self):
+        content = (
+            'isbn,name,description,price,stock,category\n'
+            f'ISBN-1,Actualizado,-,120,5,{self.category.pk}\n'
+            f'ISBN-2,Nuevo,-,50,2,{self.category.pk}\n'
+            'ISBN-3,Inválido,-,abc,2,0\n'
+        )
+        response = self.upload('products.csv', content)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['created'], result['updated'], result['invalid']), (1, 1, 1))
+        self.assertEqual(result['errors'][0]['row'], 4)
+        self.assertEqual(set(result['errors'][0]['errors']), {'price', 'category'})
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock), ('Actualizado', 5))
+        self.assertTrue(Product.objects.filter(isbn='ISBN-2', name='Nuevo').exists())
+
+    def test_files_that_are_not_utf8_are_rejected(self):
+        content = f'isbn,name,description,price,stock,category\nISBN-9,Nuevo,-,50,2,{self.category.pk}\n'.encode()
+        content += 'ISBN-8,Edición,-,50,2,1\n'.encode('latin-1')
+        response = self.client.post('/api/products/import/', {'file': SimpleUploadedFile('products.csv', content)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'file': ['El archivo no está codificado en UTF-8 (línea 3).']})
+        self.assertFalse(Product.objects.filter(isbn='ISBN-9').exists())
+
+    def test_ndjson_export_round_trips(self):
+        response = self.client.get('/api/products/export/', {'type': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertIn(self.product.pk, [row['id_product'] for row in rows])
+
+        response = self.upload('products.ndjson', '\n'.join(json.dumps(row) for row in rows))
+        self.assertEqual(response.json()['updated'], len(rows))
+        self.assertEqual(Product.objects.count(), len(rows))
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 401)
+
+
+class SalesAnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user(email='buyer@example.com', password='secret', role=None)
+        cls.seller = User.objects.create_user(email='seller@example.com', password='secret', role=None)
+        cls.seller.groups.add(Group.objects.get_or_create(name='Vendedor')[0])
+        cls.marvel = Category.objects.create(name='Marvel')
+        cls.dc = Category.objects.create(name='DC')
+        cls.spiderman = Product.objects.create(name='Spiderman', description='-', price=10, stock=100, category=cls.marvel)
+        cls.batman = Product.objects.create(name='Batman', description='-', price=25, stock=100, category=cls.dc)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def place_order(self, *items):
+        self.client.force_authenticate(self.buyer)
+        response = self.client.post(reverse('orders_create'), {
+            'order_items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def rollup(self):
+        # Sólo los productos del test (la base de pruebas incluye los datos iniciales)
+        products = [self.spiderman, self.batman]
+        return sorted(DailySales.objects.filter(product__in=products).values_list('date', 'product_id', 'category_id', 'units', 'revenue', 'order_count'))
+
+    def test_orders_update_the_daily_rollup(self):
+        self.place_order((self.spiderman, 2), (self.batman, 1))
+        self.place_order((self.spiderman, 1), (self.spiderman, 3))
+        today = timezone.localdate()
+        self.assertEqual(self.rollup(), [
+            (today, self.spiderman.pk, self.marvel.pk, 6, 60, 2),
+            (today, self.batman.pk, self.dc.pk, 1, 25, 1),
+        ])
+
+        # Recalcular desde las órdenes produce las mismas filas
+        rebuilt = self.rollup()
+        DailySales.objects.update(units=0)
+        rebuild_daily_sales()
+        self.assertEqual(self.rollup(), rebuilt)
+
+    def daily_orders(self):
+        return sorted(
+            DailyOrders.objects.filter(Q(category__in=[self.marvel, self.dc]) | Q(category__isnull=True))
+            .values_list('date', 'category_id', 'order_count'),
+            key=lambda row: (row[0], row[1] or 0),
+        )
+
+    def test_orders_are_counted_once_per_day_and_category(self):
+        today = timezone.localdate()
+        before = dict(DailyOrders.objects.filter(date=today, category__isnull=True).values_list('date', 'order_count'))
+        self.place_order((self.spiderman, 2), (self.batman, 1))
+        self.place_order((self.spiderman, 1))
+        self.assertEqual(DailyOrders.objects.get(date=today, category__isnull=True).order_count, before.get(today, 0) + 2)
+        self.assertEqual(DailyOrders.objects.get(date=today, category=self.marvel).order_count, 2)
+        self.assertEqual(DailyOrders.objects.get(date=today, category=self.dc).order_count, 1)
+
+        rebuilt = self.daily_orders()
+        DailyOrders.objects.filter(date=today).update(order_count=0)
+        rebuild_daily_sales(today, today)
+        self.assertEqual(self.daily_orders(), rebuilt)
+
+    def test_reports(self):
+        self.place_order((self.spiderman, 2), (self.batman, 1))
+        self.place_order((self.spiderman, 1))
+        self.client.force_authenticate(self.seller)
+
+        response = self.client.get(reverse('sales_by_day'), {'category': self.marvel.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'date': str(timezone.localdate()), 'units': 3, 'revenue': '30.00', 'orders': 2},
+        ])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('top_products'), {'order_by': 'revenue', 'limit': 1})
+        self.assertEqual(
+            [(row['product_name'], row['orders']) for row in response.json()['results']], [('Spiderman', 2)],
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('sales_by_category'))
+        results = {row['category_name']: (row['units'], row['orders']) for row in response.json()['results']}
+        self.assertEqual((results['Marvel'], results['DC']), ((3, 2), (1, 1)))
+
+        response = self.client.get(reverse('sales_by_category'), {'start': '2000-01-01', 'end': '2000-12-31'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_admin_edits_and_deletes_rebuild_the_rollup(self):
+        self.place_order((self.spiderman, 2), (self.batman, 1))
+        self.place_order((self.spiderman, 1))
+        first, second = Order.objects.filter(id_user=self.buyer).order_by('pk')
+        admin_user = User.objects.create_superuser(email='sales-admin@example.com', password='secret', role=None)
+        self.client.force_login(admin_user)
+        today = timezone.localdate()
+
+        # Se quita Batman de la primera orden y se cambia la cantidad de Spiderman
+        items = list(first.order_items.order_by('pk'))
+        data = {
+            'id_user': self.buyer.pk, 'state': 'En proceso', 'order_date': str(today), 'payment_method': '',
+            'shipping_method': 'Envío', 'payment_status': 'Pagado', 'total_amount': '45.00',
+            'order_items-TOTAL_FORMS': 2, 'order_items-INITIAL_FORMS': 2,
+            'order_items-MIN_NUM_FORMS': 0, 'order_items-MAX_NUM_FORMS': 1000,
+        }
+        for i, (item, quantity) in enumerate(zip(items, (4, 1))):
+            data.update({f'order_items-{i}-id_order_items': item.pk, f'order_items-{i}-order': first.pk,
+                         f'order_items-{i}-product': item.product_id, f'order_items-{i}-quantity': quantity})
+        data['order_items-1-DELETE'] = 'on'
+        response = self.client.post(reverse('admin:MyComicApp_order_change', args=[first.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.rollup(), [(today, self.spiderman.pk, self.marvel.pk, 5, 50, 2)])
+        self.assertFalse(DailyOrders.objects.filter(category=self.dc).exists())
+
+        response = self.client.post(reverse('admin:MyComicApp_order_delete', args=[second.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.rollup(), [(today, self.spiderman.pk, self.marvel.pk, 4, 40, 1)])
+
+        response = self.client.post(reverse('admin:MyComicApp_order_changelist'),
+                                     {'action': 'delete_selected', '_selected_action': [first.pk], 'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.rollup(), [])
+        self.assertFalse(DailyOrders.objects.filter(category=self.marvel).exists())
+
+    def test_reports_require_admin_or_seller_role(self):
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.client.get(reverse('sales_by_day')).status_code, 403)
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(self.client.get(reverse('sales_by_day'), {'start': '2024-02-01', 'end': '2024-01-01'}).status_code, 400)
+
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='secret', role=None)
+        cls.category = Category.objects.create(name='Admin')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        products = Product.objects.bulk_create([
+            Product(name=f'Admin comic {i}', description='-', price=10, stock=5, category=self.category)
+            for i in range(count)
+        ])
+        for i in range(count):
+            user = User.objects.create_user(email=f'admin-list-{User.objects.count()}@example.com', role=None)
+            for _ in range(3):
+                order = Order.objects.create(id_user=user, state='En proceso', order_date=timezone.localdate())
+                OrderItem.objects.create(order=order, product=products[i], quantity=1)
+
+    def count_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url, params=None):
+        self.add_rows(2)
+        self.client.get(url, params)  # roles y filtros quedan en caché
+        few = self.count_queries(url, params)
+        self.add_rows(15)
+        self.assertEqual(self.count_queries(url, params), few)
+
+    def test_user_changelist_queries(self):
+        # Sólo los usuarios del test: los de los datos iniciales tienen imágenes en Cloudinary
+        self.assert_constant_queries(reverse('admin:MyComicApp_user_changelist'), {'q': 'admin-list'})
+
+    def test_order_changelist_queries(self):
+        self.assert_constant_queries(reverse('admin:MyComicApp_order_changelist'))
+
+    def test_product_changelist_queries(self):
+        self.assert_constant_queries(reverse('admin:MyComicApp_product_changelist'))
+
+    def test_user_changelist_shows_recent_orders(self):
+        self.add_rows(1)
+        user = User.objects.latest('pk')
+        Order.objects.bulk_create([Order(id_user=user, state='En proceso') for _ in range(10)])
+        response = self.client.get(reverse('admin:MyComicApp_user_changelist'), {'q': user.email})
+        latest = user.orders.order_by('-id_order')[0].id_order
+        self.assertContains(response, f'{latest}, {latest - 1}')
+        self.assertContains(response, '(+3)')
+
+    def test_user_autocomplete_skips_the_order_annotations(self):
+        self.add_rows(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:autocomplete'), {
+                'app_label': 'MyComicApp', 'model_name': 'order', 'field_name': 'id_user', 'term': 'admin-list',
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertFalse([query['sql'] for query in queries if '"orders"' in query['sql']])
+
+    def test_daily_sales_rows_cannot_be_deleted(self):
+        product = Product.objects.create(name='Rollup', description='-', price=10, stock=5, category=self.category)
+        row = DailySales.objects.create(date=timezone.localdate(), product=product, category=self.category, units=1)
+        response = self.client.post(reverse('admin:MyComicApp_dailysales_delete', args=[row.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(DailySales.objects.filter(pk=row.pk).exists())
+
+    def test_order_search_and_item_picker(self):
+        self.add_rows(3)
+        order = Order.objects.latest('pk')
+        response = self.client.get(reverse('admin:MyComicApp_order_changelist'), {'q': order.id_user.email[:12]})
+        self.assertEqual(response.context['cl'].result_count, 9)
+        response = self.client.get(reverse('admin:MyComicApp_order_changelist'), {'q': str(order.pk)})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+        # El item muestra sólo su producto, no un <select> con todo el catálogo
+        response = self.client.get(reverse('admin:MyComicApp_order_change', args=[order.pk]))
+        self.assertContains(response, 'Admin comic 2')
+        self.assertNotContains(response, 'Admin comic 0')
+
+
+class MetricsMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='metrics@example.com', password='secret', role=None)
+        category = Category.objects.create(name='Metrics')
+        cls.product = Product.objects.create(name='Metrics', description='-', price=10, stock=10, category=category)
+
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+
+    def test_endpoints_are_measured(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.post(reverse('orders_create'), {'order_items': [{'product': self.product.pk, 'quantity': 1}]}, format='json')
+
+        text = render_metrics()
+        self.assertIn('http_request_duration_seconds_count{view="product-list",method="GET",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{view="orders_create",method="POST",status="201"} 1', text)
+        self.assertIn('http_response_size_bytes_count{view="product-list"} 1', text)
+        self.assertNotIn('http_request_db_queries_sum{view="orders_create"} 0', text)
+
+    def test_queries_and_external_calls_of_a_request(self):
+        def view(request):
+            list(User.objects.all()[:1])
+            with track_external('cloudinary'):
+                pass
+            return HttpResponse('ok')
+
+        response = MetricsMiddleware(view)(RequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('cloudinary;dur=', response['Server-Timing'])
+        self.assertIn('external_call_duration_seconds_count{service="cloudinary"} 1', render_metrics())
+
+    async def test_async_requests_count_queries_from_other_threads(self):
+        async def view(request):
+            await sync_to_async(lambda: list(User.objects.all()[:1]))()
+            return HttpResponse('ok')
+
+        response = await MetricsMiddleware(view)(AsyncRequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_metrics_endpoint_requires_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='secret-token'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', response.content.decode())
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.info = SimpleNamespace(transaction_status=0)
+        self.rollbacks = 0
+        self.alive = True
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = 0
+
+    def close(self):
+        self.closed = True
+
+    @contextmanager
+    def cursor(self):
+        if not self.alive:
+            raise OSError('server closed the connection')
+        yield mock.Mock()
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_released_connections_are_reused(self):
+        pool = ConnectionPool(FakeConnection)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use'], stats['idle']), (1, 1, 1, 0))
+
+    def test_overflow_connections_are_closed_on_release(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, max_overflow=1)
+        first, second = pool.acquire(), pool.acquire()
+        self.assertEqual(pool.stats()['overflow'], 1)
+        pool.release(first)
+        pool.release(second)
+        self.assertTrue(second.closed)
+        self.assertEqual((pool.stats()['size'], pool.stats()['idle']), (1, 1))
+
+    def test_acquire_times_out_when_exhausted(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, max_overflow=0, timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['timeouts']), (1, 1))
+        self.assertGreater(stats['wait_time'], 0)
+
+    def test_waiting_acquire_gets_the_released_connection(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, max_overflow=0, timeout=5)
+        conn = pool.acquire()
+        threading.Timer(0.05, pool.release, args=[conn]).start()
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(pool.stats()['timeouts'], 0)
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        pool = ConnectionPool(FakeConnection)
+        conn = pool.acquire()
+        conn.info.transaction_status = 2
+        pool.release(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertIs(pool.acquire(), conn)
+
+    def test_idle_connections_are_pinged_and_dead_ones_replaced(self):
+        pool = ConnectionPool(FakeConnection, ping_after=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.alive = False
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_ping_does_not_block_other_threads(self):
+        pool = ConnectionPool(FakeConnection, max_size=2, max_overflow=0, ping_after=0)
+        slow, other = pool.acquire(), pool.acquire()
+        pool.release(other)
+        pool.release(slow)
+        pinging, resume = threading.Event(), threading.Event()
+
+        @contextmanager
+        def slow_cursor():
+            pinging.set()
+            resume.wait(5)
+            yield mock.Mock()
+
+        slow.cursor = slow_cursor
+        thread = threading.Thread(target=pool.acquire)
+        thread.start()
+        self.assertTrue(pinging.wait(5))
+        # Mientras el primer hilo verifica su conexión, otro toma la siguiente sin esperar
+        started = time.monotonic()
+        self.assertIs(pool.acquire(), other)
+        self.assertLess(time.monotonic() - started, 1)
+        resume.set()
+        thread.join(5)
+        self.assertEqual(pool.stats()['in_use'], 2)
+
+    def test_pool_stats_are_published_in_metrics(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, max_overflow=0, timeout=0)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        with mock.patch('MyComicApp.metrics.pool_stats', return_value={'default:comics': pool.stats()}):
+            text = render_metrics()
+        self.assertIn('db_pool_connections{database="default:comics",state="in_use"} 1', text)
+        self.assertIn('db_pool_timeouts_total{database="default:comics"} 1', text)
+
+
+class QueryDetectorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email='detector@example.com', password='secret', role=None)
+        Order.objects.bulk_create([Order(id_user=user, state='En proceso') for _ in range(6)])
+
+    def test_fingerprint_ignores_values_and_in_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "orders" WHERE "id" IN (%s, %s, %s) AND "state" = \'x\' LIMIT 21'),
+            fingerprint('SELECT  * FROM "orders" WHERE "id" IN (%s) AND "state" = \'y\' LIMIT 5'),
+        )
+
+    def test_repeated_queries_are_reported_with_their_origin(self):
+        with QueryDetector(repeat_threshold=5) as detector:
+            emails = [order.id_user.email for order in Order.objects.all()]  # N+1
+        self.assertTrue(emails)
+        [issue] = detector.repeated
+        self.assertGreaterEqual(issue['count'], 6)
+        self.assertRegex(issue['origin'], r'^MyComicApp/tests\.py:\d+ in <listcomp>$')
+
+        with QueryDetector(repeat_threshold=5) as detector:
+            list(Order.objects.select_related('id_user'))
+        self.assertEqual(detector.repeated, [])
+
+    def test_slow_queries_are_reported(self):
+        with QueryDetector(slow_ms=0) as detector:
+            User.objects.count()
+        self.assertEqual(len(detector.slow), 1)
+        self.assertIn('consulta de', detector.report())
+
+
+class EndpointQueryTests(QueryDetectorMixin, TestCase):
+    # Ningún endpoint debe repetir la misma consulta por cada fila que devuelve
+    fail_on_query_issues = True
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='endpoints@example.com', password='secret', role=None)
+        cls.admin = User.objects.create_superuser(email='endpoints-admin@example.com', password='secret', role=None)
+        cls.admin.groups.add(Group.objects.get_or_create(name='Admin')[0])
+        categories = [Category.objects.create(name=f'Endpoints {i}') for i in range(2)]
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Endpoint comic {i}', description='-', price=10, stock=100, category=categories[i % 2])
+            for i in range(30)
+        ])
+        for _ in range(10):
+            order = Order.objects.create(id_user=cls.user, state='En proceso', order_date=timezone.localdate())
+            for product in cls.products[:3]:
+                OrderItem.objects.create(order=order, product=product, quantity=1)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+
+    def test_catalog(self):
+        self.assertEqual(self.client.get(reverse('product-list'), {'page_size': 30}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('product-detail', args=[self.products[0].pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('product-search'), {'q': 'Endpoint'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('category-list')).status_code, 200)
+
+    def test_login_and_user(self):
+        response = self.client.post(reverse('login'), {'email': self.user.email, 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['token']}")
+        self.assertEqual(self.client.get(reverse('user')).status_code, 200)
+
+    def test_orders(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('orders_user_list')).status_code, 200)
+        response = self.client.post(reverse('orders_create'), {
+            'order_items': [{'product': product.pk, 'quantity': 1} for product in self.products[:10]],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_analytics(self):
+        self.client.force_authenticate(self.admin)
+        for name in ('sales_by_day', 'sales_by_category', 'top_products'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for model in ('user', 'order', 'product', 'category', 'dailysales'):
+            response = self.client.get(reverse(f'admin:MyComicApp_{model}_changelist'), {'q': 'endpoint'})
+            self.assertEqual(response.status_code, 200)
+
+
+class LoginTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='login@example.com', password='secret', role=None)
+
+    def login(self, password='secret', email='login@example.com'):
+        return self.client.post(reverse('login'), {'email': email, 'password': password}, content_type='application/json')
+
+    def test_password_is_verified_once(self):
+        with mock.patch.object(TunedArgon2PasswordHasher, 'verify', autospec=True,
+                               side_effect=TunedArgon2PasswordHasher.verify) as verify:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(verify.call_count, 1)
+
+        data = response.json()
+        self.assertEqual(data['user']['email'], self.user.email)
+        token = CustomTokenObtainPairSerializer.token_class(data['refresh_token'])
+        self.assertEqual((token['user_id'], token['email']), (self.user.pk, self.user.email))
+        response = self.client.get(reverse('user'), HTTP_AUTHORIZATION=f"Bearer {data['token']}")
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_endpoint_issues_the_same_claims_as_login(self):
+        reset_throttles()
+        response = self.client.post(reverse('token_obtain_pair'), {'email': self.user.email, 'password': 'secret'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        token = CustomTokenObtainPairSerializer.token_class(response.json()['refresh'])
+        for claim in USER_CLAIMS:
+            self.assertIn(claim, token.payload)
+
+    def test_invalid_credentials(self):
+        self.assertEqual(self.login(password='wrong').status_code, 400)
+        self.assertEqual(self.login(email='nobody@example.com').status_code, 400)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.login().status_code, 400)
+
+    def test_old_hashes_are_upgraded_on_login(self):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher']):
+            self.user.set_password('secret')
+            self.user.save()
+        self.assertTrue(User.objects.get(pk=self.user.pk).password.startswith('pbkdf2_sha256$'))
+
+        self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).password.startswith('argon2$argon2id$'))
+
+        # Cambiar el perfil también actualiza el hash en el siguiente login
+        with override_settings(ARGON2_TIME_COST=3):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertIn('t=3,', User.objects.get(pk=self.user.pk).password)
+
+
+class TokenRevocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='revoke@example.com', password='secret', role=None)
+        cls.other = User.objects.create_user(email='other@example.com', password='secret', role=None)
+
+    def setUp(self):
+        forget_revocations()
+        self.refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def refresh_with(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('token_refresh'), {'refresh': str(token)}, format='json')
+
+    def test_logout_revokes_the_refresh_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=self.refresh['jti']).exists())
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_logout_rejects_other_tokens(self):
+        other = CustomTokenObtainPairSerializer.get_token(self.other)
+        self.assertEqual(self.client.post(reverse('logout'), {'refresh': str(other)}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(reverse('logout'), {'refresh': 'garbage'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(reverse('logout'), {}, format='json').status_code, 400)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_rotation_rejects_the_used_token(self):
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_with(response.json()['refresh']).status_code, 200)
+
+    def test_rotation_reloads_the_user_claims(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.user.groups.add(Group.objects.get_or_create(name='Vendedor')[0])
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.json()['access'])
+        self.assertEqual((access['is_staff'], access['groups']), (True, ['Vendedor']))
+
+        # Un usuario degradado no conserva los claims anteriores hasta que venza el refresh
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+        self.user.groups.clear()
+        response = self.refresh_with(response.json()['refresh'])
+        access = AccessToken(response.json()['access'])
+        self.assertEqual((access['is_staff'], access['groups']), (False, []))
+        self.assertEqual(RevocableRefreshToken(response.json()['refresh'])['groups'], [])
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh_with(response.json()['refresh']).status_code, 401)
+
+    def test_lookups_skip_the_database_when_not_revoked(self):
+        self.assertFalse(is_revoked('warm-up'))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_revoked(self.refresh['jti']))
+
+    @override_settings(JWT_REVOCATION_SYNC_INTERVAL=0)
+    def test_revocations_from_other_processes_are_synced(self):
+        self.assertFalse(is_revoked(self.refresh['jti']))
+        # Revocación hecha por otro proceso: no pasa por el filtro de éste
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=self.refresh['jti']))
+        self.assertTrue(is_revoked(self.refresh['jti']))
+
+    @override_settings(JWT_REVOCATION_SYNC_INTERVAL=0)
+    def test_database_is_read_outside_the_lock(self):
+        revoked = revocation._revoked
+        held = []
+        real_filter = BlacklistedToken.objects.filter
+
+        def query(*args, **kwargs):
+            held.append(revoked.lock.locked())
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(BlacklistedToken.objects, 'filter', side_effect=query):
+            self.assertFalse(is_revoked(self.refresh['jti']))  # carga completa
+            self.assertFalse(is_revoked(self.refresh['jti']))  # sincronización
+        self.assertEqual(held, [False, False])
+
+    def test_revocations_during_a_rebuild_are_kept(self):
+        real_filter = BlacklistedToken.objects.filter
+
+        def query(*args, **kwargs):
+            # Otro hilo revoca un token mientras éste lee la lista negra
+            mark_revoked('revoked-meanwhile')
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(BlacklistedToken.objects, 'filter', side_effect=query):
+            self.assertFalse(is_revoked(self.refresh['jti']))
+        self.assertIn('revoked-meanwhile', revocation._revoked)
+
+    def test_purge_deletes_only_expired_tokens(self):
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(jti=f'expired-{i}', token='', expires_at=now - timezone.timedelta(hours=1))
+            if i % 2:
+                BlacklistedToken.objects.create(token=token)
+        self.assertEqual(purge_expired_tokens(batch_size=2), 5)
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [self.refresh['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000)
+        values = [f'jti-{i}' for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        reset_throttles()
+        cache.clear()
+        self.client = APIClient()
+
+    def tearDown(self):
+        reset_throttles()
+
+    def test_token_bucket_allows_bursts_and_refills(self):
+        buckets = LocalBuckets()
+        self.assertEqual([buckets.take('key', 3, 1000) for _ in range(3)], [0, 0, 0])
+        wait = buckets.take('key', 3, 1000)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.001)
+        self.assertEqual(buckets.take('other', 3, 1000), 0)
+
+    def test_login_has_its_own_budget_per_client(self):
+        data = {'email': 'nobody@example.com', 'password': 'wrong'}
+        statuses = [self.client.post(reverse('login'), data, format='json').status_code for _ in range(11)]
+        self.assertEqual(statuses, [400] * 10 + [429])
+        response = self.client.post(reverse('login'), data, format='json')
+        self.assertEqual(int(response['Retry-After']), 6)
+        # Otro cliente y las rutas sin scope propio no se ven afectados
+        self.assertEqual(self.client.post(reverse('login'), data, format='json', REMOTE_ADDR='10.0.0.2').status_code, 400)
+        self.assertEqual(self.client.get(reverse('category-list')).status_code, 200)
+
+    def test_spoofed_forwarded_for_prefix_does_not_reset_the_budget(self):
+        # nginx agrega la dirección real al final; lo anterior lo envía el cliente
+        data = {'email': 'nobody@example.com', 'password': 'wrong'}
+        statuses = [
+            self.client.post(reverse('login'), data, format='json',
+                             HTTP_X_FORWARDED_FOR=f'10.1.1.{i}, 203.0.113.9').status_code
+            for i in range(11)
+        ]
+        self.assertEqual(statuses[-1], 429)
+        response = self.client.post(reverse('login'), data, format='json', HTTP_X_FORWARDED_FOR='203.0.113.10')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_views_apply_the_same_limits(self):
+        for _ in range(120):
+            take_token('throttle_anon_127.0.0.1', 120, 2)
+        response = await async_views.category_list(AsyncRequestFactory().get('/api/categories/'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class LoadSheddingTests(TestCase):
+
+    def test_queue_time_header_formats(self):
+        factory = RequestFactory()
+        now = time.time()
+        for header in (f't={now - 2:.3f}', str(int((now - 2) * 1000)), str(int((now - 2) * 1e6))):
+            waited = queue_seconds(factory.get('/', HTTP_X_REQUEST_START=header))
+            self.assertAlmostEqual(waited, 2, delta=0.1)
+        self.assertIsNone(queue_seconds(factory.get('/')))
+        self.assertIsNone(queue_seconds(factory.get('/', HTTP_X_REQUEST_START='garbage')))
+
+    def test_requests_that_waited_too_long_are_shed(self):
+        late = f't={time.time() - 5:.3f}'
+        # Los descartes no se escriben en el log de errores
+        with self.assertNoLogs('django.request', 'ERROR'):
+            response = self.client.get(reverse('category-list'), HTTP_X_REQUEST_START=late)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+        recent = f't={time.time():.3f}'
+        self.assertEqual(self.client.get(reverse('category-list'), HTTP_X_REQUEST_START=recent).status_code, 200)
+        # Prometheus sigue pudiendo leer las métricas
+        with override_settings(METRICS_TOKEN='secret-token'):
+            response = self.client.get(reverse('metrics'), HTTP_X_REQUEST_START=late,
+                                       HTTP_AUTHORIZATION='Bearer secret-token')
+        self.assertEqual(response.status_code, 200)
+
+
+class IdempotentOrderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='retry@example.com', password='secret', role=None)
+        cls.other = User.objects.create_user(email='retry-other@example.com', password='secret', role=None)
+        category = Category.objects.create(name='Idempotencia')
+        cls.product = Product.objects.create(name='Retry', description='', price=10, stock=5, category=category)
+
+    def setUp(self):
+        reset_throttles()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, key, quantity=1, client=None):
+        return (client or self.client).post(
+            reverse('orders_create'), {'order_items': [{'product': self.product.pk, 'quantity': quantity}]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retries_get_the_stored_response(self):
+        first = self.create('key-1')
+        self.assertEqual(first.status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.create('key-1')
+        # El reintento sólo lee la clave: no bloquea productos ni crea filas
+        self.assertFalse([query['sql'] for query in queries if 'products' in query['sql'] or 'orders' in query['sql']])
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.filter(id_user=self.user).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+
+        # Otra clave es otra orden
+        self.assertEqual(self.create('key-2').status_code, 201)
+        self.assertEqual(Order.objects.filter(id_user=self.user).count(), 2)
+
+    def test_key_reused_with_other_data_is_rejected(self):
+        self.assertEqual(self.create('key-1').status_code, 201)
+        self.assertEqual(self.create('key-1', quantity=2).status_code, 422)
+        self.assertEqual(Order.objects.filter(id_user=self.user).count(), 1)
+
+    def test_keys_are_per_user(self):
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        self.assertEqual(self.create('shared').status_code, 201)
+        response = self.create('shared', client=other_client)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_failed_requests_are_not_stored(self):
+        self.assertEqual(self.create('key-1', quantity=50).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Product.objects.filter(pk=self.product.pk).update(stock=100)
+        self.assertEqual(self.create('key-1', quantity=50).status_code, 201)
+
+    def test_invalid_keys_and_requests_without_key(self):
+        self.assertEqual(self.create('x' * 256).status_code, 400)
+        response = self.client.post(reverse('orders_create'), {'order_items': [{'product': self.product.pk, 'quantity': 1}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_expired_keys_run_again_and_are_purged(self):
+        self.assertEqual(self.create('key-1').status_code, 201)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timezone.timedelta(minutes=1))
+        response = self.create('key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.filter(id_user=self.user).count(), 2)
+
+        self.assertEqual(purge_expired_keys(), 0)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timezone.timedelta(minutes=1))
+        self.assertEqual(purge_expired_keys(batch_size=1), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(API_CACHE_TIMEOUT=0)
+class ProductFieldsetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fieldsets')
+        for i in range(3):
+            Product.objects.create(
+                name=f'Comic {i}', description='-', price='99.90', discount=i, stock=i, category=category,
+                image='comics/portada' if i else '', weight='0.50', isbn=f'ISBN-{i}',
+            )
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    def test_values_rows_match_model_serializer(self):
+        request = Request(RequestFactory().get('/api/products/', {'images': 'thumbnail'}))
+        serializer = ProductSerializer(many=True, context={'request': request})
+        rows = Product.objects.order_by('pk').values(*serializer.child.columns())
+        expected = ProductSerializer(Product.objects.order_by('pk'), many=True, context={'request': request}).data
+        self.assertEqual(serializer.to_representation(rows), expected)
+
+    def test_card_view_and_fields_trim_response_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/products/', {'view': 'card'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.json()['results'][0]),
+            ['id_product', 'image', 'images', 'name', 'price', 'discount', 'stock', 'calification', 'category'],
+        )
+        select = next(q['sql'] for q in queries if 'LIMIT' in q['sql'])
+        self.assertNotIn('description', select)
+        self.assertNotIn('search_vector', select)
+
+        response = APIClient().get('/api/products/', {'fields': 'name, price', 'ordering': '-price'})
+        self.assertEqual({tuple(row) for row in response.json()['results']}, {('name', 'price')})
+        response = APIClient().get(f'/api/products/{Product.objects.first().pk}/', {'fields': 'name'})
+        self.assertEqual(response.json(), {'name': Product.objects.first().name})
+
+    def assert_selects_price_but_not_stock(self, queries):
+        # Columnas del SELECT de la página: las de ?fields= y la del ordenamiento pedido
+        columns = next(q['sql'] for q in queries if 'LIMIT' in q['sql']).split(' FROM ')[0]
+        self.assertIn('"price"', columns)
+        self.assertNotIn('"stock"', columns)
+
+    def test_sparse_fields_select_only_the_requested_ordering_column(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/products/', {'fields': 'name', 'ordering': 'price', 'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assert_selects_price_but_not_stock(queries)
+        # El cursor de la página siguiente se arma con la columna seleccionada
+        self.assertEqual(APIClient().get(response.json()['next']).status_code, 200)
+
+    def test_async_sparse_fields_select_only_the_requested_ordering_column(self):
+        product_list = async_to_sync(async_views.product_list)
+        request = self.factory.get('/api/products/', {'fields': 'name', 'ordering': 'price', 'page_size': 1})
+        with CaptureQueriesContext(connection) as queries:
+            response = product_list(request)
+        self.assertEqual(response.status_code, 200)
+        self.assert_selects_price_but_not_stock(queries)
+        response = product_list(self.factory.get(json.loads(response.content)['next']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_fields_or_view_return_400(self):
+        self.assertEqual(APIClient().get('/api/products/', {'fields': 'name,password'}).status_code, 400)
+        self.assertEqual(APIClient().get('/api/products/', {'view': 'mini'}).status_code, 400)
+
+    async def test_async_views_support_fieldsets(self):
+        sync_response = await sync_to_async(APIClient().get)('/api/products/', {'view': 'card'})
+        response = await async_views.product_list(self.factory.get('/api/products/', {'view': 'card'}))
+        self.assertEqual(json.loads(response.content), sync_response.json())
+        product = await Product.objects.afirst()
+        response = await async_views.product_detail(
+            self.factory.get(f'/api/products/{product.pk}/', {'fields': 'name'}), pk=product.pk,
+        )
+        self.assertEqual(json.loads(response.content), {'name': product.name})
+        response = await async_views.product_list(self.factory.get('/api/products/', {'fields': 'x'}))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,147 @@
+"""
+Límites de requests por cliente con token bucket.
+
+Cada cliente (IP si es anónimo, id si está autenticado) tiene un bucket por scope con
+capacidad igual a la cantidad de la tasa (``DEFAULT_THROTTLE_RATES``, p. ej. ``10/min``)
+que se recarga de forma continua; así se admiten ráfagas cortas sin superar el promedio
+y, a diferencia del historial de ``SimpleRateThrottle``, cada bucket ocupa dos números.
+
+Si la caché ``THROTTLE_CACHE`` es Redis, los buckets se comparten entre workers y cada
+consulta es un único script atómico. Con cualquier otro backend, o si Redis no responde,
+cada proceso usa sus propios buckets en memoria (el límite efectivo se multiplica por
+la cantidad de workers).
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# Devuelve los segundos a esperar (0 si se consumió un token). Usa el reloj de Redis
+# para que todos los workers midan la recarga igual
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+# Segundos sin intentar usar Redis después de un error
+REDIS_RETRY_INTERVAL = 5
+
+# Cantidad de buckets locales a partir de la cual se descartan los que ya están llenos
+LOCAL_BUCKETS_CLEANUP = 10000
+
+
+class LocalBuckets:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # clave -> [tokens, última recarga, momento en que vuelve a estar lleno]
+        self.buckets = {}
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= LOCAL_BUCKETS_CLEANUP:
+                    self._cleanup(now)
+                bucket = self.buckets[key] = [capacity, now, now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            bucket[:] = [tokens, now, now + (capacity - tokens) / rate]
+            return wait
+
+    def _cleanup(self, now):
+        # Un bucket lleno equivale a uno nuevo
+        for key in [key for key, bucket in self.buckets.items() if bucket[2] <= now]:
+            del self.buckets[key]
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+_local_buckets = LocalBuckets()
+_script = None
+_redis_retry_at = 0.0
+
+
+def take_token(key, capacity, rate):
+    """Consume un token del bucket ``key``; devuelve 0 o los segundos hasta el próximo token."""
+    global _script, _redis_retry_at
+    store = caches[settings.THROTTLE_CACHE]
+    if isinstance(store, RedisCache) and time.monotonic() >= _redis_retry_at:
+        from redis.exceptions import RedisError
+
+        try:
+            client = store._cache.get_client(key, write=True)
+            if _script is None:
+                # Se envía con EVALSHA; Redis lo vuelve a cargar si no lo tiene
+                _script = client.register_script(TOKEN_BUCKET_SCRIPT)
+            return float(_script(keys=[store.make_key(key)], args=[capacity, rate], client=client))
+        except RedisError as e:
+            _redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            logger.warning('Redis no respondió (%s); se usan los límites en memoria del proceso', e)
+    return _local_buckets.take(key, capacity, rate)
+
+
+def reset_throttles():
+    """Vacía los buckets en memoria de este proceso."""
+    _local_buckets.clear()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """``SimpleRateThrottle`` con token bucket en lugar del historial de requests."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.retry_after = take_token(self.key, self.num_requests, self.num_requests / self.duration)
+        return self.retry_after == 0
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonBucketThrottle(AnonRateThrottle, TokenBucketThrottle):
+    """Límite ``anon`` por IP para los requests sin autenticar."""
+
+
+class UserBucketThrottle(UserRateThrottle, TokenBucketThrottle):
+    """Límite ``user`` por usuario autenticado."""
+
+    def get_cache_key(self, request, view):
+        # Los anónimos ya tienen el límite anon
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return super().get_cache_key(request, view)
+
+
+class ScopedBucketThrottle(ScopedRateThrottle, TokenBucketThrottle):
+    """Límite propio de las vistas con ``throttle_scope`` (login, registro, órdenes)."""
@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import cloudinary
+import cloudinary.uploader
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .metrics import track_external
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = 'planetsuperheroes/images/productos'
+UPLOADED_KEY = 'image-upload:{}'
+
+
+def upload_image(content, public_id, max_retries, backoff):
+    """
+    Sube ``content`` a Cloudinary reintentando con backoff exponencial.
+
+    Se ejecuta dentro del pool de workers (hilo o proceso), por lo que no accede a la
+    base de datos: sólo devuelve la ``secure_url``.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            with track_external('cloudinary'):
+                result = cloudinary.uploader.upload(
+                    content,
+                    public_id=public_id,
+                    folder=UPLOAD_FOLDER,
+                    use_asset_folder_as_public_id_prefix=True,
+                    overwrite=False,
+                )
+            return result['secure_url']
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+class LocalExecutor:
+    """Ejecuta las subidas en el mismo hilo; reemplaza al pool en los tests."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class ImageUploadQueue:
+    """
+    Cola de subidas de imágenes de productos fuera del ciclo del request.
+
+    Cada archivo se identifica por el SHA-256 de su contenido: si ya se subió (o se
+    está subiendo) no se vuelve a enviar, y los productos que lo comparten reciben la
+    misma URL.
+
+    La cola vive en memoria del worker; el archivo también se guarda en
+    ``PendingImageUpload`` (``upload_id``) y esa fila se borra al terminar, así una
+    subida perdida por un reinicio puede volver a encolarse (``retry_stale_uploads``).
+    """
+
+    def __init__(self, executor, max_retries=3, backoff=1.0):
+        self.executor = executor
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def submit(self, product_id, content, replaces=None, upload_id=None):
+        digest = hashlib.sha256(content).hexdigest()
+
+        secure_url = cache.get(UPLOADED_KEY.format(digest))
+        if secure_url:
+            self._local.submitting = True
+            try:
+                self._finish(product_id, upload_id, replaces, secure_url=secure_url)
+            finally:
+                self._local.submitting = False
+            return
+
+        with self._lock:
+            future = self._inflight.get(digest)
+            if future is None:
+                future = self.executor.submit(upload_image, content, digest, self.max_retries, self.backoff)
+                self._inflight[digest] = future
+        # Si la subida ya terminó el callback corre en este mismo hilo
+        self._local.submitting = True
+        try:
+            future.add_done_callback(lambda f: self._on_done(f, product_id, digest, replaces, upload_id))
+        finally:
+            self._local.submitting = False
+
+    def _on_done(self, future, product_id, digest, replaces, upload_id):
+        with self._lock:
+            self._inflight.pop(digest, None)
+        try:
+            secure_url = future.result()
+        except Exception as e:
+            logger.error(f'Error al subir la imagen del producto {product_id} a Cloudinary: {e}')
+            self._finish(product_id, upload_id, None)
+            return
+        cache.set(UPLOADED_KEY.format(digest), secure_url, None)
+        self._finish(product_id, upload_id, replaces, secure_url=secure_url)
+
+    def _finish(self, product_id, upload_id, replaces, secure_url=None):
+        from .cache import bump_version
+        from .models import PendingImageUpload, Product
+
+        in_worker = not getattr(self._local, 'submitting', False)
+        try:
+            if secure_url:
+                fields = {'image': secure_url, 'image_status': Product.IMAGE_READY}
+            else:
+                fields = {'image_status': Product.IMAGE_FAILED}
+            Product.objects.filter(pk=product_id).update(updated_at=timezone.now(), **fields)
+            if upload_id is not None:
+                PendingImageUpload.objects.filter(pk=upload_id).delete()
+            bump_version(Product)
+
+            # Eliminar la imagen anterior si ya ningún producto la usa
+            if secure_url and replaces and replaces not in secure_url:
+                if not Product.objects.filter(image__contains=replaces).exists():
+                    # El public_id de las subidas es el SHA-256 del archivo: olvidar su URL para
+                    # que el mismo archivo vuelva a subirse en lugar de apuntar a la borrada
+                    cache.delete(UPLOADED_KEY.format(replaces.rsplit('/', 1)[-1]))
+                    try:
+                        with track_external('cloudinary'):
+                            cloudinary.uploader.destroy(replaces)
+                    except cloudinary.exceptions.NotFound:
+                        pass
+        finally:
+            # Los callbacks corren en hilos del pool: no dejar conexiones abiertas
+            if in_worker:
+                connection.close()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_upload_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            backend = settings.IMAGE_UPLOAD_BACKEND
+            workers = settings.IMAGE_UPLOAD_WORKERS
+            if backend == 'process':
+                executor = ProcessPoolExecutor(max_workers=workers)
+            elif backend == 'local':
+                executor = LocalExecutor()
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-upload')
+            _queue = ImageUploadQueue(
+                executor,
+                max_retries=settings.IMAGE_UPLOAD_MAX_RETRIES,
+                backoff=settings.IMAGE_UPLOAD_BACKOFF,
+            )
+        return _queue
+
+
+def enqueue_product_image(product, image, replaces=None):
+    """Programa la subida de ``image`` para ``product`` una vez confirmada la transacción."""
+    from .models import PendingImageUpload
+
+    if hasattr(image, 'seek'):
+        image.seek(0)
+    content = image.read()
+    upload = PendingImageUpload.objects.create(product=product, content=content, replaces=replaces or '')
+    transaction.on_commit(
+        lambda: get_upload_queue().submit(product.pk, content, replaces=replaces, upload_id=upload.pk)
+    )
+
+
+def retry_stale_uploads(older_than):
+    """
+    Vuelve a encolar las subidas guardadas hace más de ``older_than`` (un ``timedelta``)
+    que siguen sin terminar, p. ej. porque el worker que las tenía se reinició, y marca
+    como fallidos los productos pendientes que ya no tienen archivo guardado. Devuelve
+    ``(reencoladas, fallidas)``.
+    """
+    from .cache import bump_version
+    from .models import PendingImageUpload, Product
+
+    cutoff = timezone.now() - older_than
+    queue = get_upload_queue()
+    retried = 0
+    stale = list(PendingImageUpload.objects.filter(queued_at__lt=cutoff).order_by('pk').values_list('pk', flat=True))
+    for upload_id in stale:
+        # Se marca como reencolada para que el próximo barrido no la repita mientras sube
+        if not PendingImageUpload.objects.filter(pk=upload_id, queued_at__lt=cutoff).update(queued_at=timezone.now()):
+            continue
+        upload = PendingImageUpload.objects.get(pk=upload_id)
+        queue.submit(upload.product_id, bytes(upload.content), replaces=upload.replaces or None, upload_id=upload_id)
+        retried += 1
+
+    failed = (
+        Product.objects.filter(image_status=Product.IMAGE_PENDING, updated_at__lt=cutoff)
+        .exclude(pending_uploads__isnull=False)
+        .update(image_status=Product.IMAGE_FAILED, updated_at=timezone.now())
+    )
+    if failed:
+        bump_version(Product)
+    return retried, failed
+
+
+def public_id_from_url(url):
+    """Extrae el public_id (con carpeta) de una URL de Cloudinary."""
+    path = str(url).split('/upload/', 1)[-1]
+    parts = path.split('/')
+    if parts and parts[0].startswith('v') and parts[0][1:].isdigit():
+        parts = parts[1:]
+    return '/'.join(parts).rsplit('.', 1)[0]
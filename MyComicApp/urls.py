@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 from MyComicApp import views
+from MyComicApp.metrics import metrics_view
 from rest_framework_simplejwt.views import TokenVerifyView
 
 router = routers.DefaultRouter()
@@ -21,7 +23,26 @@ urlpatterns = [
     path('user/update/', views.UpdateUserView.as_view(), name='user_update'),
     path('orders/create/', views.CreateOrderView.as_view(), name='orders_create'),
     path('orders/user/', views.UserOrdersView.as_view(), name='orders_user_list'),
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache_stats'),
+    path('metrics/', metrics_view, name='metrics'),
+
+    # Reportes de ventas (Admin y Vendedor)
+    path('analytics/sales/daily/', views.SalesByDayView.as_view(), name='sales_by_day'),
+    path('analytics/sales/categories/', views.SalesByCategoryView.as_view(), name='sales_by_category'),
+    path('analytics/products/top/', views.TopProductsView.as_view(), name='top_products'),
     
     # Ruta para crear un nuevo producto
     path('products/create/', views.CreateProductView.as_view(), name='create_product'),
 ]
+
+# En modo ASGI las lecturas del catálogo y del historial se atienden con vistas async;
+# van primero para que tengan prioridad sobre las rutas del router
+if settings.ASYNC_VIEWS:
+    from MyComicApp import async_views
+
+    urlpatterns = [
+        path('products/', async_views.product_list, name='product-list-async'),
+        path('products/<int:pk>/', async_views.product_detail, name='product-detail-async'),
+        path('categories/', async_views.category_list, name='category-list-async'),
+        path('orders/user/', async_views.user_orders, name='orders_user_list_async'),
+    ] + urlpatterns
@@ -2,10 +2,12 @@
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.generics import GenericAPIView, RetrieveUpdateAPIView, ListAPIView
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import update_last_login
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import StatelessJWTAuthentication, get_user_instance
 from .serializers import (
     RoleSerializer,
     UserSerializer,
@@ -14,14 +16,33 @@ from .serializers import (
     CategorySerializer,
     OrderCreateSerializer,
     OrderSerializer,
-    LogoutSerializer
+    LogoutSerializer,
+    SalesByCategorySerializer,
+    SalesByDaySerializer,
+    SalesQuerySerializer,
+    TopProductSerializer
 )
 from .models import Role, User, Product, Category, Order
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.viewsets import ModelViewSet  # Asegúrate de importar ModelViewSet
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from django.http import StreamingHttpResponse
+from rest_framework.parsers import FormParser, MultiPartParser
+from .analytics import sales_by_category, sales_by_day, top_products
+from .bulk import detect_file_type, export_products, import_products
+from .cache import CachedResponseMixin, cache_stats
+from .conditional import ConditionalGetMixin
+from .filters import ProductFilter
+from .idempotency import idempotent_response
+from .orders import order_history_queryset
+from .pagination import OrderCursorPagination, ProductCursorPagination
+from .permissions import HasRole
+from .search import search_products
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = 'register'
 
     def post(self, request, *args, **kwargs):
         serializer = UserSerializer(data=request.data)
@@ -32,49 +53,60 @@ class RegisterView(APIView):
 
 class Login(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         email = request.data.get('email', '')
         password = request.data.get('password', '')
-        user = authenticate(email=email, password=password)
-
-        if user:
-            login_serializer = self.serializer_class(data=request.data)
-            if login_serializer.is_valid():
-                user_serializer = UserSerializer(user)
-                return Response({
-                    'token': login_serializer.validated_data['access'],
-                    'refresh_token': login_serializer.validated_data['refresh'],
-                    'user': user_serializer.data,
-                    'message': 'Inicio de Sesión Exitoso'
-                }, status=status.HTTP_200_OK)
+        # Se verifica la contraseña una sola vez y el par de tokens se emite con el usuario
+        # ya autenticado (TokenObtainPairSerializer volvería a autenticar)
+        user = authenticate(request, email=email, password=password)
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
             return Response({'error': 'Contraseña o nombre de usuario incorrectos'}, status=status.HTTP_400_BAD_REQUEST)
-        return Response({'error': 'Contraseña o nombre de usuario incorrectos'}, status=status.HTTP_400_BAD_REQUEST)
+
+        refresh = self.serializer_class.get_token(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return Response({
+            'token': str(refresh.access_token),
+            'refresh_token': str(refresh),
+            'user': UserSerializer(user).data,
+            'message': 'Inicio de Sesión Exitoso'
+        }, status=status.HTTP_200_OK)
+
+# /api/token/ de simplejwt, con el mismo límite que el login porque también verifica contraseñas.
+# Emite los mismos tokens que el login (claims de StatelessJWTAuthentication y revocación)
+class LoginThrottledTokenObtainPairView(TokenObtainPairView):
+    serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
 
 class Logout(GenericAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = LogoutSerializer
 
     def post(self, request, *args, **kwargs):
-        user = request.user  # Obtén el usuario autenticado directamente
-        RefreshToken.for_user(user)  # Revoca el token del usuario
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.validated_data['refresh'].blacklist()  # Revoca el refresh token presentado
         return Response({'message': 'Sesión cerrada correctamente.'}, status=status.HTTP_200_OK)
 
 # Ver los datos del usuario logueado
 class UserView(RetrieveUpdateAPIView):
     serializer_class = UserSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return get_user_instance(self.request.user)
 
 # Actualizar los datos del usuario
 class UpdateUserView(APIView):
     serializer_class = UserSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return get_user_instance(self.request.user)
 
     def put(self, request, *args, **kwargs):
         user = self.get_object()
@@ -84,40 +116,110 @@ class UpdateUserView(APIView):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
+    cache_dependencies = (Category,)
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, ModelViewSet):
+    cache_dependencies = (Product,)
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    pagination_class = ProductCursorPagination
+    filter_backends = [ProductFilter, OrderingFilter]
+    # Sólo campos NOT NULL: el cursor no puede ubicar un NULL (ver ProductCursorPagination)
+    ordering_fields = ['id_product', 'name', 'price', 'stock']
+    ordering = ['id_product']
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk_import', 'export']:
             self.permission_classes = [IsAdminUser]
         return super(ProductViewSet, self).get_permissions()
 
+    def selected_columns(self, ordering=()):
+        # Columnas de los campos pedidos (?fields= / ?view=) más las del ordenamiento del
+        # cursor, que las lee de la última fila de la página
+        return self.get_serializer().columns() | {field.lstrip('-') for field in ordering}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'search'):
+            # Sin search_vector ni las columnas de los campos que no se envían
+            queryset = queryset.only(*self.selected_columns())
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        # El listado se serializa desde filas de values(), sin instanciar un Product por fila
+        # (ver ProductSerializer.represent_rows)
+        ordering = self.paginator.get_ordering(self.request, queryset, self)
+        return super().paginate_queryset(queryset.values(*self.selected_columns(ordering)))
+
+    # Búsqueda de texto completo: /api/products/search/?q=...
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request, *args, **kwargs):
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return Response({'error': "El parámetro 'q' es obligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+        except ValueError:
+            return Response({'error': "El parámetro 'limit' debe ser un número."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = ProductFilter().filter_queryset(request, self.get_queryset(), self)
+        results = search_products(term, queryset)[:limit]
+        serializer = self.get_serializer(results, many=True)
+        return Response({'results': serializer.data})
+
+    # Importación masiva: POST multipart con 'file' (.csv o .ndjson) y opcionalmente 'type'
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def bulk_import(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': "El archivo 'file' es obligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+        file_type = detect_file_type(upload.name, request.data.get('type'))
+        result = import_products(upload.file, file_type)
+        return Response(result, status=status.HTTP_200_OK)
+
+    # Exportación del catálogo en streaming: /api/products/export/?type=csv|ndjson
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request, *args, **kwargs):
+        file_type = detect_file_type('', request.query_params.get('type', 'csv'))
+        content_type = 'text/csv' if file_type == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_products(file_type), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="products.{file_type}"'
+        return response
+
 # Crear órdenes con usuario autenticado
 class CreateOrderView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'orders'
 
     def post(self, request, *args, **kwargs):
+        # Con el header Idempotency-Key los reintentos reciben la respuesta de la primera orden
+        return idempotent_response(request, lambda: self.create_order(request))
+
+    def create_order(self, request):
         serializer = OrderCreateSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            order = serializer.save(id_user=request.user)
-            return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            order = serializer.save(id_user_id=request.user.id)
+            order = order_history_queryset(request.user.id).get(pk=order.pk)
+            return status.HTTP_201_CREATED, OrderSerializer(order).data
+        return status.HTTP_400_BAD_REQUEST, serializer.errors
 
 # Ver lista de órdenes de usuario autenticado
 class UserOrdersView(ListAPIView):
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
 
+    pagination_class = OrderCursorPagination
+
     def get_queryset(self):
         user_id = self.request.user.id
-        return Order.objects.filter(id_user=user_id)
+        return order_history_queryset(user_id)
 
 class RoleViewSet(ModelViewSet):
     queryset = Role.objects.all()
@@ -134,3 +236,43 @@ class CreateProductView(APIView):
             product = serializer.save()  # Guardamos el producto
             return Response(ProductSerializer(product).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# Estadísticas de aciertos/fallos de la caché del catálogo
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats())
+
+# Reportes de ventas para administradores y vendedores, calculados sobre DailySales
+class SalesAnalyticsView(APIView):
+    permission_classes = [HasRole.of('Admin', 'Vendedor')]
+
+    def get(self, request, *args, **kwargs):
+        serializer = SalesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'results': self.serializer_class(self.get_results(params), many=True).data,
+        })
+
+class SalesByDayView(SalesAnalyticsView):
+    serializer_class = SalesByDaySerializer
+
+    def get_results(self, params):
+        return sales_by_day(params['start'], params['end'], params.get('category'))
+
+class SalesByCategoryView(SalesAnalyticsView):
+    serializer_class = SalesByCategorySerializer
+
+    def get_results(self, params):
+        return sales_by_category(params['start'], params['end'])
+
+class TopProductsView(SalesAnalyticsView):
+    serializer_class = TopProductSerializer
+
+    def get_results(self, params):
+        return top_products(params['start'], params['end'], params.get('category'),
+                            order_by=params['order_by'], limit=params['limit'])
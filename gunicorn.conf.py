@@ -0,0 +1,33 @@
+# Configuración de Gunicorn.
+# SERVER_MODE=wsgi usa workers sincrónicos; SERVER_MODE=asgi usa workers de uvicorn,
+# que atienden varios requests concurrentes por proceso con las vistas async.
+import os
+
+server_mode = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+# Un único worker por defecto: con la caché en memoria (LocMemCache, la de settings.py)
+# cada proceso tiene su propia caché del catálogo, permisos y límites de requests, y
+# una escritura sólo invalida la del worker que la atendió. Para usar más workers
+# (p. ej. 2 * núcleos + 1) hay que compartir la caché con CACHE_BACKEND (Redis).
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+errorlog = os.getenv('GUNICORN_ERRORLOG', '/planetsuperheroes/logs/django_error.log')
+
+if server_mode == 'asgi':
+    wsgi_app = 'universidad.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'universidad.wsgi:application'
+    # Hilos por worker sincrónico (1 = worker clásico de un request a la vez)
+    threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+
+def on_starting(server):
+    cache_backend = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+    if workers > 1 and 'locmem' in cache_backend.lower():
+        server.log.warning(
+            'WEB_CONCURRENCY=%s con una caché en memoria por proceso (%s): los workers pueden '
+            'responder stock y precios desactualizados hasta API_CACHE_TIMEOUT. Configure '
+            'CACHE_BACKEND con una caché compartida (p. ej. Redis).', workers, cache_backend,
+        )
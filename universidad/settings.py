@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
@@ -7,6 +8,7 @@ import cloudinary.uploader
 import cloudinary.api
 from datetime import timedelta
 from decouple import config
+from corsheaders.defaults import default_headers
 
 # Cargar variables de entorno desde .env
 load_dotenv()
@@ -30,6 +32,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'MyComicApp',  # Tu aplicación personalizada
     'rest_framework',
     'corsheaders',
@@ -54,6 +57,37 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Descarte de carga (ver MyComicApp/load_shedding.py): los requests que esperaron más de
+# LOAD_SHED_QUEUE_MS en la cola (según el header X-Request-Start de nginx) reciben 503
+# con Retry-After. Con 0 se desactiva
+LOAD_SHED_QUEUE_MS = float(os.getenv('LOAD_SHED_QUEUE_MS', 1000))
+LOAD_SHED_RETRY_AFTER = int(os.getenv('LOAD_SHED_RETRY_AFTER', 5))  # segundos
+LOAD_SHED_EXEMPT_PATHS = ('/api/metrics/',)
+if LOAD_SHED_QUEUE_MS > 0:
+    # Después de CORS, para que el navegador pueda leer el 503
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('corsheaders.middleware.CorsMiddleware') + 1,
+        'MyComicApp.load_shedding.LoadSheddingMiddleware',
+    )
+
+# Métricas por endpoint en /api/metrics/ y header Server-Timing (ver MyComicApp/metrics.py)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'True') == 'True'
+# Token que debe enviar Prometheus (Authorization: Bearer ...); vacío = sólo staff con sesión
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+if METRICS_ENABLED:
+    # Primero, para que la latencia incluya al resto de los middlewares
+    MIDDLEWARE.insert(0, 'MyComicApp.metrics.MetricsMiddleware')
+
+# Detector de consultas N+1 y lentas (ver MyComicApp/query_detector.py); pensado para staging
+QUERY_DETECTOR_ENABLED = os.getenv('QUERY_DETECTOR_ENABLED', 'False') == 'True'
+QUERY_DETECTOR_REPEAT_THRESHOLD = int(os.getenv('QUERY_DETECTOR_REPEAT_THRESHOLD', 5))  # misma forma de consulta por request
+QUERY_DETECTOR_SLOW_MS = float(os.getenv('QUERY_DETECTOR_SLOW_MS', 100))
+# Con True, QueryDetectorMixin hace fallar los tests con consultas repetidas o lentas
+QUERY_DETECTOR_FAIL_TESTS = os.getenv('QUERY_DETECTOR_FAIL_TESTS', 'False') == 'True'
+if QUERY_DETECTOR_ENABLED:
+    MIDDLEWARE.append('MyComicApp.query_detector.QueryDetectorMiddleware')
+
 # Configuración de CORS
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:4200',    # Frontend en desarrollo
@@ -61,6 +95,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# Header de los reintentos idempotentes de POST /api/orders/create/
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # Configuración de URLs
 ROOT_URLCONF = 'universidad.urls'
@@ -85,11 +121,60 @@ TEMPLATES = [
 # WSGI
 WSGI_APPLICATION = 'universidad.wsgi.application'
 
+# Modo del servidor: 'wsgi' (workers sincrónicos) o 'asgi' (uvicorn, ver gunicorn.conf.py).
+# En modo ASGI las lecturas del catálogo y del historial de órdenes usan vistas async.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
+
 # Configuración de la base de datos
+# DB_CONN_MAX_AGE: segundos que se reutiliza una conexión entre requests (0 = cerrar en cada request)
 DATABASES = {
-    'default': dj_database_url.config(default=os.getenv('DATABASE_URL')),
+    'default': dj_database_url.config(
+        default=os.getenv('DATABASE_URL'),
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        conn_health_checks=os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    ),
+}
+
+# Pool de conexiones en proceso (opcional, sólo PostgreSQL): útil con workers con hilos
+# o ASGI, donde varios requests concurrentes comparten el mismo proceso.
+if os.getenv('DB_POOL', 'False') == 'True' and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['ENGINE'] = 'MyComicApp.db.postgresql'
+    # Las conexiones vuelven al pool al terminar cada request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 5)),
+        'MAX_OVERFLOW': int(os.getenv('DB_POOL_MAX_OVERFLOW', 5)),
+        'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        # Segundos ociosa a partir de los cuales una conexión se verifica antes de reutilizarla
+        'PING_AFTER': float(os.getenv('DB_POOL_PING_AFTER', 300)),
+    }
+elif ASYNC_VIEWS:
+    # Con ASGI cada request puede usar un hilo distinto: las conexiones persistentes
+    # quedarían abiertas por hilo, así que se cierran al terminar el request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Configuración de la caché
+# Por defecto se usa memoria local, que sólo es correcta con un único worker: cada
+# proceso tiene su propia caché y las versiones que invalidan el catálogo (ver
+# cache.py) sólo cambian en el worker que atendió la escritura, así que los demás
+# seguirían respondiendo (y con 304) stock y precios viejos hasta API_CACHE_TIMEOUT.
+# Con WEB_CONCURRENCY > 1 hay que compartir la caché entre workers, p. ej.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y
+# CACHE_LOCATION=redis://redis:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'planetsuperheroes'),
+    },
 }
 
+# Tiempo de vida (segundos) de las respuestas cacheadas del catálogo
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 300))
+
+# Configuración de búsqueda de texto completo de PostgreSQL (idioma del catálogo)
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'spanish')
+
 # Validadores de contraseñas
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,6 +191,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Algoritmo con el que se guardan las contraseñas: 'argon2' (argon2-cffi), 'bcrypt'
+# (requiere el paquete bcrypt) o 'pbkdf2'. Los demás se mantienen para verificar los
+# hashes existentes, que se actualizan al algoritmo elegido en el siguiente login.
+PASSWORD_HASHER_PROFILES = {
+    'argon2': 'MyComicApp.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'MyComicApp.hashers.TunedBCryptSHA256PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'argon2')
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_PROFILES.items() if name != PASSWORD_HASHER
+]
+# Perfil de Argon2id (por defecto el mínimo de OWASP: t=2, 19 MiB, p=1) y rondas de bcrypt
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 19456))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+
 # Internacionalización
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -140,6 +243,13 @@ CLOUDINARY_STORAGE = {
     'RESOURCE_TYPE': 'auto',   # Permite múltiples tipos de recursos
 }
 
+# Subida de imágenes de productos en segundo plano (ver MyComicApp/uploads.py)
+# IMAGE_UPLOAD_BACKEND: 'thread', 'process' o 'local' (sincrónico, para tests)
+IMAGE_UPLOAD_BACKEND = os.getenv('IMAGE_UPLOAD_BACKEND', 'thread')
+IMAGE_UPLOAD_WORKERS = int(os.getenv('IMAGE_UPLOAD_WORKERS', 4))
+IMAGE_UPLOAD_MAX_RETRIES = int(os.getenv('IMAGE_UPLOAD_MAX_RETRIES', 3))
+IMAGE_UPLOAD_BACKOFF = float(os.getenv('IMAGE_UPLOAD_BACKOFF', 1.0))  # segundos, se duplica en cada reintento
+
 # Establecer el almacenamiento predeterminado para archivos
 
 DEFAULT_FILE_STORAGE = 'cloudinary.storage.MediaCloudinaryStorage'
@@ -148,11 +258,17 @@ DEFAULT_FILE_STORAGE = 'cloudinary.storage.MediaCloudinaryStorage'
 AUTH_USER_MODEL = 'MyComicApp.User'
 
 # Registro de logs
+# Con manage.py test los errores esperados por los tests no se escriben en el archivo
+TESTING = sys.argv[1:2] == ['test']
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        # Los 503 del descarte de carga no son errores (ver MyComicApp/load_shedding.py)
+        'shed_responses': {'()': 'MyComicApp.load_shedding.ShedResponseFilter'},
+    },
     'handlers': {
-        'file': {
+        'file': {'class': 'logging.NullHandler'} if TESTING else {
             'level': 'ERROR',
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'logs/django_error.log'),
@@ -164,6 +280,9 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'django.request': {
+            'filters': ['shed_responses'],
+        },
     },
 }
 
@@ -175,8 +294,29 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',  # Considera cambiar a 'IsAuthenticated' para mayor seguridad
     ),
+    # Límites por cliente con token bucket (ver MyComicApp/throttling.py); login, registro y
+    # órdenes tienen además su propio límite (throttle_scope en cada vista)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'MyComicApp.throttling.AnonBucketThrottle',
+        'MyComicApp.throttling.UserBucketThrottle',
+        'MyComicApp.throttling.ScopedBucketThrottle',
+    ) if os.getenv('THROTTLE_ENABLED', 'True') == 'True' else (),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON_RATE', '120/min'),
+        'user': os.getenv('THROTTLE_USER_RATE', '600/min'),
+        'login': os.getenv('THROTTLE_LOGIN_RATE', '10/min'),
+        'register': os.getenv('THROTTLE_REGISTER_RATE', '5/min'),
+        'orders': os.getenv('THROTTLE_ORDERS_RATE', '30/min'),
+    },
+    # Proxies delante de Django: el cliente es la dirección que agregó el último de ellos
+    # en X-Forwarded-For (el resto del header lo controla el cliente). Por defecto 1, el
+    # nginx de nginx.conf; 0 usa REMOTE_ADDR (sin proxy)
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
+# Caché donde se guardan los buckets de los límites; si es Redis se comparten entre workers
+THROTTLE_CACHE = os.getenv('THROTTLE_CACHE', 'default')
+
 # Configuración de Simple JWT
 SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
@@ -191,8 +331,29 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_REFRESH_SERIALIZER': 'MyComicApp.serializers.CustomTokenRefreshSerializer',
 }
 
+# Horas durante las que se guarda la respuesta de cada Idempotency-Key (ver MyComicApp/idempotency.py)
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24))
+
+# Segundos entre cada lectura de los refresh tokens revocados en otros procesos (ver
+# revocation.py); es la demora máxima con que un proceso ve una revocación ajena
+JWT_REVOCATION_SYNC_INTERVAL = float(os.getenv('JWT_REVOCATION_SYNC_INTERVAL', 5))
+# Cantidad de tokens revocados (sin vencer) prevista para dimensionar el filtro en memoria
+JWT_REVOCATION_FILTER_CAPACITY = int(os.getenv('JWT_REVOCATION_FILTER_CAPACITY', 1_000_000))
+
+# Segundos que cada proceso reutiliza el estado de un usuario (activo/privilegios) al
+# autenticar con StatelessJWTAuthentication; es la demora máxima de una desactivación
+JWT_USER_STATE_TTL = float(os.getenv('JWT_USER_STATE_TTL', 30))
+
+# Backend de autenticación con los permisos de cada usuario cacheados entre requests
+AUTHENTICATION_BACKENDS = ['MyComicApp.backends.CachedModelBackend']
+
+# Tiempo de vida (segundos) de los roles y permisos cacheados; los cambios de grupos
+# o permisos los invalidan antes
+PERMISSIONS_CACHE_TIMEOUT = int(os.getenv('PERMISSIONS_CACHE_TIMEOUT', 300))
+
 # Otras configuraciones
 APPEND_SLASH = False  # Si no deseas que Django agregue una barra al final de las URLs automáticamente
 